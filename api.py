@@ -0,0 +1,193 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Non-interactive library interface to the scraper.
+
+Nothing here prompts or prints progress, so it can be used from other
+programs and services::
+
+    from api import scrape, download
+
+    for chapter in scrape("ncode", "n1234ab", "1-10", {"translation": {"enabled": True}}):
+        store(chapter['index'], chapter['title'], chapter['content'])
+
+    files = download("ncode", "n1234ab", ["epub", "txt"], chapter_range="1-10")
+
+``scrape_async`` and ``download_async`` are the asyncio equivalents; the
+scraping itself still runs on threads.
+"""
+
+import copy
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+from config import load_config
+from models import Chapter
+from main import SyosetuScraper, parse_chapter_range, select_chapters, chapter_source, translate_novel_info, \
+    export_chapters, DOWNLOAD_FORMATS
+
+# Chapter selection: "0"/None for all, "12", "1-5", or (start, end) with 1-based inclusive bounds
+ChapterRange = Union[None, str, int, Sequence[int]]
+
+# Returned by next() when a generator running on the executor is exhausted
+_END = object()
+
+
+def build_config(options: Optional[Dict[str, Dict[str, Any]]] = None,
+                 config: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Configuration for one call, without changing the saved configuration.
+
+    Args:
+        options (Dict, optional): Overrides by section, e.g. ``{"translation": {"enabled": True}}``
+        config (Dict, optional): Base configuration, the saved one by default
+
+    Returns:
+        Dict[str, Any]: Copy of the base configuration with the overrides applied
+    """
+    merged = copy.deepcopy(config if config is not None else load_config())
+    for section, values in (options or {}).items():
+        merged.setdefault(section, {}).update(values)
+    return merged
+
+
+def open_novel(site: str, novel_id: str, options: Optional[Dict[str, Dict[str, Any]]] = None,
+               config: Optional[Dict[str, Any]] = None) -> Tuple[SyosetuScraper, Dict, List[Chapter]]:
+    """Scraper, novel information and chapter list of a novel.
+
+    Args:
+        site (str): Site type ('ncode', 'novel18', 'mnlt', 'yomou', 'hameln')
+        novel_id (str): Novel ID
+        options (Dict, optional): Configuration overrides by section
+        config (Dict, optional): Base configuration, the saved one by default
+
+    Returns:
+        Tuple[SyosetuScraper, Dict, List[Chapter]]: Scraper, untranslated novel
+            information and chapter list; close the scraper when done with it
+    """
+    scraper = SyosetuScraper(site, build_config(options, config))
+    return scraper, scraper.get_novel_info(novel_id), scraper.get_chapter_list(novel_id)
+
+
+def resolve_range(chapter_range: ChapterRange, chapter_count: int) -> Optional[List[int]]:
+    """[start, end] of a chapter selection, or None for all chapters.
+
+    Raises:
+        ValueError: If the selection is malformed or out of range
+    """
+    if chapter_range is None:
+        return None
+    if isinstance(chapter_range, (str, int)):
+        return parse_chapter_range(chapter_range, chapter_count)
+    start, end = chapter_range
+    return parse_chapter_range(f"{start}-{end}", chapter_count)
+
+
+def novel_info(site: str, novel_id: str, options: Optional[Dict[str, Dict[str, Any]]] = None,
+               config: Optional[Dict[str, Any]] = None) -> Dict:
+    """Novel information, translated if translation is enabled.
+
+    Args:
+        site (str): Site type
+        novel_id (str): Novel ID
+        options (Dict, optional): Configuration overrides by section
+        config (Dict, optional): Base configuration, the saved one by default
+
+    Returns:
+        Dict: Novel information with the chapter list under 'chapters'
+    """
+    scraper, info, chapters = open_novel(site, novel_id, options, config)
+    with scraper:
+        info = translate_novel_info(scraper, info)
+    info['chapters'] = chapters
+    return info
+
+
+def scrape(site: str, novel_id: str, chapter_range: ChapterRange = None,
+           options: Optional[Dict[str, Dict[str, Any]]] = None,
+           config: Optional[Dict[str, Any]] = None) -> Iterator[Chapter]:
+    """Fetch, parse and translate chapters, yielding each one as soon as it is ready.
+
+    Chapters come out in order while later ones are still being fetched.
+    Stopping early (``break``, or closing the generator) stops the fetching.
+
+    Args:
+        site (str): Site type
+        novel_id (str): Novel ID
+        chapter_range (ChapterRange): Chapters to fetch, all by default
+        options (Dict, optional): Configuration overrides by section
+        config (Dict, optional): Base configuration, the saved one by default
+
+    Yields:
+        Chapter: Chapter with its content, ruby readings and illustrations
+
+    Raises:
+        ValueError: If the chapter range is invalid
+    """
+    scraper, _, chapters = open_novel(site, novel_id, options, config)
+    with scraper:
+        chapters_to_process = select_chapters(chapters, resolve_range(chapter_range, len(chapters)))
+        scraper.parser.translate_chapter_titles([chapter for _, chapter in chapters_to_process])
+        yield from chapter_source(scraper, novel_id, chapters_to_process, verbose=False)
+
+
+def download(site: str, novel_id: str, formats: Union[str, Sequence[str]] = "epub", chapter_range: ChapterRange = None,
+             include_info: bool = False, options: Optional[Dict[str, Dict[str, Any]]] = None,
+             config: Optional[Dict[str, Any]] = None) -> List[str]:
+    """Download chapters to files in one or more formats.
+
+    Args:
+        site (str): Site type
+        novel_id (str): Novel ID
+        formats (Union[str, Sequence[str]]): Output formats, see DOWNLOAD_FORMATS
+        chapter_range (ChapterRange): Chapters to download, all by default
+        include_info (bool): Whether to include novel information
+        options (Dict, optional): Configuration overrides by section
+        config (Dict, optional): Base configuration, the saved one by default
+
+    Returns:
+        List[str]: Written files
+
+    Raises:
+        ValueError: If a format or the chapter range is invalid
+    """
+    format_types = [formats] if isinstance(formats, str) else list(dict.fromkeys(formats))
+    invalid = [f for f in format_types if f not in DOWNLOAD_FORMATS]
+    if invalid or not format_types:
+        raise ValueError(f"Invalid format: {', '.join(invalid) or 'none given'}. "
+                         f"Available formats: {', '.join(DOWNLOAD_FORMATS)}")
+
+    scraper, info, chapters = open_novel(site, novel_id, options, config)
+    with scraper:
+        selected = resolve_range(chapter_range, len(chapters))
+        return export_chapters(scraper, novel_id, info, chapters, selected, format_types, include_info,
+                               verbose=False)
+
+
+async def scrape_async(site: str, novel_id: str, chapter_range: ChapterRange = None,
+                       options: Optional[Dict[str, Dict[str, Any]]] = None,
+                       config: Optional[Dict[str, Any]] = None) -> AsyncIterator[Chapter]:
+    """Asynchronous version of scrape; the event loop isn't blocked while chapters are fetched."""
+    loop = asyncio.get_running_loop()
+    chapters = scrape(site, novel_id, chapter_range, options, config)
+    # A single thread, so closing the generator waits for a pending next() instead of racing it
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="scrape")
+    try:
+        while True:
+            chapter = await loop.run_in_executor(executor, next, chapters, _END)
+            if chapter is _END:
+                break
+            yield chapter
+    finally:
+        executor.submit(chapters.close)
+        executor.shutdown(wait=False)
+
+
+async def download_async(site: str, novel_id: str, formats: Union[str, Sequence[str]] = "epub",
+                         chapter_range: ChapterRange = None, include_info: bool = False,
+                         options: Optional[Dict[str, Dict[str, Any]]] = None,
+                         config: Optional[Dict[str, Any]] = None) -> List[str]:
+    """Asynchronous version of download."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, lambda: download(site, novel_id, formats, chapter_range,
+                                                             include_info, options, config))
@@ -0,0 +1,435 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Offline benchmarks for the scraper and exporters.
+
+Usage:
+    python benchmark.py pdf-wrap [--paragraphs N] [--repeat N]
+    python benchmark.py epub-rebuild [--paragraphs N] [--repeat N]
+    python benchmark.py chapter-memory [--paragraphs N]
+    python benchmark.py scrape-small|scrape-1k|scrape-10k [--site SITE] [--format FORMAT] [--translate]
+                        [--latency S] [--jitter S] [--error-rate P] [--rate-limit-rate P]
+    python benchmark.py replay --archive FILE --novel-id ID [--site SITE] [--base-url URL] [--replay-timing]
+    python benchmark.py export-corpus [--chapters N] [--chapter-chars N] [--large-every N]
+                        [--large-chars N] [--format FORMAT]
+"""
+
+import sys
+import time
+import random
+import argparse
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+def _timed(func: Callable, repeat: int) -> float:
+    """Best wall-clock time of func over repeat runs."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _japanese_paragraphs(count: int, seed: int = 0) -> List[str]:
+    """Deterministic pseudo-Japanese paragraphs with punctuation and brackets."""
+    rng = random.Random(seed)
+    kana = "あいうえおかきくけこさしすせそたちつてとなにぬねのはひふへほまみむめもやゆよらりるれろわをん"
+    kanji = "日本語小説魔法剣士王国冒険者学園勇者世界転生異"
+    paragraphs = []
+    for _ in range(count):
+        parts = []
+        for _ in range(rng.randint(3, 12)):
+            parts.append(''.join(rng.choice(kana + kanji) for _ in range(rng.randint(5, 30))))
+            parts.append(rng.choice("、。、。「」…！？"))
+        paragraphs.append(''.join(parts))
+    return paragraphs
+
+
+def _english_paragraphs(count: int, seed: int = 0) -> List[str]:
+    """Deterministic English-like paragraphs, as produced by translation."""
+    rng = random.Random(seed)
+    words = ["the", "hero", "walked", "into", "kingdom", "magic", "sword", "adventurer", "guild",
+             "said", "quietly", "reincarnated", "another", "world", "academy", "princess"]
+    return [' '.join(rng.choice(words) for _ in range(rng.randint(20, 120))) + '.' for _ in range(count)]
+
+
+def bench_pdf_wrap(args) -> Dict[str, float]:
+    """Compare the legacy per-character stringWidth wrapping with LineBreaker."""
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.cidfonts import UnicodeCIDFont
+    from exporter import LineBreaker
+
+    font_name = 'HeiseiKakuGo-W5'
+    pdfmetrics.registerFont(UnicodeCIDFont(font_name))
+    font_size = 12
+    max_width = 412
+
+    def legacy_wrap(text: str) -> List[str]:
+        # The wrapping previously done inline in JapanesePdfExporter.create_pdf
+        lines = []
+        if any(ord(c) > 127 for c in text):
+            current_line = ""
+            for char in text:
+                test_line = current_line + char
+                if pdfmetrics.stringWidth(test_line, font_name, font_size) < max_width:
+                    current_line += char
+                else:
+                    lines.append(current_line)
+                    current_line = char
+            if current_line:
+                lines.append(current_line)
+        else:
+            current_line = []
+            for word in text.split():
+                test_line = ' '.join(current_line + [word])
+                if pdfmetrics.stringWidth(test_line, font_name, font_size) < max_width:
+                    current_line.append(word)
+                else:
+                    lines.append(' '.join(current_line))
+                    current_line = [word]
+            if current_line:
+                lines.append(' '.join(current_line))
+        return lines
+
+    results = {}
+    for label, paragraphs in (("japanese", _japanese_paragraphs(args.paragraphs)),
+                              ("english", _english_paragraphs(args.paragraphs))):
+        chars = sum(len(p) for p in paragraphs)
+        legacy = _timed(lambda: [legacy_wrap(p) for p in paragraphs], args.repeat)
+
+        def fast_wrap():
+            # A fresh breaker per run so glyph measurement is included in the timing
+            breaker = LineBreaker(font_name, font_size)
+            return [breaker.break_lines(p, max_width) for p in paragraphs]
+
+        fast = _timed(fast_wrap, args.repeat)
+        print(f"{label}: {len(paragraphs)} paragraphs, {chars} chars")
+        print(f"  legacy      {legacy * 1000:9.1f} ms")
+        print(f"  LineBreaker {fast * 1000:9.1f} ms  ({legacy / fast:.1f}x faster)")
+        results[f"{label}_legacy_s"] = legacy
+        results[f"{label}_linebreaker_s"] = fast
+    return results
+
+
+def bench_epub_rebuild(args) -> Dict[str, float]:
+    """Rebuild an EPUB with a cold render cache, a warm one, and one chapter changed."""
+    import tempfile
+    from exporter import StreamingEpubWriter, RenderCache
+
+    chapter_count = max(1, args.paragraphs // 10)
+    paragraphs = _japanese_paragraphs(chapter_count * 10)
+    chapters = [{'index': i + 1, 'title': f"第{i + 1}話", 'content': '\n\n'.join(paragraphs[i * 10:(i + 1) * 10])}
+                for i in range(chapter_count)]
+    novel_info = {'title': "Benchmark", 'author': "Benchmark", 'description': "", 'metadata': {}, 'url': ""}
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        cache = RenderCache(directory=f"{temp_dir}/cache")
+        RenderCache._shared = cache
+        output = f"{temp_dir}/bench.epub"
+
+        def build():
+            StreamingEpubWriter(output, novel_info).write(chapters)
+
+        cache.enabled = False
+        uncached = _timed(build, args.repeat)
+        cache.enabled = True
+        cold = _timed(lambda: (cache.clear(), build()), args.repeat)
+        warm = _timed(build, args.repeat)
+
+        def build_one_changed():
+            chapters[0]['content'] += "。"
+            build()
+
+        changed = _timed(build_one_changed, args.repeat)
+
+    print(f"{chapter_count} chapters")
+    print(f"  no cache    {uncached * 1000:9.1f} ms")
+    print(f"  cold cache  {cold * 1000:9.1f} ms")
+    print(f"  warm cache  {warm * 1000:9.1f} ms  ({uncached / warm:.1f}x faster)")
+    print(f"  1 changed   {changed * 1000:9.1f} ms")
+    return {'uncached_s': uncached, 'cold_s': cold, 'warm_s': warm, 'one_changed_s': changed}
+
+
+def bench_chapter_memory(args) -> Dict[str, float]:
+    """Peak memory of a fetched long novel as dicts with chunks, as Chapter records, and on disk."""
+    import os
+    import tempfile
+    import tracemalloc
+    from models import Chapter, ChapterStore
+
+    chapter_count = max(1, args.paragraphs // 10)
+    paragraphs = _japanese_paragraphs(chapter_count * 10)
+    # A few ruby spans per paragraph, as (start, end, reading)
+    spans = [[(i % 5, i % 5 + 2, "よみ")] for i in range(len(paragraphs))]
+    source_chars = sum(len(p) for p in paragraphs)
+
+    def legacy():
+        # List entry plus the copy built by the old build_chapter, content also kept as chunks
+        chapters = []
+        for i in range(chapter_count):
+            chapter_paragraphs = paragraphs[i * 10:(i + 1) * 10]
+            entry = {'index': i + 1, 'title': f"第{i + 1}話", 'chapter_num': str(i + 1),
+                     'url': f"https://ncode.syosetu.com/n0000aa/{i + 1}/"}
+            fetched = dict(entry, content='\n\n'.join(chapter_paragraphs),
+                           chunks=['\n\n'.join(chapter_paragraphs[:5]), '\n\n'.join(chapter_paragraphs[5:])],
+                           ruby=[list(s) for s in spans[i * 10:(i + 1) * 10]])
+            chapters.append(fetched)
+        return chapters
+
+    def compact(store=None):
+        chapters = []
+        for i in range(chapter_count):
+            chapter = Chapter(index=i + 1, title=f"第{i + 1}話", chapter_num=str(i + 1),
+                              url=f"https://ncode.syosetu.com/n0000aa/{i + 1}/",
+                              content='\n\n'.join(paragraphs[i * 10:(i + 1) * 10]),
+                              ruby=spans[i * 10:(i + 1) * 10])
+            if store:
+                chapter.offload(store)
+            chapters.append(chapter)
+        return chapters
+
+    def measure(build):
+        tracemalloc.start()
+        start = time.perf_counter()
+        chapters = build()
+        elapsed = time.perf_counter() - start
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        # Reading every chapter back, as an exporter does
+        start = time.perf_counter()
+        read_chars = sum(len(chapter['content']) for chapter in chapters)
+        read = time.perf_counter() - start
+        assert read_chars >= source_chars
+        return current, peak, elapsed, read
+
+    results = {}
+    with tempfile.TemporaryDirectory() as temp_dir:
+        store = ChapterStore(os.path.join(temp_dir, "chapters.sqlite"))
+        print(f"{chapter_count} chapters, {source_chars} chars")
+        for label, build in (("dict+chunks", legacy), ("Chapter", compact), ("Chapter+disk", lambda: compact(store))):
+            current, peak, elapsed, read = measure(build)
+            print(f"  {label:<13} retained {current / 2 ** 20:7.1f} MB  peak {peak / 2 ** 20:7.1f} MB  "
+                  f"build {elapsed * 1000:7.1f} ms  read all {read * 1000:7.1f} ms")
+            key = label.lower().replace('+', '_')
+            results[f"{key}_retained_bytes"] = current
+            results[f"{key}_peak_bytes"] = peak
+        store.close()
+    return results
+
+
+def _peak_rss_mb() -> Optional[float]:
+    """Peak resident memory of this process in MB, None where it can't be read."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Reported in bytes on macOS and in kilobytes elsewhere
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10
+
+
+def _scrape_novel(args, scraper, novel_id: str) -> Tuple[int, float, float, float]:
+    """Download a novel through the pipeline and export it to a temporary file.
+
+    Returns:
+        Tuple[int, float, float, float]: Chapters, seconds in total, seconds for
+            the chapter list, CPU seconds
+    """
+    import os
+    import tempfile
+    from main import select_chapters, fetch_chapters
+    from exporter import download_novel
+
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    novel_info = scraper.get_novel_info(novel_id)
+    chapters = scraper.get_chapter_list(novel_id)
+    scraper.parser.translate_chapter_titles(chapters)
+    list_time = time.perf_counter() - wall_start
+
+    source = fetch_chapters(scraper, select_chapters(chapters), verbose=False)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        if args.format == "none":
+            fetched = sum(1 for _ in source)
+        else:
+            counted = []
+            download_novel(novel_info, (counted.append(1) or chapter for chapter in source), args.format,
+                           include_novel_info=False, filepath=os.path.join(temp_dir, "bench"))
+            fetched = len(counted)
+    return fetched, time.perf_counter() - wall_start, list_time, time.process_time() - cpu_start
+
+
+def bench_scrape(args, chapter_count: int) -> Dict[str, float]:
+    """Fetch, parse, translate and export a whole novel served by mock_server.py.
+
+    The server runs in a separate process so its work isn't counted in the
+    CPU time and memory of the scraper.
+    """
+    import os
+    import copy
+    import subprocess
+    from config import DEFAULT_CONFIG
+    from main import SyosetuScraper
+
+    command = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "mock_server.py"),
+               "--port", "0", "--chapters", str(chapter_count), "--paragraphs", str(args.chapter_paragraphs),
+               "--latency", str(args.latency), "--jitter", str(args.jitter), "--error-rate", str(args.error_rate),
+               "--rate-limit-rate", str(args.rate_limit_rate), "--retry-after", "0.1",
+               "--translate-latency", str(args.translate_latency),
+               "--large-every", str(args.large_every), "--large-chars", str(args.large_chars)]
+    server = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    try:
+        url = server.stdout.readline().split()[-1]
+        config = copy.deepcopy(DEFAULT_CONFIG)
+        config['general'].update(delay=0, retry_backoff=0.1)
+        config['translation'].update(enabled=args.translate, service="google", fallback_services=[],
+                                     service_url=f"{url}/translate")
+        config['export'].update(images=False, render_cache=False)
+        config['pipeline'].update(fetch_workers=args.fetch_workers, translate_workers=args.translate_workers)
+        if args.record:
+            config['archive'].update(mode="record", path=args.record)
+        scraper = SyosetuScraper(args.site, config)
+        scraper.base_url = f"{url}/{args.site}"
+
+        fetched, elapsed, list_time, cpu = _scrape_novel(args, scraper, "n0000aa")
+        scraper.close()
+    finally:
+        server.terminate()
+        server.wait()
+
+    peak = _peak_rss_mb()
+    print(f"{args.site}: {fetched}/{chapter_count} chapters, {args.chapter_paragraphs} paragraphs each, "
+          f"export {args.format}{', translated' if args.translate else ''}")
+    print(f"  total       {elapsed:9.2f} s  ({fetched / elapsed:.1f} chapters/s)")
+    print(f"  chapter list{list_time:9.2f} s")
+    print(f"  CPU time    {cpu:9.2f} s  ({cpu / elapsed:.0%} of one core)")
+    if peak is not None:
+        print(f"  peak RSS    {peak:9.1f} MB")
+    return {'chapters': fetched, 'elapsed_s': elapsed, 'chapters_per_s': fetched / elapsed,
+            'cpu_s': cpu, 'peak_rss_mb': peak}
+
+
+def bench_replay(args) -> Dict[str, float]:
+    """Download a novel from an HTTP archive recorded with --record, without any network."""
+    import copy
+    from config import DEFAULT_CONFIG
+    from main import SyosetuScraper
+
+    if not args.archive or not args.novel_id:
+        print("The replay scenario needs --archive FILE and --novel-id ID")
+        return {}
+    config = copy.deepcopy(DEFAULT_CONFIG)
+    config['translation'].update(enabled=False)
+    config['export'].update(render_cache=False)
+    config['pipeline'].update(fetch_workers=args.fetch_workers)
+    config['archive'].update(mode="replay", path=args.archive, replay_timing=args.replay_timing)
+    scraper = SyosetuScraper(args.site, config)
+    if args.base_url:
+        scraper.base_url = args.base_url
+    fetched, elapsed, list_time, cpu = _scrape_novel(args, scraper, args.novel_id)
+    scraper.close()
+
+    peak = _peak_rss_mb()
+    print(f"{args.site} {args.novel_id} from {args.archive}: {fetched} chapters, export {args.format}"
+          f"{', original timing' if args.replay_timing else ''}")
+    print(f"  total       {elapsed:9.2f} s  ({fetched / elapsed:.1f} chapters/s)")
+    print(f"  chapter list{list_time:9.2f} s")
+    print(f"  CPU time    {cpu:9.2f} s  ({cpu / elapsed:.0%} of one core)")
+    if peak is not None:
+        print(f"  peak RSS    {peak:9.1f} MB")
+    return {'chapters': fetched, 'elapsed_s': elapsed, 'chapters_per_s': fetched / elapsed,
+            'cpu_s': cpu, 'peak_rss_mb': peak}
+
+
+def bench_export_corpus(args) -> Dict[str, float]:
+    """Export a generated novel (corpus.py) streamed chapter by chapter, without any network."""
+    import os
+    import tempfile
+    from corpus import SyntheticNovel
+    from exporter import download_novel
+
+    novel = SyntheticNovel("n0000aa", args.chapters, args.chapter_chars, large_every=args.large_every,
+                           large_chars=args.large_chars)
+    novel_info = novel.novel_info()
+    chars = []
+
+    def chapters():
+        for chapter in novel.iter_chapters():
+            chars.append(len(chapter['content']))
+            yield chapter
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        start = time.perf_counter()
+        cpu_start = time.process_time()
+        path = download_novel(novel_info, chapters(), args.format, include_novel_info=False,
+                              filepath=os.path.join(temp_dir, "bench"))
+        elapsed = time.perf_counter() - start
+        cpu = time.process_time() - cpu_start
+        size = os.path.getsize(path) if path and os.path.exists(path) else 0
+
+    peak = _peak_rss_mb()
+    total = sum(chars)
+    print(f"{len(chars)} chapters, {total / 10 ** 6:.1f} M chars, largest {max(chars, default=0) / 10 ** 6:.2f} M chars, "
+          f"export {args.format}")
+    print(f"  total       {elapsed:9.2f} s  ({len(chars) / elapsed:.1f} chapters/s, "
+          f"{total / elapsed / 10 ** 6:.2f} M chars/s, generation included)")
+    print(f"  CPU time    {cpu:9.2f} s")
+    print(f"  output      {size / 2 ** 20:9.1f} MB")
+    if peak is not None:
+        print(f"  peak RSS    {peak:9.1f} MB")
+    return {'chapters': len(chars), 'chars': total, 'elapsed_s': elapsed, 'cpu_s': cpu,
+            'output_bytes': size, 'peak_rss_mb': peak}
+
+
+SCENARIOS = {
+    'pdf-wrap': bench_pdf_wrap,
+    'epub-rebuild': bench_epub_rebuild,
+    'chapter-memory': bench_chapter_memory,
+    'scrape-small': lambda args: bench_scrape(args, 50),
+    'scrape-1k': lambda args: bench_scrape(args, 1000),
+    'scrape-10k': lambda args: bench_scrape(args, 10000),
+    'export-corpus': bench_export_corpus,
+    'replay': bench_replay,
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Syosetu Novel Scraper benchmarks")
+    parser.add_argument("scenario", choices=list(SCENARIOS.keys()), help="Benchmark scenario to run")
+    parser.add_argument("--paragraphs", type=int, default=2000, help="Number of paragraphs in the synthetic chapter")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of runs; the best time is reported")
+    scrape = parser.add_argument_group("scrape scenarios")
+    scrape.add_argument("--site", default="ncode", choices=["ncode", "novel18", "mnlt", "yomou", "hameln"],
+                        help="Site layout served by the mock server")
+    scrape.add_argument("--chapter-paragraphs", type=int, default=30, help="Paragraphs per chapter")
+    scrape.add_argument("--large-every", type=int, default=0,
+                        help="Make every Nth chapter a large one (also export-corpus)")
+    scrape.add_argument("--large-chars", type=int, default=1_000_000,
+                        help="Approximate characters of a large chapter (also export-corpus)")
+    scrape.add_argument("--format", default="epub", choices=["epub", "txt", "md", "jsonl", "pdf", "none"],
+                        help="Export format, none to only fetch")
+    scrape.add_argument("--fetch-workers", type=int, default=4, help="Threads downloading chapter pages")
+    scrape.add_argument("--translate-workers", type=int, default=1, help="Threads translating chapters")
+    scrape.add_argument("--translate", action="store_true", help="Translate through the stub translation service")
+    scrape.add_argument("--latency", type=float, default=0.0, help="Seconds every page response is delayed")
+    scrape.add_argument("--jitter", type=float, default=0.0, help="Random variation of the latency in seconds")
+    scrape.add_argument("--translate-latency", type=float, default=0.0, help="Seconds every translation is delayed")
+    scrape.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with 503")
+    scrape.add_argument("--rate-limit-rate", type=float, default=0.0, help="Share of requests answered with 429")
+    scrape.add_argument("--record", metavar="FILE", help="Record the mock server's traffic to an HTTP archive")
+    replay = parser.add_argument_group("replay scenario")
+    replay.add_argument("--archive", metavar="FILE", help="HTTP archive recorded with --record")
+    replay.add_argument("--novel-id", help="Novel ID of the recorded novel")
+    replay.add_argument("--base-url", help="Site URL the novel was recorded from, if not the real site")
+    replay.add_argument("--replay-timing", action="store_true", help="Wait as long as the recorded responses took")
+    corpus = parser.add_argument_group("export-corpus scenario")
+    corpus.add_argument("--chapters", type=int, default=10000, help="Chapters of the generated novel")
+    corpus.add_argument("--chapter-chars", type=int, default=3000, help="Approximate characters per chapter")
+    args = parser.parse_args(argv)
+
+    SCENARIOS[args.scenario](args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
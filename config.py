@@ -10,6 +10,9 @@ from typing import Dict, Any, Optional
 DEFAULT_CONFIG = {
     "general": {
         "delay": 1.0,
+        "max_retries": 3,  # Retries of a page request after a 429, a 5xx response or a dropped connection
+        "retry_backoff": 1.0,  # Seconds before the first retry, doubling with each one (Retry-After takes precedence)
+        "offline": False,  # Never request the novel sites; read pages and chapters from local data (--offline for one run)
         "user_agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
     },
     "translation": {
@@ -21,7 +24,51 @@ DEFAULT_CONFIG = {
         "translate_content": True,
         "concurrent_requests": 3,  # Number of concurrent translation requests
         "request_delay": 0.1,  # Delay between translation requests in seconds
-        "max_retries": 3  # Maximum number of retry attempts for failed translations
+        "max_retries": 3,  # Maximum number of retry attempts for failed translations
+        "fallback_services": [],  # Ordered backup services, e.g. ["mymemory", "libre"]
+        "service_url": "",  # Endpoint replacing the primary service's default URL, e.g. a proxy or a local stub
+        "hedge_percentile": 0.95,  # Hedge to the next service when a request is slower than this latency percentile
+        "failure_threshold": 3,  # Consecutive failures before a service is demoted
+        "failure_cooldown": 60.0  # Seconds a demoted service stays at the back of the chain
+    },
+    "export": {
+        "pdf_workers": 1,  # Processes rendering PDF chapters in parallel (1 renders in-process)
+        "split_volumes": "none",  # Options: none, arc, count, size
+        "volume_chapters": 500,  # Chapters per volume when splitting by count
+        "volume_size_mb": 20,  # Text size per volume in MB when splitting by size
+        "volume_workers": 4,  # Processes generating volumes in parallel
+        "compression": "none",  # Compression of txt/md/jsonl downloads. Options: none, gzip, zstd
+        "render_cache": True,  # Reuse rendered EPUB chapters that haven't changed
+        "render_cache_mb": 256,  # Size limit of the render cache in MB; least recently used chapters are deleted, 0 for no limit
+        "images": True,  # Download illustrations and embed them in EPUB files
+        "image_workers": 4,  # Concurrent illustration downloads
+        "image_max_dimension": 1600,  # Longest side of embedded illustrations in pixels, 0 to keep (needs Pillow)
+        "chapter_store": "memory"  # Where fetched chapter text is kept until export. Options: memory, disk
+    },
+    "pipeline": {
+        "fetch_workers": 1,  # Threads downloading chapter pages (each waits the request delay)
+        "parse_workers": 1,  # Threads extracting chapter text
+        "translate_workers": 1,  # Threads translating chapters
+        "assemble_workers": 2,  # Threads downloading illustrations and assembling chapters
+        "queue_size": 8  # Chapters waiting between two stages before the earlier one blocks
+    },
+    "distributed": {
+        "enabled": False,  # Hand chapter fetches and translations to worker nodes through a shared queue
+        "directory": "",  # Shared directory holding the queue and chapter store (default ~/.syosetu_scraper/distributed)
+        "worker_tasks": ["fetch", "translate"],  # Task kinds this node's workers take
+        "worker_threads": 2,  # Tasks a worker node processes at once
+        "lease_seconds": 120,  # How long a task stays reserved without a heartbeat
+        "max_attempts": 3,  # Attempts before a task is marked failed
+        "idle_timeout": 60  # Seconds a worker waits for new tasks before exiting, 0 to wait forever
+    },
+    "metrics": {
+        "port": 0,  # Serve Prometheus metrics on this local port while running, 0 to disable
+        "json_file": ""  # Write all metrics to this JSON file when a run ends
+    },
+    "archive": {
+        "mode": "off",  # Record HTTP traffic to the archive or replay it from there. Options: off, record, replay
+        "path": "",  # SQLite archive file (--record FILE / --replay FILE set both for one run)
+        "replay_timing": False  # Wait as long as each recorded response originally took when replaying
     }
 }
 
@@ -89,6 +136,7 @@ def setup_cli_args():
     
     # General configuration
     parser.add_argument("--delay", type=float, help="Delay between requests in seconds")
+    parser.add_argument("--fetch-retries", type=int, help="Retries of a page request after rate limiting or a server error")
     
     # Translation configuration
     parser.add_argument("--translation", choices=["enable", "disable"], help="Enable or disable translation")
@@ -102,10 +150,43 @@ def setup_cli_args():
     parser.add_argument("--concurrent-requests", type=int, help="Number of concurrent translation requests")
     parser.add_argument("--request-delay", type=float, help="Delay between translation requests in seconds")
     parser.add_argument("--max-retries", type=int, help="Maximum number of retry attempts for failed translations")
+    parser.add_argument("--fallback-translators", help="Comma-separated fallback translation services, in order (e.g., mymemory,libre)")
+    parser.add_argument("--translator-url", help="Endpoint replacing the translation service's default URL (empty to reset)")
+    parser.add_argument("--hedge-percentile", type=float, help="Latency percentile (0-1) after which a translation request is hedged to the next service")
+    
+    # Export configuration
+    parser.add_argument("--pdf-workers", type=int, help="Number of processes rendering PDF chapters in parallel")
+    parser.add_argument("--split-volumes", choices=["none", "arc", "count", "size"], help="Split downloads into volumes by arc, chapter count or size")
+    parser.add_argument("--volume-chapters", type=int, help="Chapters per volume when splitting by count")
+    parser.add_argument("--volume-size", type=float, help="Text size per volume in MB when splitting by size")
+    parser.add_argument("--volume-workers", type=int, help="Number of processes generating volumes in parallel")
+    parser.add_argument("--compress", choices=["none", "gzip", "zstd"], help="Compress plain text, Markdown and JSON Lines downloads")
+    parser.add_argument("--render-cache", choices=["enable", "disable"], help="Enable or disable the EPUB chapter render cache")
+    parser.add_argument("--images", choices=["enable", "disable"], help="Enable or disable downloading illustrations")
+    parser.add_argument("--image-max-size", type=int, help="Longest side of embedded illustrations in pixels (0 keeps the original size)")
+    parser.add_argument("--chapter-store", choices=["memory", "disk"], help="Keep fetched chapter text compressed in memory or on disk until export")
+    
+    # Pipeline configuration
+    parser.add_argument("--fetch-workers", type=int, help="Number of threads downloading chapter pages")
+    parser.add_argument("--parse-workers", type=int, help="Number of threads extracting chapter text")
+    parser.add_argument("--translate-workers", type=int, help="Number of threads translating chapters")
+    parser.add_argument("--assemble-workers", type=int, help="Number of threads downloading illustrations and assembling chapters")
+    parser.add_argument("--queue-size", type=int, help="Chapters queued between pipeline stages")
+    
+    # Distributed configuration
+    parser.add_argument("--distributed", choices=["enable", "disable"], help="Enable or disable handing downloads to worker nodes")
+    parser.add_argument("--shared-dir", help="Shared directory for the task queue and chapter store")
+    parser.add_argument("--worker-tasks", help="Comma-separated task kinds this node's workers take (fetch, translate)")
+    parser.add_argument("--worker-threads", type=int, help="Number of tasks a worker node processes at once")
+    
+    # Metrics configuration
+    parser.add_argument("--metrics-port", type=int, help="Serve Prometheus metrics on this local port (0 disables)")
+    parser.add_argument("--metrics-json", help="Write metrics to this JSON file at the end of a run (empty disables)")
     
     # Config management
     parser.add_argument("--show-config", action="store_true", help="Show current configuration")
     parser.add_argument("--reset-config", action="store_true", help="Reset configuration to defaults")
+    parser.add_argument("--clear-render-cache", action="store_true", help="Delete the EPUB chapter render cache")
     
     return parser
 
@@ -120,6 +201,10 @@ def process_cli_args(args):
         config = update_config("general", "delay", args.delay)
         changes_made = True
     
+    if args.fetch_retries is not None:
+        config = update_config("general", "max_retries", max(0, args.fetch_retries))
+        changes_made = True
+    
     # Translation configuration
     if args.translation:
         config = update_config("translation", "enabled", args.translation == "enable")
@@ -157,6 +242,105 @@ def process_cli_args(args):
         config = update_config("translation", "max_retries", args.max_retries)
         changes_made = True
     
+    if args.fallback_translators is not None:
+        fallback_services = [s.strip().lower() for s in args.fallback_translators.split(",") if s.strip()]
+        config = update_config("translation", "fallback_services", fallback_services)
+        changes_made = True
+    
+    if args.hedge_percentile is not None:
+        config = update_config("translation", "hedge_percentile", args.hedge_percentile)
+        changes_made = True
+    
+    if args.translator_url is not None:
+        config = update_config("translation", "service_url", args.translator_url)
+        changes_made = True
+    
+    # Export configuration
+    if args.pdf_workers is not None:
+        config = update_config("export", "pdf_workers", max(1, args.pdf_workers))
+        changes_made = True
+    
+    if args.split_volumes:
+        config = update_config("export", "split_volumes", args.split_volumes)
+        changes_made = True
+    
+    if args.volume_chapters is not None:
+        config = update_config("export", "volume_chapters", max(1, args.volume_chapters))
+        changes_made = True
+    
+    if args.volume_size is not None:
+        config = update_config("export", "volume_size_mb", args.volume_size)
+        changes_made = True
+    
+    if args.volume_workers is not None:
+        config = update_config("export", "volume_workers", max(1, args.volume_workers))
+        changes_made = True
+    
+    if args.compress:
+        config = update_config("export", "compression", args.compress)
+        changes_made = True
+    
+    if args.render_cache:
+        config = update_config("export", "render_cache", args.render_cache == "enable")
+        changes_made = True
+    
+    if args.images:
+        config = update_config("export", "images", args.images == "enable")
+        changes_made = True
+    
+    if args.image_max_size is not None:
+        config = update_config("export", "image_max_dimension", max(0, args.image_max_size))
+        changes_made = True
+    
+    if args.chapter_store:
+        config = update_config("export", "chapter_store", args.chapter_store)
+        changes_made = True
+    
+    if args.fetch_workers is not None:
+        config = update_config("pipeline", "fetch_workers", max(1, args.fetch_workers))
+        changes_made = True
+    
+    if args.parse_workers is not None:
+        config = update_config("pipeline", "parse_workers", max(1, args.parse_workers))
+        changes_made = True
+    
+    if args.translate_workers is not None:
+        config = update_config("pipeline", "translate_workers", max(1, args.translate_workers))
+        changes_made = True
+    
+    if args.assemble_workers is not None:
+        config = update_config("pipeline", "assemble_workers", max(1, args.assemble_workers))
+        changes_made = True
+    
+    if args.queue_size is not None:
+        config = update_config("pipeline", "queue_size", max(1, args.queue_size))
+        changes_made = True
+    
+    if args.distributed:
+        config = update_config("distributed", "enabled", args.distributed == "enable")
+        changes_made = True
+    
+    if args.shared_dir is not None:
+        config = update_config("distributed", "directory", os.path.abspath(args.shared_dir) if args.shared_dir else "")
+        changes_made = True
+    
+    if args.worker_tasks:
+        tasks = [task.strip() for task in args.worker_tasks.split(",") if task.strip() in ("fetch", "translate")]
+        config = update_config("distributed", "worker_tasks", tasks or ["fetch", "translate"])
+        changes_made = True
+    
+    if args.worker_threads is not None:
+        config = update_config("distributed", "worker_threads", max(1, args.worker_threads))
+        changes_made = True
+    
+    if args.metrics_port is not None:
+        config = update_config("metrics", "port", max(0, args.metrics_port))
+        changes_made = True
+    
+    if args.metrics_json is not None:
+        config = update_config("metrics", "json_file", os.path.abspath(args.metrics_json) if args.metrics_json else "")
+        changes_made = True
+    
 
     
     # Config management
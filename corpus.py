@@ -0,0 +1,304 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Deterministic synthetic novels for load, memory and parser testing.
+
+A SyntheticNovel produces Japanese-looking chapters with dialogue, ruby
+readings, scene breaks and arcs, for any number of chapters and chapter
+sizes up to megabytes, either as Chapter records for the exporters or as
+site HTML in the structure each parser expects. Every chapter depends only
+on the novel's parameters and seed and is generated on demand, so even
+tens of thousands of chapters never have to be held at once and runs with
+the same seed see identical text.
+
+Usage:
+    python corpus.py OUTPUT_DIR [--site SITE] [--chapters N] [--chapter-chars N]
+                     [--large-every N] [--large-chars N] [--seed N]
+"""
+
+import os
+import sys
+import html
+import random
+import argparse
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from models import Chapter
+
+# Page structure of each site type
+SITE_LAYOUTS = {
+    'ncode': 'ncode',
+    'novel18': 'novel18',
+    'yomou': 'ncode',
+    'mnlt': 'mobile',
+    'hameln': 'hameln'
+}
+
+_HIRAGANA = "あいうえおかきくけこさしすせそたちつてとなにぬねのはひふへほまみむめもやゆよらりるれろわをんがぎぐげござじずぜぞだぢづでどばびぶべぼぱぴぷぺぽ"
+_KATAKANA = "アイウエオカキクケコサシスセソタチツテトナニヌネノハヒフヘホマミムメモヤユヨラリルレロワンガギグゲゴザジズゼゾダデドバビブベボパピプペポー"
+_KANJI = "日本語小説魔法剣士王国冒険者学園勇者世界転生異迷宮聖女騎士団長竜姫神殿精霊森街城門空海山川雨風雪炎氷光闇心声目手足顔名前時間今朝夜"
+_PARTICLES = ["は", "が", "を", "に", "で", "と", "の", "も", "へ", "から", "まで", "より"]
+_ENDINGS = ["た", "だ", "です", "ます", "だった", "ている", "ました", "のだ", "らしい", "かもしれない"]
+_SCENE_BREAK = "◇　◇　◇"
+
+# Paragraph as (base text, reading or None) segments; an empty list is a blank line
+Segment = Tuple[str, Optional[str]]
+
+
+class SyntheticNovel:
+    """A generated novel, fully determined by its parameters and seed."""
+
+    def __init__(self, novel_id: str = "n0000aa", chapters: int = 100, chapter_chars: int = 3000,
+                 paragraphs: Optional[int] = None, arc_size: int = 50, ruby_rate: float = 0.05, dialogue_rate: float = 0.35,
+                 large_every: int = 0, large_chars: int = 1_000_000, seed: int = 0):
+        """Initialize the novel; nothing is generated until it's read.
+
+        Args:
+            novel_id (str): Novel ID, also part of the seed of every chapter
+            chapters (int): Number of chapters
+            chapter_chars (int): Approximate characters of text per chapter
+            paragraphs (Optional[int]): Exact paragraphs per chapter (blank lines included)
+                instead of a character count; large chapters still use large_chars
+            arc_size (int): Chapters per arc
+            ruby_rate (float): Share of kanji words given a ruby reading
+            dialogue_rate (float): Share of paragraphs that are dialogue lines
+            large_every (int): Make every Nth chapter a large one, 0 for none
+            large_chars (int): Approximate characters of a large chapter
+            seed (int): Seed; the same seed always gives the same text
+        """
+        self.novel_id = novel_id
+        self.chapters = chapters
+        self.chapter_chars = chapter_chars
+        self.paragraphs = paragraphs
+        self.arc_size = max(1, arc_size)
+        self.ruby_rate = ruby_rate
+        self.dialogue_rate = dialogue_rate
+        self.large_every = large_every
+        self.large_chars = large_chars
+        self.seed = seed
+
+        # Vocabulary shared by all chapters: kanji compounds with readings, kana words, names
+        rng = random.Random(f"{seed}:{novel_id}:vocabulary")
+        self.kanji_words = [(''.join(rng.choice(_KANJI) for _ in range(rng.randint(1, 3))),
+                             ''.join(rng.choice(_HIRAGANA) for _ in range(rng.randint(2, 6))))
+                            for _ in range(400)]
+        self.kana_words = [''.join(rng.choice(_HIRAGANA) for _ in range(rng.randint(2, 5))) for _ in range(400)]
+        self.names = [''.join(rng.choice(_KATAKANA) for _ in range(rng.randint(2, 5))) for _ in range(12)]
+        self.title = f"{rng.choice(self.kanji_words)[0]}の{rng.choice(self.kanji_words)[0]}～{self.names[0]}の物語～"
+        self.author = f"{self.names[1]}{rng.choice(self.kanji_words)[0]}"
+        self.description = '\n'.join(self._sentence(rng, ruby=False) for _ in range(4))
+
+    def arc(self, number: int) -> str:
+        """Arc title of a chapter (1-based)."""
+        arc = (number - 1) // self.arc_size + 1
+        rng = random.Random(f"{self.seed}:{self.novel_id}:arc:{arc}")
+        return f"第{arc}章　{rng.choice(self.kanji_words)[0]}{rng.choice(['編', '篇', 'の章'])}"
+
+    def chapter_title(self, number: int) -> str:
+        """Title of a chapter (1-based)."""
+        rng = random.Random(f"{self.seed}:{self.novel_id}:title:{number}")
+        return f"第{number}話　{rng.choice(self.kanji_words)[0]}と{rng.choice(self.names)}"
+
+    def chapter_size(self, number: int) -> int:
+        """Approximate characters of a chapter when sized by characters."""
+        if self.large_every and number % self.large_every == 0:
+            return self.large_chars
+        return self.chapter_chars
+
+    def _sentence(self, rng: random.Random, ruby: bool = True) -> str:
+        return ''.join(text for text, _ in self._sentence_segments(rng, ruby))
+
+    def _sentence_segments(self, rng: random.Random, ruby: bool = True) -> List[Segment]:
+        segments: List[Segment] = []
+        for _ in range(rng.randint(2, 5)):
+            roll = rng.random()
+            if roll < 0.45:
+                word, reading = rng.choice(self.kanji_words)
+                segments.append((word, reading if ruby and rng.random() < self.ruby_rate else None))
+            elif roll < 0.6:
+                segments.append((rng.choice(self.names), None))
+            else:
+                segments.append((rng.choice(self.kana_words), None))
+            segments.append((rng.choice(_PARTICLES), None))
+        segments.append((rng.choice(self.kana_words) + rng.choice(_ENDINGS) + rng.choice("。。。！？…"), None))
+        return segments
+
+    def chapter_segments(self, number: int) -> List[List[Segment]]:
+        """Paragraphs of a chapter as segments; the same number always gives the same text."""
+        rng = random.Random(f"{self.seed}:{self.novel_id}:{number}")
+        large = bool(self.large_every) and number % self.large_every == 0
+        count = None if large else self.paragraphs
+        target = self.chapter_size(number)
+        paragraphs: List[List[Segment]] = []
+        length = 0
+        while len(paragraphs) < count if count else length < target:
+            roll = rng.random()
+            if roll < 0.08:
+                paragraphs.append([])  # Blank line between blocks of text
+                continue
+            if roll < 0.09:
+                paragraph = [(_SCENE_BREAK, None)]
+            elif roll < 0.09 + self.dialogue_rate:
+                paragraph = [("「", None)]
+                for _ in range(rng.randint(1, 2)):
+                    paragraph.extend(self._sentence_segments(rng))
+                paragraph.append(("」", None))
+            else:
+                paragraph = [("　", None)]
+                for _ in range(rng.randint(2, 6)):
+                    paragraph.extend(self._sentence_segments(rng))
+            paragraphs.append(paragraph)
+            length += sum(len(text) for text, _ in paragraph)
+        return paragraphs
+
+    def chapter_text(self, number: int) -> Tuple[List[str], List[List[Tuple[int, int, str]]]]:
+        """Non-empty paragraphs of a chapter and their (start, end, reading) ruby spans.
+
+        The same paragraphs and spans the site parsers extract from the
+        chapter's HTML.
+        """
+        paragraphs = []
+        spans = []
+        for paragraph in self.chapter_segments(number):
+            text = ''.join(segment for segment, _ in paragraph)
+            # Parsers strip paragraphs, shifting the readings with them
+            stripped = text.strip()
+            if not stripped:
+                continue
+            shift = len(text) - len(text.lstrip())
+            paragraph_spans = []
+            offset = -shift
+            for segment, reading in paragraph:
+                if reading:
+                    paragraph_spans.append((offset, offset + len(segment), reading))
+                offset += len(segment)
+            paragraphs.append(stripped)
+            spans.append(paragraph_spans)
+        return paragraphs, spans
+
+    def chapter(self, number: int, url: Optional[str] = None) -> Chapter:
+        """Chapter record with content, ruby readings and arc, as the scraper produces it."""
+        paragraphs, spans = self.chapter_text(number)
+        return Chapter(index=number, title=self.chapter_title(number), chapter_num=str(number),
+                       url=url or f"https://ncode.syosetu.com/{self.novel_id}/{number}/",
+                       arc=self.arc(number), content='\n\n'.join(paragraphs),
+                       ruby=spans if any(spans) else None)
+
+    def iter_chapters(self, start: int = 1, end: Optional[int] = None) -> Iterator[Chapter]:
+        """Chapters start..end (inclusive), generated one at a time."""
+        for number in range(start, (end or self.chapters) + 1):
+            yield self.chapter(number)
+
+    def novel_info(self) -> Dict:
+        """Novel information in the form the parsers return."""
+        return {'title': self.title, 'author': self.author, 'description': self.description,
+                'url': f"https://ncode.syosetu.com/{self.novel_id}/", 'metadata': {'keywords': self.names[:3]}}
+
+    def paragraph_html(self, paragraph: List[Segment]) -> str:
+        """A paragraph's inner HTML, readings as <ruby> with <rp> fallbacks; blank lines as <br />."""
+        if not paragraph:
+            return "<br />"
+        return ''.join(f"<ruby>{html.escape(text)}<rp>(</rp><rt>{html.escape(reading)}</rt><rp>)</rp></ruby>"
+                       if reading else html.escape(text) for text, reading in paragraph)
+
+
+def render_novel_page(layout: str, novel: SyntheticNovel) -> str:
+    """Table of contents page of a novel in a site's layout (see SITE_LAYOUTS)."""
+    title, author, description = (html.escape(novel.title), html.escape(novel.author),
+                                  html.escape(novel.description).replace('\n', "<br />"))
+    numbers = range(1, novel.chapters + 1)
+    if layout == 'hameln':
+        # Every arc heading is a table of its own, followed by a table of its chapters
+        rows = []
+        for number in numbers:
+            if (number - 1) % novel.arc_size == 0:
+                rows.append(f"</table><table><tr><td colspan=2><strong>{html.escape(novel.arc(number))}</strong>"
+                            f"</td></tr></table><table>")
+            rows.append(f"<tr class=\"bgcolor{2 + number % 2}\"><td><a href=\"./{number}.html\">"
+                        f"{html.escape(novel.chapter_title(number))}</a></td>"
+                        f"<td><time datetime=\"2024-01-01T00:00:00+09:00\">2024年01月01日(月) 00:00</time></td></tr>")
+        keywords = ''.join(f"<span itemprop=\"keywords\">{html.escape(name)}</span>" for name in novel.names[:3])
+        return (f"<html><head><meta charset=\"utf-8\"><title>{title}</title></head><body><div id=\"maind\">"
+                f"<div class=\"ss\"><span itemprop=\"name\">{title}</span>作：<span itemprop=\"author\">{author}</span></div>"
+                f"<div class=\"ss\">{description}</div><div class=\"ss\">{keywords}</div>"
+                f"<div class=\"ss\"><table>{''.join(rows)}</table></div></div></body></html>")
+    if layout == 'mobile':
+        links = ''.join(f"<div class=\"chapter_title\"><a href=\"/{novel.novel_id}/{number}/\">"
+                        f"{html.escape(novel.chapter_title(number))}</a></div>" for number in numbers)
+        return (f"<html><head><meta charset=\"utf-8\"><title>{title}</title></head><body><h1>{title}</h1>"
+                f"<div class=\"novel_writername\">作者：{author}</div><div class=\"novel_introduction\">{description}</div>"
+                f"{links}</body></html>")
+    rows = []
+    for number in numbers:
+        if (number - 1) % novel.arc_size == 0:
+            rows.append(f"<div class=\"chapter_title\">{html.escape(novel.arc(number))}</div>")
+        rows.append(f"<dl class=\"novel_sublist2\"><dd class=\"subtitle\"><a href=\"/{novel.novel_id}/{number}/\">"
+                    f"{html.escape(novel.chapter_title(number))}</a></dd><dt class=\"long_update\">2024/01/01 00:00</dt></dl>")
+    notice = "<div class=\"contents1\">この作品は18禁です</div>" if layout == 'novel18' else ""
+    keywords = ''.join(f"<a>{html.escape(name)}</a>" for name in novel.names[:3])
+    return (f"<html><head><meta charset=\"utf-8\"><title>{title}</title></head><body>{notice}"
+            f"<p class=\"novel_title\">{title}</p><div class=\"novel_writername\">作者：<a>{author}</a></div>"
+            f"<div id=\"novel_ex\">{description}</div><div class=\"novel_genre\">ハイファンタジー</div>"
+            f"<div class=\"keyword\">{keywords}</div>"
+            f"<div class=\"index_box\">{''.join(rows)}</div></body></html>")
+
+
+def render_chapter_page(layout: str, novel: SyntheticNovel, number: int) -> str:
+    """Page of one chapter in a site's layout (see SITE_LAYOUTS)."""
+    title = html.escape(novel.chapter_title(number))
+    paragraphs = [novel.paragraph_html(paragraph) for paragraph in novel.chapter_segments(number)]
+    if layout == 'hameln':
+        body = ''.join(f"<p id=\"{i}\">{p}</p>" for i, p in enumerate(paragraphs, 1))
+        return (f"<html><head><meta charset=\"utf-8\"></head><body><div id=\"maind\"><div class=\"ss\">"
+                f"<p><span style=\"font-size:120%\">{title}</span></p><div id=\"honbun\">{body}</div>"
+                f"</div></div></body></html>")
+    body = ''.join(f"<p id=\"L{i}\">{p}</p>" for i, p in enumerate(paragraphs, 1))
+    if layout == 'mobile':
+        return (f"<html><head><meta charset=\"utf-8\"></head><body><h1>{title}</h1>"
+                f"<div class=\"novel_content\">{body}</div></body></html>")
+    return (f"<html><head><meta charset=\"utf-8\"></head><body><p class=\"novel_subtitle\">{title}</p>"
+            f"<div id=\"novel_honbun\" class=\"novel_view\">{body}</div></body></html>")
+
+
+def write_site(novel: SyntheticNovel, site_type: str, directory: str) -> int:
+    """Write a novel's pages under directory, laid out like the site's URLs.
+
+    Returns:
+        int: Characters written
+    """
+    layout = SITE_LAYOUTS[site_type]
+    root = os.path.join(directory, 'novel', novel.novel_id) if layout == 'hameln' else os.path.join(directory, novel.novel_id)
+    os.makedirs(root, exist_ok=True)
+    with open(os.path.join(root, "index.html"), 'w', encoding='utf-8') as f:
+        written = f.write(render_novel_page(layout, novel))
+    for number in range(1, novel.chapters + 1):
+        if layout == 'hameln':
+            path = os.path.join(root, f"{number}.html")
+        else:
+            os.makedirs(os.path.join(root, str(number)), exist_ok=True)
+            path = os.path.join(root, str(number), "index.html")
+        with open(path, 'w', encoding='utf-8') as f:
+            written += f.write(render_chapter_page(layout, novel, number))
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic novel as site HTML")
+    parser.add_argument("output", help="Directory to write the pages to")
+    parser.add_argument("--site", default="ncode", choices=list(SITE_LAYOUTS.keys()), help="Site layout")
+    parser.add_argument("--novel-id", default="n0000aa", help="Novel ID")
+    parser.add_argument("--chapters", type=int, default=100, help="Number of chapters")
+    parser.add_argument("--chapter-chars", type=int, default=3000, help="Approximate characters per chapter")
+    parser.add_argument("--large-every", type=int, default=0, help="Make every Nth chapter a large one")
+    parser.add_argument("--large-chars", type=int, default=1_000_000, help="Approximate characters of a large chapter")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the generated text")
+    args = parser.parse_args(argv)
+
+    novel = SyntheticNovel(args.novel_id, args.chapters, args.chapter_chars, large_every=args.large_every,
+                           large_chars=args.large_chars, seed=args.seed)
+    written = write_site(novel, args.site, args.output)
+    print(f"Wrote {novel.chapters} chapters of {novel.title} ({written / 10 ** 6:.1f} M characters) to {args.output}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,495 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import time
+import socket
+import sqlite3
+import threading
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+from bs4 import BeautifulSoup
+
+from config import CONFIG_DIR
+from models import Chapter, ChapterStore
+from profiling import span
+
+# Default location of the shared queue and chapter store. Point every node at
+# the same directory on a shared volume to spread a download over machines.
+DISTRIBUTED_DIR = os.path.join(CONFIG_DIR, "distributed")
+QUEUE_FILE_NAME = "queue.sqlite"
+STORE_FILE_NAME = "chapters.sqlite"
+
+TASK_KINDS = ("fetch", "translate")
+
+
+def shared_paths(distributed_config: Dict[str, Any]) -> tuple:
+    """Queue and chapter store files in the configured shared directory."""
+    directory = distributed_config.get("directory") or DISTRIBUTED_DIR
+    return os.path.join(directory, QUEUE_FILE_NAME), os.path.join(directory, STORE_FILE_NAME)
+
+
+class TaskQueue:
+    """Durable queue of chapter tasks in a SQLite file shared by all nodes.
+
+    A download is a job with one ``fetch`` task per chapter; when the job is
+    translated, every finished fetch adds a ``translate`` task. Workers lease
+    a task for a limited time and renew the lease with heartbeats while they
+    work on it. A task whose lease runs out (its worker died or lost the
+    shared volume) goes back to the queue and is retried, up to
+    ``max_attempts`` times.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY,
+            site TEXT NOT NULL,
+            novel_id TEXT NOT NULL,
+            translate INTEGER NOT NULL,
+            target_language TEXT,
+            created REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS tasks (
+            id INTEGER PRIMARY KEY,
+            job_id INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            position INTEGER NOT NULL,
+            chapter_index INTEGER NOT NULL,
+            url TEXT NOT NULL,
+            payload TEXT,
+            state TEXT NOT NULL DEFAULT 'pending',
+            owner TEXT,
+            lease_expires REAL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            result TEXT,
+            error TEXT,
+            updated REAL,
+            UNIQUE (job_id, position, kind)
+        );
+        CREATE INDEX IF NOT EXISTS tasks_by_state ON tasks (state, kind, job_id, position);
+    """
+
+    def __init__(self, path: str, max_attempts: int = 3):
+        """Open or create the queue.
+
+        Args:
+            path (str): SQLite database file, on a volume shared by all nodes
+            max_attempts (int): Leases a task gets before it's marked failed
+        """
+        self.path = path
+        self.max_attempts = max_attempts
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # Transactions are managed explicitly so a lease is a single atomic step
+        self.connection = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+        columns = [row[1] for row in self.connection.execute("PRAGMA table_info(tasks)")]
+        if columns and 'position' not in columns:
+            self.connection.close()
+            raise ValueError(f"Task queue {path} was created by an older version; "
+                             "let its jobs finish and delete it, or use another file")
+        self.connection.executescript(self.SCHEMA)
+
+    def _transaction(self, statements: Callable[[sqlite3.Cursor], Any]) -> Any:
+        """Run statements in a write transaction, serialized across processes."""
+        with self.lock:
+            cursor = self.connection.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                result = statements(cursor)
+                cursor.execute("COMMIT")
+                return result
+            except BaseException:
+                cursor.execute("ROLLBACK")
+                raise
+
+    def submit(self, site: str, novel_id: str, chapters: Iterable[Dict], translate: bool = False,
+               target_language: Optional[str] = None) -> int:
+        """Add a job with a fetch task for every chapter.
+
+        Tasks are keyed by each chapter's position in chapters, since ``index``
+        restarts in every arc on some sites.
+
+        Args:
+            site (str): Site type of the novel
+            novel_id (str): Novel ID
+            chapters (Iterable[Dict]): Chapters with ``index``, ``url`` and source ``title``, in order
+            translate (bool): Whether fetched chapters are translated
+            target_language (str, optional): Language to translate to
+
+        Returns:
+            int: Job ID
+        """
+        def insert(cursor):
+            now = time.time()
+            cursor.execute("INSERT INTO jobs (site, novel_id, translate, target_language, created) VALUES (?, ?, ?, ?, ?)",
+                           (site, novel_id, int(translate), target_language, now))
+            job_id = cursor.lastrowid
+            cursor.executemany(
+                "INSERT INTO tasks (job_id, kind, position, chapter_index, url, payload, updated) "
+                "VALUES (?, 'fetch', ?, ?, ?, ?, ?)",
+                [(job_id, position, chapter['index'], chapter['url'],
+                  json.dumps({'title': chapter.get('source_title', chapter['title'])}, ensure_ascii=False), now)
+                 for position, chapter in enumerate(chapters)])
+            return job_id
+
+        return self._transaction(insert)
+
+    def job(self, job_id: int) -> Optional[Dict]:
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT id, site, novel_id, translate, target_language FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        return {'id': row[0], 'site': row[1], 'novel_id': row[2], 'translate': bool(row[3]), 'target_language': row[4]}
+
+    def lease(self, owner: str, kinds: Iterable[str] = TASK_KINDS, lease_seconds: float = 120.0) -> Optional[Dict]:
+        """Take the next available task.
+
+        Tasks of earlier jobs and chapters come first. A task whose lease
+        expired is available again, unless it used up its attempts, in
+        which case it's marked failed.
+
+        Args:
+            owner (str): Worker ID
+            kinds (Iterable[str]): Task kinds this worker handles
+            lease_seconds (float): How long the task is reserved without a heartbeat
+
+        Returns:
+            Optional[Dict]: Task with ``id``, ``job_id``, ``kind``, ``position``,
+                ``chapter_index``, ``url``, ``payload`` and ``attempts``, or None if there is nothing to do
+        """
+        kinds = list(kinds)
+        placeholders = ", ".join("?" for _ in kinds)
+
+        def take(cursor):
+            now = time.time()
+            cursor.execute("UPDATE tasks SET state = 'failed', error = 'lease expired too often', updated = ? "
+                           "WHERE state = 'leased' AND lease_expires < ? AND attempts >= ?",
+                           (now, now, self.max_attempts))
+            row = cursor.execute(
+                f"SELECT id, job_id, kind, position, chapter_index, url, payload, attempts FROM tasks "
+                f"WHERE kind IN ({placeholders}) AND (state = 'pending' OR (state = 'leased' AND lease_expires < ?)) "
+                f"ORDER BY job_id, position, kind LIMIT 1", kinds + [now]).fetchone()
+            if row is None:
+                return None
+            cursor.execute("UPDATE tasks SET state = 'leased', owner = ?, lease_expires = ?, attempts = attempts + 1, "
+                           "updated = ? WHERE id = ?", (owner, now + lease_seconds, now, row[0]))
+            return {'id': row[0], 'job_id': row[1], 'kind': row[2], 'position': row[3], 'chapter_index': row[4],
+                    'url': row[5], 'payload': json.loads(row[6]) if row[6] else {}, 'attempts': row[7] + 1}
+
+        return self._transaction(take)
+
+    def heartbeat(self, task_id: int, owner: str, lease_seconds: float = 120.0) -> bool:
+        """Extend a lease. Returns False if the task is no longer leased to owner."""
+        def extend(cursor):
+            now = time.time()
+            cursor.execute("UPDATE tasks SET lease_expires = ?, updated = ? WHERE id = ? AND owner = ? AND state = 'leased'",
+                           (now + lease_seconds, now, task_id, owner))
+            return cursor.rowcount == 1
+
+        return self._transaction(extend)
+
+    def complete(self, task_id: int, owner: str, result: Dict, follow_up: Optional[Dict] = None) -> bool:
+        """Mark a task done, optionally adding the task that continues it.
+
+        Args:
+            task_id (int): Task ID
+            owner (str): Worker ID holding the lease
+            result (Dict): JSON-serializable result
+            follow_up (Dict, optional): Next task with ``kind`` and ``payload``
+
+        Returns:
+            bool: False if the lease had been lost and another worker may redo the task
+        """
+        def finish(cursor):
+            now = time.time()
+            cursor.execute("UPDATE tasks SET state = 'done', result = ?, error = NULL, updated = ? "
+                           "WHERE id = ? AND owner = ? AND state = 'leased'",
+                           (json.dumps(result, ensure_ascii=False), now, task_id, owner))
+            if cursor.rowcount != 1:
+                return False
+            if follow_up:
+                cursor.execute(
+                    "INSERT INTO tasks (job_id, kind, position, chapter_index, url, payload, updated) "
+                    "SELECT job_id, ?, position, chapter_index, url, ?, ? FROM tasks WHERE id = ?",
+                    (follow_up['kind'], json.dumps(follow_up.get('payload', {}), ensure_ascii=False), now, task_id))
+            return True
+
+        return self._transaction(finish)
+
+    def fail(self, task_id: int, owner: str, error: str) -> bool:
+        """Give a task back after an error; it's retried until it runs out of attempts."""
+        def give_back(cursor):
+            cursor.execute("UPDATE tasks SET state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+                           "owner = NULL, error = ?, updated = ? WHERE id = ? AND owner = ? AND state = 'leased'",
+                           (self.max_attempts, error, time.time(), task_id, owner))
+            return cursor.rowcount == 1
+
+        return self._transaction(give_back)
+
+    def release(self, task_id: int, owner: str) -> bool:
+        """Give a task back without counting the attempt, e.g. when a worker is stopped."""
+        def give_back(cursor):
+            cursor.execute("UPDATE tasks SET state = 'pending', owner = NULL, attempts = MAX(0, attempts - 1), "
+                           "updated = ? WHERE id = ? AND owner = ? AND state = 'leased'",
+                           (time.time(), task_id, owner))
+            return cursor.rowcount == 1
+
+        return self._transaction(give_back)
+
+    def chapter_result(self, job_id: int, position: int, kind: str) -> Optional[Dict]:
+        """State, result, error and URL of the task of the given kind for the chapter at a position
+        of the job, or None if it doesn't exist yet."""
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT state, result, error, url FROM tasks WHERE job_id = ? AND position = ? AND kind = ?",
+                (job_id, position, kind)).fetchone()
+        if row is None:
+            return None
+        return {'state': row[0], 'result': json.loads(row[1]) if row[1] else None, 'error': row[2], 'url': row[3]}
+
+    def counts(self, job_id: Optional[int] = None) -> Dict[str, Dict[str, int]]:
+        """Number of tasks per kind and state, for one job or all of them."""
+        query = "SELECT kind, state, COUNT(*) FROM tasks"
+        params = ()
+        if job_id is not None:
+            query += " WHERE job_id = ?"
+            params = (job_id,)
+        with self.lock:
+            rows = self.connection.execute(query + " GROUP BY kind, state", params).fetchall()
+        counts: Dict[str, Dict[str, int]] = {}
+        for kind, state, count in rows:
+            counts.setdefault(kind, {})[state] = count
+        return counts
+
+    def unfinished(self, kinds: Iterable[str] = TASK_KINDS) -> int:
+        """Number of pending or leased tasks of the given kinds."""
+        kinds = list(kinds)
+        placeholders = ", ".join("?" for _ in kinds)
+        with self.lock:
+            return self.connection.execute(
+                f"SELECT COUNT(*) FROM tasks WHERE kind IN ({placeholders}) AND state IN ('pending', 'leased')",
+                kinds).fetchone()[0]
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+def _translated_namespace(job: Dict) -> str:
+    """ChapterStore namespace of a job's final chapter text, matching fetch_chapters."""
+    return f"{job['target_language'] or 'en'}:" if job['translate'] else ""
+
+
+class Worker:
+    """Process tasks from a shared queue until there is no work left.
+
+    Fetched chapters are written to the shared ChapterStore under their URL,
+    and translations under the job's target language, where the coordinator
+    reads them. Each worker thread heartbeats its current task, so a task of
+    a crashed node is picked up by another node once its lease runs out.
+    """
+
+    def __init__(self, task_queue: TaskQueue, store_path: str, config: Dict[str, Any],
+                 scraper_factory: Callable[[str, Dict[str, Any]], Any], worker_id: Optional[str] = None,
+                 kinds: Iterable[str] = TASK_KINDS, lease_seconds: float = 120.0):
+        """Initialize the worker.
+
+        Args:
+            task_queue (TaskQueue): Shared queue
+            store_path (str): Shared chapter store file
+            config (Dict[str, Any]): Configuration of this node (delay, translation service and key, ...)
+            scraper_factory (Callable): Creates a scraper from a site type and configuration
+            worker_id (str, optional): Name in leases, host and process ID by default
+            kinds (Iterable[str]): Task kinds to take, e.g. only "translate" on nodes with a translation key
+            lease_seconds (float): Lease length; heartbeats are sent every third of it
+        """
+        self.queue = task_queue
+        self.store_path = store_path
+        self.config = config
+        self.scraper_factory = scraper_factory
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.kinds = [kind for kind in kinds if kind in TASK_KINDS]
+        self.lease_seconds = lease_seconds
+        self.scrapers: Dict[tuple, Any] = {}
+        self.lock = threading.Lock()
+        self.stop = threading.Event()
+        self.stats = {"fetch": 0, "translate": 0, "failed": 0}
+
+    def _scraper(self, job: Dict):
+        """Scraper for a job's site and translation settings, created once per thread."""
+        key = (job['site'], job['translate'], job['target_language'], threading.get_ident())
+        with self.lock:
+            scraper = self.scrapers.get(key)
+        if scraper is None:
+            config = dict(self.config)
+            translation = dict(config.get("translation", {}))
+            translation["enabled"] = job['translate']
+            if job['target_language']:
+                translation["target_language"] = job['target_language']
+            config["translation"] = translation
+            scraper = self.scraper_factory(job['site'], config)
+            with self.lock:
+                self.scrapers[key] = scraper
+        return scraper
+
+    def _heartbeat(self, task: Dict, owner: str, done: threading.Event):
+        while not done.wait(self.lease_seconds / 3):
+            if not self.queue.heartbeat(task['id'], owner, self.lease_seconds):
+                print(f"Lost the lease on {task['kind']} task for chapter {task['chapter_index']}")
+                return
+
+    def process(self, task: Dict, stores: Dict[str, ChapterStore]) -> Dict:
+        """Run one task and return its result; the follow-up task, if any, is under ``follow_up``.
+
+        Args:
+            task (Dict): Task from TaskQueue.lease
+            stores (Dict[str, ChapterStore]): This thread's chapter stores by namespace
+
+        Returns:
+            Dict: Chapter title and illustrations
+        """
+        job = self.queue.job(task['job_id'])
+        store = stores.setdefault("", ChapterStore(self.store_path))
+        scraper = self._scraper(job)
+        payload = task['payload']
+
+        if task['kind'] == "fetch":
+            soup = BeautifulSoup(scraper.fetch_page(task['url']), 'lxml')
+            chapter = scraper.parser.extract_chapter_content(soup, task['url'], payload.get('title'))
+            store.put(task['url'], chapter.content, chapter.ruby)
+            result = {'title': chapter.title, 'images': chapter.images}
+            if job['translate']:
+                result['follow_up'] = {'kind': "translate", 'payload': result.copy()}
+            return result
+
+        # Translate the source text written by the fetch task
+        source = store.get(task['url'])
+        if source is None:
+            raise LookupError(f"source text of {task['url']} is missing from the chapter store")
+        chapter = Chapter(title=payload.get('title'), url=task['url'], content=source['content'],
+                          ruby=source['ruby'], images=payload.get('images'))
+        chapter = scraper.parser.translate_chapter(chapter)
+        namespace = _translated_namespace(job)
+        stores.setdefault(namespace, ChapterStore(self.store_path, namespace)).put(task['url'], chapter.content, chapter.ruby)
+        return {'title': chapter.title, 'images': chapter.images}
+
+    def _loop(self, number: int, idle_timeout: float, poll_interval: float):
+        # Leases are held per thread, so a thread can't complete a task another one re-leased
+        owner = f"{self.worker_id}/{number}"
+        stores: Dict[str, ChapterStore] = {}
+        idle_since = time.time()
+        try:
+            while not self.stop.is_set():
+                task = self.queue.lease(owner, self.kinds, self.lease_seconds)
+                if task is None:
+                    # Other nodes may still add translate tasks or lose their leases
+                    if not self.queue.unfinished(self.kinds) and idle_timeout and time.time() - idle_since > idle_timeout:
+                        return
+                    self.stop.wait(poll_interval)
+                    continue
+
+                done = threading.Event()
+                heartbeat = threading.Thread(target=self._heartbeat, args=(task, owner, done), daemon=True)
+                heartbeat.start()
+                try:
+                    with span(task['kind']):
+                        result = self.process(task, stores)
+                    follow_up = result.pop('follow_up', None)
+                    if self.queue.complete(task['id'], owner, result, follow_up):
+                        with self.lock:
+                            self.stats[task['kind']] += 1
+                except Exception as e:
+                    print(f"{task['kind'].capitalize()} task for chapter {task['chapter_index']} failed: {e}")
+                    self.queue.fail(task['id'], owner, str(e))
+                    with self.lock:
+                        self.stats["failed"] += 1
+                finally:
+                    done.set()
+                idle_since = time.time()
+        finally:
+            for store in stores.values():
+                store.close()
+
+    def run(self, threads: int = 1, idle_timeout: float = 60.0, poll_interval: float = 2.0):
+        """Process tasks until none are left and none arrived for idle_timeout seconds.
+
+        Args:
+            threads (int): Tasks processed at once on this node
+            idle_timeout (float): Seconds to wait for new work before exiting (0 waits forever)
+            poll_interval (float): Seconds between polls of an empty queue
+        """
+        workers = [threading.Thread(target=self._loop, args=(number, idle_timeout, poll_interval),
+                                    name=f"worker-{number}", daemon=True) for number in range(max(1, threads))]
+        for worker in workers:
+            worker.start()
+        try:
+            while any(worker.is_alive() for worker in workers):
+                for worker in workers:
+                    worker.join(timeout=0.5)
+        except KeyboardInterrupt:
+            print("Stopping after the current tasks...")
+            self.stop.set()
+            for worker in workers:
+                worker.join()
+        finally:
+            with self.lock:
+                scrapers = list(self.scrapers.values())
+                self.scrapers.clear()
+            for scraper in scrapers:
+                scraper.close()
+
+    def report(self) -> str:
+        return (f"Worker {self.worker_id}: {self.stats['fetch']} chapters fetched, "
+                f"{self.stats['translate']} translated, {self.stats['failed']} failed attempts")
+
+
+def collect_chapters(task_queue: TaskQueue, store_path: str, job_id: int, chapters: List[Chapter],
+                     poll_interval: float = 2.0, image_fetcher=None) -> Iterator[Chapter]:
+    """Yield a job's chapters in order as workers finish them.
+
+    Chapter text stays in the shared store and is read when exported.
+
+    Args:
+        task_queue (TaskQueue): Shared queue
+        store_path (str): Shared chapter store file
+        job_id (int): Job from TaskQueue.submit
+        chapters (List[Chapter]): Chapters of the job, in order
+        poll_interval (float): Seconds between checks for finished chapters
+        image_fetcher (ImageFetcher, optional): Fetcher for illustrations, run on this node
+
+    Yields:
+        Chapter: Copy of each chapter with its content
+
+    Raises:
+        RuntimeError: If a chapter failed on every attempt
+    """
+    job = task_queue.job(job_id)
+    final_kind = "translate" if job['translate'] else "fetch"
+    store = ChapterStore(store_path, _translated_namespace(job))
+    for position, chapter in enumerate(chapters):
+        while True:
+            status = task_queue.chapter_result(job_id, position, final_kind)
+            if status is None and final_kind == "translate":
+                # Not fetched yet, or the fetch failed
+                status = task_queue.chapter_result(job_id, position, "fetch")
+                if status and status['state'] != 'failed':
+                    status = None
+            if status and status['url'] != chapter['url']:
+                raise RuntimeError(f"Job {job_id} has {status['url']} at position {position}, "
+                                   f"not {chapter['url']}; collect the chapters it was submitted with")
+            if status and status['state'] == 'done':
+                break
+            if status and status['state'] == 'failed':
+                raise RuntimeError(f"Chapter {chapter['index']} failed: {status['error']}")
+            time.sleep(poll_interval)
+
+        result = status['result']
+        built = Chapter.from_dict(chapter).copy()
+        built.title = result['title']
+        built.attach(store, chapter['url'])
+        built.images = result.get('images')
+        if built.images and image_fetcher:
+            built.images = image_fetcher.resolve(built.images, referer=chapter['url'])
+        yield built
@@ -2,12 +2,32 @@
 # -*- coding: utf-8 -*-
 
 import os
+import io
 import sys
+import gzip
+import json
+import hashlib
 import subprocess
-from typing import Dict, List, Optional
+from typing import Dict, Iterable, List, Optional, Tuple, Union
 import re
+import math
+import html
+import bisect
+import shutil
+import zipfile
+import tempfile
+import threading
+import itertools
 import datetime
-import urllib.request
+import unicodedata
+import concurrent.futures
+from xml.etree import ElementTree
+
+from config import CONFIG_DIR
+from images import replace_image_markers
+from models import Chapter, ChapterStore
+from metrics import CACHE_HITS, CACHE_MISSES, EXPORT_SECONDS
+from profiling import span
 
 # Try to import required libraries, install if not available
 try:
@@ -28,7 +48,6 @@ try:
     from reportlab.pdfgen import canvas
     from reportlab.lib.pagesizes import letter
     from reportlab.pdfbase import pdfmetrics
-    from reportlab.pdfbase.ttfonts import TTFont
     REPORTLAB_AVAILABLE = True
 except ImportError:
     REPORTLAB_AVAILABLE = False
@@ -38,12 +57,25 @@ except ImportError:
         from reportlab.pdfgen import canvas
         from reportlab.lib.pagesizes import letter
         from reportlab.pdfbase import pdfmetrics
-        from reportlab.pdfbase.ttfonts import TTFont
         REPORTLAB_AVAILABLE = True
     except Exception as e:
         print(f"Failed to install reportlab: {e}")
         REPORTLAB_AVAILABLE = False
 
+# pypdf is only needed to merge PDFs rendered in parallel
+try:
+    from pypdf import PdfWriter
+    PYPDF_AVAILABLE = True
+except ImportError:
+    PYPDF_AVAILABLE = False
+
+# zstandard is optional, for zstd compressed text exports
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
 
 def sanitize_filename(filename: str) -> str:
     """Sanitize filename to be safe for all operating systems."""
@@ -52,6 +84,34 @@ def sanitize_filename(filename: str) -> str:
     return sanitized[:100]
 
 
+def render_ruby_content(content: str, ruby: List[List]) -> str:
+    """Render chapter content as XHTML with ruby readings.
+    
+    ``ruby`` holds one list of (start, end, reading) spans per paragraph of
+    ``content``, as produced by the site parsers.
+    """
+    paragraphs = content.split('\n\n')
+    if len(paragraphs) != len(ruby):
+        # Spans no longer line up with the text, render it plain
+        return html.escape(content).replace('\n', '<br/>')
+    
+    rendered = []
+    for paragraph, spans in zip(paragraphs, ruby):
+        parts = []
+        position = 0
+        for start, end, reading in sorted(spans):
+            if start < position:
+                continue
+            parts.append(html.escape(paragraph[position:start]))
+            parts.append(f"<ruby>{html.escape(paragraph[start:end])}<rp>(</rp>"
+                         f"<rt>{html.escape(reading)}</rt><rp>)</rp></ruby>")
+            position = end
+        parts.append(html.escape(paragraph[position:]))
+        rendered.append(''.join(parts).replace('\n', '<br/>'))
+    
+    return '<br/><br/>'.join(rendered)
+
+
 class EpubExporter:
     """Export novel to EPUB format."""
     
@@ -72,21 +132,7 @@ class EpubExporter:
         # Add cover page if novel info is included
         if include_novel_info:
             # Create cover page
-            cover_content = f"<h1>{title}</h1>"
-            cover_content += f"<p><strong>Author:</strong> {self.novel_info['author']}</p>"
-            
-            # Add metadata
-            if self.novel_info['metadata']:
-                for key, value in self.novel_info['metadata'].items():
-                    if isinstance(value, list):
-                        value_str = ", ".join(value)
-                        cover_content += f"<p><strong>{key}:</strong> {value_str}</p>"
-                    else:
-                        cover_content += f"<p><strong>{key}:</strong> {value}</p>"
-            
-            # Add description
-            cover_content += f"<p>{self.novel_info['description']}</p>"
-            cover_content += f"<p><strong>URL:</strong> {self.novel_info['url']}</p>"
+            cover_content = render_cover_body(self.novel_info)
             
             # Create cover chapter
             cover = epub.EpubHtml(title='Cover', file_name='cover.xhtml')
@@ -123,18 +169,18 @@ class EpubExporter:
             arc_header = ""
             if 'arc' in chapter and chapter['arc'] != current_arc:
                 current_arc = chapter['arc']
-                if current_arc:
-                    arc_header = f"<h2 class='arc-header'>{current_arc}</h2>"
+                arc_header = current_arc or ""
             
             # Create chapter content
-            content = f"<h1>{chapter['title']}</h1>"
-            if arc_header:
-                content = arc_header + content
-                
-            if 'content' in chapter:
-                # Process newlines before adding to f-string
-                processed_content = chapter['content'].replace('\n', '<br/>')
-                content += f"<div>{processed_content}</div>"
+            content = render_chapter_body(chapter, arc_header)
+            
+            # Add the chapter's illustrations, once per book
+            for image in chapter.get('images', []):
+                file_name = image.get('file_name')
+                if file_name and self.book.get_item_with_href(f"images/{file_name}") is None and os.path.isfile(image.get('path', '')):
+                    with open(image['path'], 'rb') as f:
+                        self.book.add_item(epub.EpubItem(uid=f"img_{file_name.split('.')[0]}", file_name=f"images/{file_name}",
+                                                         media_type=image['media_type'], content=f.read()))
             
             # Create chapter
             c = epub.EpubHtml(title=chapter['title'], file_name=f"chapter_{chapter['index']}.xhtml")
@@ -150,13 +196,7 @@ class EpubExporter:
         self.book.add_item(epub.EpubNav())
         
         # Define CSS
-        style = """
-        body { font-family: serif; }
-        h1 { text-align: center; }
-        h2 { text-align: center; }
-        .arc-header { page-break-before: always; }
-        """
-        nav_css = epub.EpubItem(uid="style_nav", file_name="style/nav.css", media_type="text/css", content=style)
+        nav_css = epub.EpubItem(uid="style_nav", file_name="style/nav.css", media_type="text/css", content=EPUB_CSS)
         self.book.add_item(nav_css)
         
         # Create spine
@@ -182,205 +222,1095 @@ class EpubExporter:
         return filename
 
 
-class JapanesePdfExporter:
-    """Export novel to PDF format with Japanese font support."""
+def render_chapter_body(chapter: Dict, arc_header: str = "") -> str:
+    """Render the XHTML body of a chapter, with an optional arc header before it."""
+    content = f"<h1>{html.escape(chapter['title'])}</h1>"
+    if arc_header:
+        content = f"<h2 class='arc-header'>{html.escape(arc_header)}</h2>" + content
     
-    def __init__(self, novel_info: Dict, chapters: List[Dict]):
-        self.novel_info = novel_info
-        self.chapters = chapters
-        self.font_path = self._get_japanese_font()
+    if 'content' in chapter:
+        # Process newlines before adding to f-string
+        if chapter.get('ruby'):
+            processed_content = render_ruby_content(chapter['content'], chapter['ruby'])
+        else:
+            processed_content = html.escape(chapter['content']).replace('\n', '<br/>')
+        if chapter.get('images'):
+            processed_content = replace_image_markers(
+                processed_content, lambda n: render_illustration(chapter['images'], n))
+        content += f"<div>{processed_content}</div>"
+    
+    return content
+
+
+def render_illustration(images: List[Dict], number: int) -> str:
+    """Render an illustration marker as XHTML, or its alt text if it wasn't downloaded."""
+    image = images[number] if number < len(images) else {}
+    alt = html.escape(image.get('alt') or "Illustration", quote=True)
+    if image.get('file_name'):
+        return f"<div class='illustration'><img src='images/{image['file_name']}' alt=\"{alt}\"/></div>"
+    return f"[{alt}]"
+
+
+def illustration_text(images: List[Dict], number: int, markdown: bool = False) -> str:
+    """Plain text or Markdown stand-in for an illustration marker."""
+    image = images[number] if images and number < len(images) else {}
+    alt = image.get('alt') or "Illustration"
+    if markdown and image.get('url'):
+        return f"![{alt}]({image['url']})"
+    return f"[{alt}]"
+
+
+def render_cover_body(novel_info: Dict) -> str:
+    """Render the XHTML body of the novel information page."""
+    cover_content = f"<h1>{html.escape(novel_info['title'])}</h1>"
+    cover_content += f"<p><strong>Author:</strong> {html.escape(novel_info['author'])}</p>"
+    
+    # Add metadata
+    if novel_info['metadata']:
+        for key, value in novel_info['metadata'].items():
+            if isinstance(value, list):
+                value = ", ".join(value)
+            cover_content += f"<p><strong>{html.escape(str(key))}:</strong> {html.escape(str(value))}</p>"
+    
+    # Add description
+    cover_content += f"<p>{html.escape(novel_info['description'])}</p>"
+    cover_content += f"<p><strong>URL:</strong> {html.escape(novel_info['url'])}</p>"
+    return cover_content
+
+
+EPUB_CSS = """
+body { font-family: serif; }
+h1 { text-align: center; }
+h2 { text-align: center; }
+.arc-header { page-break-before: always; }
+.illustration { text-align: center; margin: 1em 0; }
+.illustration img { max-width: 100%; max-height: 100%; }
+"""
+
+EPUB_CONTAINER_XML = """<?xml version="1.0" encoding="UTF-8"?>
+<container version="1.0" xmlns="urn:oasis:names:tc:opendocument:xmlns:container">
+  <rootfiles>
+    <rootfile full-path="EPUB/content.opf" media-type="application/oebps-package+xml"/>
+  </rootfiles>
+</container>
+"""
+
+EPUB_XHTML_TEMPLATE = """<?xml version="1.0" encoding="utf-8"?>
+<!DOCTYPE html>
+<html xmlns="http://www.w3.org/1999/xhtml" xmlns:epub="http://www.idpf.org/2007/ops" lang="{lang}" xml:lang="{lang}">
+<head>
+<title>{title}</title>
+<link rel="stylesheet" type="text/css" href="style/nav.css"/>
+</head>
+<body>{body}</body>
+</html>
+"""
+
+# Bump when render_chapter_body or render_ruby_content change their output
+RENDER_CACHE_VERSION = 3
+
+# Directory of the on-disk chapter render cache
+RENDER_CACHE_DIR = os.path.join(CONFIG_DIR, "render_cache")
+
+# Default size limit of the render cache
+RENDER_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+
+class RenderCache:
+    """On-disk cache of rendered chapter documents for EPUB export.
+    
+    Entries are keyed by a hash of everything that goes into a chapter
+    document (title, content, ruby readings, arc header and language) plus
+    the XHTML template and RENDER_CACHE_VERSION, so a changed chapter or
+    template never hits a stale entry. A hit skips rendering the chapter, so
+    rebuilding a book or regenerating volumes only renders the chapters
+    that changed.
+    
+    The cache is kept under ``max_bytes`` by deleting the least recently
+    used entries; a hit refreshes an entry's modification time.
+    """
+    
+    _shared = None
+    _shared_lock = threading.Lock()
+    
+    def __init__(self, directory: str = RENDER_CACHE_DIR, enabled: bool = True,
+                 max_bytes: int = RENDER_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.enabled = enabled
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        # Bytes stored since the last pruning; None until the first store checks the cache size
+        self.unpruned: Optional[int] = None
+        self.version_key = hashlib.sha256(
+            f"{RENDER_CACHE_VERSION}\0{EPUB_XHTML_TEMPLATE}".encode('utf-8')).hexdigest()
+    
+    @classmethod
+    def shared(cls) -> 'RenderCache':
+        """Get the process-wide render cache."""
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls()
+            return cls._shared
+    
+    @classmethod
+    def configure(cls, enabled: bool = True, max_bytes: int = RENDER_CACHE_MAX_BYTES):
+        """Set up the process-wide render cache, e.g. in a worker process from the parent's settings()."""
+        cache = cls.shared()
+        cache.enabled = enabled
+        cache.max_bytes = max_bytes
+    
+    def settings(self) -> Dict:
+        """Keyword arguments of configure() reproducing this cache's settings."""
+        return {'enabled': self.enabled, 'max_bytes': self.max_bytes}
+    
+    def key(self, chapter: Dict, arc_header: str, language: str) -> str:
+        """Cache key of a chapter document."""
+        digest = hashlib.sha256(self.version_key.encode('ascii'))
+        images = [(image.get('file_name'), image.get('alt')) for image in chapter.get('images', [])]
+        for part in (language, arc_header, chapter['title'], chapter.get('content'),
+                     json.dumps(chapter.get('ruby'), ensure_ascii=False), json.dumps(images, ensure_ascii=False)):
+            digest.update(b'\0')
+            digest.update(str(part).encode('utf-8'))
+        return digest.hexdigest()
+    
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key + ".bin")
+    
+    def _load(self, key: str) -> Optional[bytes]:
+        try:
+            with open(self._path(key), 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+        if not data:
+            return None
+        try:
+            # Marks the entry as recently used
+            os.utime(self._path(key))
+        except OSError:
+            pass
+        return data
+    
+    def _store(self, key: str, document: bytes):
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write to a temporary file first so concurrent exports never read a partial entry
+            partial_path = f"{path}.{os.getpid()}.{threading.get_ident()}.part"
+            with open(partial_path, 'wb') as f:
+                f.write(document)
+            os.replace(partial_path, path)
+        except OSError:
+            return
         
-    def _get_japanese_font(self):
-        """Get a Japanese font file, downloading if necessary."""
-        # Directory for fonts
-        font_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fonts")
-        os.makedirs(font_dir, exist_ok=True)
+        if self.max_bytes:
+            if self.unpruned is not None:
+                self.unpruned += len(document)
+            if self.unpruned is None or self.unpruned >= self.max_bytes // 8:
+                self.prune()
+    
+    def prune(self) -> int:
+        """Delete the least recently used entries until the cache fits in max_bytes.
         
-        # Font file path
-        font_path = os.path.join(font_dir, "NotoSansJP-VariableFont_wght.ttf")
+        Returns:
+            int: Number of entries deleted
+        """
+        self.unpruned = 0
+        entries = []
+        total = 0
+        for directory, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith(".bin"):
+                    # Entries still being written
+                    continue
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
         
-        # Download font if it doesn't exist
-        if not os.path.exists(font_path):
-            print("Downloading Japanese font (Noto Sans JP)...")
+        deleted = 0
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
             try:
-                font_url = "https://fonts.googleapis.com/css2?family=Noto+Sans+JP:wght@100..900&display=swap"
-                urllib.request.urlretrieve(font_url, font_path)
-                print("Font downloaded successfully")
-            except Exception as e:
-                print(f"Failed to download font: {e}")
-                print("PDF export may not support Japanese characters")
-                return None
+                os.remove(path)
+                deleted += 1
+            except OSError:
+                # Already removed by another process
+                pass
+            total -= size
+        return deleted
+    
+    def chapter_document(self, chapter: Dict, arc_header: str = "", language: str = 'en') -> bytes:
+        """UTF-8 encoded XHTML document of a chapter."""
+        key = self.key(chapter, arc_header, language) if self.enabled else None
+        if key:
+            document = self._load(key)
+            if document:
+                self.hits += 1
+                CACHE_HITS.inc(cache="render")
+                return document
         
-        return font_path
+        document = EPUB_XHTML_TEMPLATE.format(lang=language, title=html.escape(chapter['title']),
+                                              body=render_chapter_body(chapter, arc_header)).encode('utf-8')
+        if key:
+            self.misses += 1
+            CACHE_MISSES.inc(cache="render")
+            self._store(key, document)
+        return document
     
-    def create_pdf(self, output_path: str, include_novel_info: bool = True, chapter_range: Optional[List[int]] = None):
-        """Create PDF with Japanese font support."""
-        if not REPORTLAB_AVAILABLE:
-            raise ImportError("reportlab is not available. Cannot create PDF.")
+    def clear(self):
+        """Delete every cached entry."""
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+# Entries StreamingEpubWriter writes on close, and rewrites when appending
+EPUB_REWRITTEN_FILES = ('EPUB/toc.xhtml', 'EPUB/nav.xhtml', 'EPUB/toc.ncx', 'EPUB/content.opf')
+
+EPUB_GENERATOR = "Syosetu Novel Scraper"
+EPUB_META_LAST_INDEX = "syosetu-scraper:last-index"
+EPUB_META_LAST_URL = "syosetu-scraper:last-url"
+EPUB_META_LAST_ARC = "syosetu-scraper:last-arc"
+
+EPUB_NAMESPACES = {
+    'opf': 'http://www.idpf.org/2007/opf',
+    'dc': 'http://purl.org/dc/elements/1.1/',
+    'ncx': 'http://www.daisy.org/z3986/2005/ncx/'
+}
+
+
+class StreamingEpubWriter:
+    """Write an EPUB chapter by chapter, straight into the zip container.
+    
+    Each chapter's XHTML is compressed into the archive as soon as it is added,
+    so only the table of contents entries stay in memory. The package document,
+    navigation document and NCX are written when the writer is closed.
+    """
+    
+    def __init__(self, filename: str, novel_info: Dict, include_novel_info: bool = True, language: str = 'en'):
+        # Ensure filename has .epub extension
+        if not filename.lower().endswith('.epub'):
+            filename += '.epub'
+        self.filename = filename
+        self.novel_info = novel_info
+        self.include_novel_info = include_novel_info
+        self.language = language
+        self.zip = None
+        self.pages = []  # (item id, file name, title) in spine order
+        self.toc_position = None
+        self.current_arc = None
+        self.chapter_count = 0
+        self.last_index = None  # Source index of the last chapter written
+        self.last_url = None  # URL of the last chapter written, unique across arcs unlike the index
+        self.appending = False
+        self.images = {}  # Embedded illustration file name -> media type
+    
+    def __enter__(self):
+        if self.zip is None:
+            self.open()
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None or (self.appending and self.zip):
+            # An interrupted update still leaves a valid book with the chapters appended so far
+            self.close()
+        elif self.zip:
+            # Don't leave a half-written book behind
+            self.zip.close()
+            self.zip = None
+            os.remove(self.filename)
+    
+    @classmethod
+    def reopen(cls, filename: str, novel_info: Optional[Dict] = None) -> 'StreamingEpubWriter':
+        """Open an EPUB written by this class to append chapters to it.
         
-        if not self.font_path:
-            raise ValueError("Japanese font not available. Cannot create PDF with Japanese characters.")
+        Only the book's metadata is read here. When the writer is opened, the
+        existing entries are copied into a new archive next to the book,
+        except for the package document, navigation documents and TOC page,
+        which are written again with the new chapters when the writer is
+        closed; the new archive then replaces the book. If ``novel_info`` is
+        not given, it is read from the book.
+        """
+        with zipfile.ZipFile(filename, 'r') as zf:
+            names = set(zf.namelist())
+            if not {'EPUB/content.opf', 'EPUB/toc.ncx'} <= names:
+                raise ValueError(f"{filename} was not created by this tool")
+            opf = ElementTree.fromstring(zf.read('EPUB/content.opf'))
+            ncx = ElementTree.fromstring(zf.read('EPUB/toc.ncx'))
         
-        # Register the font
-        font_name = "NotoSansJP"
-        pdfmetrics.registerFont(TTFont(font_name, self.font_path))
+        metadata = opf.find('opf:metadata', EPUB_NAMESPACES)
+        meta = {el.get('name'): el.get('content') for el in metadata.findall('opf:meta', EPUB_NAMESPACES) if el.get('name')}
         
-        # Create PDF
-        pdf = canvas.Canvas(output_path, pagesize=letter)
-        width, height = letter
+        pages = []
+        for point in ncx.iterfind('.//ncx:navPoint', EPUB_NAMESPACES):
+            title = point.findtext('ncx:navLabel/ncx:text', '', EPUB_NAMESPACES)
+            pages.append((point.get('id'), point.find('ncx:content', EPUB_NAMESPACES).get('src'), title))
+        if not all(item_id in ('cover', 'toc') or re.fullmatch(r'chapter_\d+', item_id) for item_id, _, _ in pages):
+            raise ValueError(f"{filename} was not created by this tool")
         
-        # Set default font
-        pdf.setFont(font_name, 12)
+        if novel_info is None:
+            novel_info = {
+                'title': metadata.findtext('dc:title', '', EPUB_NAMESPACES),
+                'author': metadata.findtext('dc:creator', '', EPUB_NAMESPACES),
+                'url': metadata.findtext('dc:identifier', '', EPUB_NAMESPACES),
+                'description': '',
+                'metadata': {}
+            }
         
-        # Helper function to add text with proper wrapping
-        def add_text(text, x, y, width, font_size=12, leading=14):
-            pdf.setFont(font_name, font_size)
-            text_obj = pdf.beginText(x, y)
-            text_obj.setFont(font_name, font_size)
-            text_obj.setLeading(leading)  # Line spacing
-            
-            # Better text wrapping for Japanese text
-            # For Japanese text, we need character-by-character wrapping
-            if any(ord(c) > 127 for c in text):
-                # Japanese text - wrap by characters
-                current_line = ""
-                for char in text:
-                    test_line = current_line + char
-                    if pdf.stringWidth(test_line, font_name, font_size) < width - 2*x:
-                        current_line += char
-                    else:
-                        text_obj.textLine(current_line)
-                        current_line = char
-                
-                if current_line:
-                    text_obj.textLine(current_line)
-            else:
-                # English text - wrap by words
-                words = text.split()
-                current_line = []
-                
-                for word in words:
-                    test_line = ' '.join(current_line + [word])
-                    if pdf.stringWidth(test_line, font_name, font_size) < width - 2*x:
-                        current_line.append(word)
-                    else:
-                        text_obj.textLine(' '.join(current_line))
-                        current_line = [word]
-                
-                if current_line:
-                    text_obj.textLine(' '.join(current_line))
-            
-            pdf.drawText(text_obj)
-            return y - (text_obj.getY() - y + 10)  # Return new y position based on actual text height
+        language = metadata.findtext('dc:language', 'en', EPUB_NAMESPACES)
+        images = {
+            item.get('href')[len('images/'):]: item.get('media-type')
+            for item in opf.iterfind('opf:manifest/opf:item', EPUB_NAMESPACES)
+            if item.get('href', '').startswith('images/')
+        }
+        writer = cls(filename, novel_info, include_novel_info=False, language=language)
+        writer.pages = pages
+        writer.images = images
+        page_ids = [item_id for item_id, _, _ in pages]
+        if 'toc' in page_ids:
+            writer.toc_position = page_ids.index('toc')
+            writer.include_novel_info = True
+        writer.chapter_count = max((int(item_id.split('_')[1]) for item_id in page_ids if item_id.startswith('chapter_')), default=0)
+        writer.current_arc = meta.get(EPUB_META_LAST_ARC) or None
+        writer.last_url = meta.get(EPUB_META_LAST_URL) or None
+        if meta.get(EPUB_META_LAST_INDEX):
+            writer.last_index = int(meta[EPUB_META_LAST_INDEX])
+        elif writer.chapter_count:
+            # Books written before the index was recorded: assume they start at chapter 1
+            writer.last_index = writer.chapter_count
         
-        # Add cover page if novel info is included
-        if include_novel_info:
-            # Title
-            pdf.setFont(font_name, 24)
-            pdf.drawCentredString(width/2, height-100, self.novel_info['title'])
+        writer.appending = True
+        return writer
+    
+    @property
+    def partial_filename(self) -> str:
+        """Archive an appending writer builds before it replaces the book."""
+        return self.filename + ".part"
+    
+    def _copy_existing(self):
+        """Copy the book's entries, except those rewritten on close, into a new archive."""
+        self.zip = zipfile.ZipFile(self.partial_filename, 'w', zipfile.ZIP_DEFLATED)
+        try:
+            with zipfile.ZipFile(self.filename, 'r') as source:
+                for info in source.infolist():
+                    if info.filename in EPUB_REWRITTEN_FILES:
+                        continue
+                    copy = zipfile.ZipInfo(info.filename, date_time=info.date_time)
+                    copy.compress_type = info.compress_type
+                    copy.external_attr = info.external_attr
+                    copy.file_size = info.file_size
+                    with source.open(info) as src, self.zip.open(copy, 'w') as dst:
+                        shutil.copyfileobj(src, dst)
+        except BaseException:
+            self.zip.close()
+            self.zip = None
+            os.remove(self.partial_filename)
+            raise
+    
+    def open(self):
+        """Create the archive and write the fixed entries."""
+        if self.appending:
+            self._copy_existing()
+            return
+        
+        # Create directory if it doesn't exist
+        os.makedirs(os.path.dirname(os.path.abspath(self.filename)), exist_ok=True)
+        
+        self.zip = zipfile.ZipFile(self.filename, 'w', zipfile.ZIP_DEFLATED)
+        # The mimetype entry must come first and be stored uncompressed
+        self.zip.writestr(zipfile.ZipInfo('mimetype'), 'application/epub+zip', compress_type=zipfile.ZIP_STORED)
+        self.zip.writestr('META-INF/container.xml', EPUB_CONTAINER_XML)
+        self.zip.writestr('EPUB/style/nav.css', EPUB_CSS)
+        
+        if self.include_novel_info:
+            self._write_page('cover', 'cover.xhtml', 'Cover', render_cover_body(self.novel_info))
+            # The TOC page needs every chapter title, so it is written on close
+            self.toc_position = len(self.pages)
+            self.pages.append(('toc', 'toc.xhtml', 'Table of Contents'))
+    
+    def _write_page(self, item_id: str, file_name: str, title: str, body: str):
+        """Write one XHTML document and record it for the spine."""
+        document = EPUB_XHTML_TEMPLATE.format(lang=self.language, title=html.escape(title), body=body)
+        self.zip.writestr(f'EPUB/{file_name}', document)
+        if item_id != 'toc':
+            self.pages.append((item_id, file_name, title))
+    
+    def add_chapter(self, chapter: Dict):
+        """Render a chapter and write it into the archive."""
+        # Check if arc changed
+        arc_header = ""
+        if 'arc' in chapter and chapter['arc'] != self.current_arc:
+            self.current_arc = chapter['arc']
+            arc_header = self.current_arc or ""
+        
+        self.chapter_count += 1
+        self.last_index = chapter.get('index', self.last_index)
+        self.last_url = chapter.get('url', self.last_url)
+        number = self.chapter_count
+        file_name = f'chapter_{number}.xhtml'
+        
+        # Illustrations are stored once per book, uncompressed as they already are
+        for image in chapter.get('images', []):
+            image_name = image.get('file_name')
+            if image_name and image_name not in self.images and os.path.isfile(image.get('path', '')):
+                self.zip.write(image['path'], f'EPUB/images/{image_name}', compress_type=zipfile.ZIP_STORED)
+                self.images[image_name] = image['media_type']
+        
+        # Unchanged chapters come from the render cache
+        document = RenderCache.shared().chapter_document(chapter, arc_header, self.language)
+        self.zip.writestr(f'EPUB/{file_name}', document)
+        self.pages.append((f'chapter_{number}', file_name, chapter['title']))
+    
+    def write(self, chapters: Iterable[Dict]) -> str:
+        """Write all chapters from an iterator and finish the book."""
+        with self:
+            for chapter in chapters:
+                self.add_chapter(chapter)
+        return self.filename
+    
+    def close(self):
+        """Write the TOC page, navigation documents and package document."""
+        chapters = [page for page in self.pages if page[0].startswith('chapter_')]
+        
+        if self.toc_position is not None:
+            toc_content = "<h1>Table of Contents</h1><ul>"
+            for _, file_name, title in chapters:
+                toc_content += f"<li><a href='{file_name}'>{html.escape(title)}</a></li>"
+            toc_content += "</ul>"
+            document = EPUB_XHTML_TEMPLATE.format(lang=self.language, title='Table of Contents', body=toc_content)
+            self.zip.writestr('EPUB/toc.xhtml', document)
+        
+        self.zip.writestr('EPUB/nav.xhtml', self._nav_document())
+        self.zip.writestr('EPUB/toc.ncx', self._ncx_document())
+        self.zip.writestr('EPUB/content.opf', self._package_document())
+        self.zip.close()
+        self.zip = None
+        if self.appending:
+            os.replace(self.partial_filename, self.filename)
+    
+    def _identifier(self) -> str:
+        return self.novel_info.get('url') or self.novel_info['title']
+    
+    def _package_document(self) -> str:
+        modified = datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+        manifest = [
+            '<item id="nav" href="nav.xhtml" media-type="application/xhtml+xml" properties="nav"/>',
+            '<item id="ncx" href="toc.ncx" media-type="application/x-dtbncx+xml"/>',
+            '<item id="style_nav" href="style/nav.css" media-type="text/css"/>'
+        ]
+        spine = []
+        for item_id, file_name, _ in self.pages:
+            manifest.append(f'<item id="{item_id}" href="{file_name}" media-type="application/xhtml+xml"/>')
+            spine.append(f'<itemref idref="{item_id}"/>')
+        for file_name, media_type in self.images.items():
+            manifest.append(f'<item id="img_{file_name.split(".")[0]}" href="images/{file_name}" media-type="{media_type}"/>')
+        
+        # Appending chapters later needs to know where this book left off
+        extra_meta = [f'<meta name="generator" content="{EPUB_GENERATOR}"/>']
+        if self.last_index is not None:
+            extra_meta.append(f'<meta name="{EPUB_META_LAST_INDEX}" content="{self.last_index}"/>')
+        if self.last_url:
+            extra_meta.append(f'<meta name="{EPUB_META_LAST_URL}" content="{html.escape(self.last_url)}"/>')
+        if self.current_arc:
+            extra_meta.append(f'<meta name="{EPUB_META_LAST_ARC}" content="{html.escape(self.current_arc)}"/>')
+        
+        return f"""<?xml version="1.0" encoding="utf-8"?>
+<package xmlns="http://www.idpf.org/2007/opf" version="3.0" unique-identifier="id" xml:lang="{self.language}">
+<metadata xmlns:dc="http://purl.org/dc/elements/1.1/">
+<dc:identifier id="id">{html.escape(self._identifier())}</dc:identifier>
+<dc:title>{html.escape(self.novel_info['title'])}</dc:title>
+<dc:language>{self.language}</dc:language>
+<dc:creator>{html.escape(self.novel_info['author'])}</dc:creator>
+<meta property="dcterms:modified">{modified}</meta>
+{chr(10).join(extra_meta)}
+</metadata>
+<manifest>
+{chr(10).join(manifest)}
+</manifest>
+<spine toc="ncx">
+{chr(10).join(spine)}
+</spine>
+</package>
+"""
+    
+    def _nav_document(self) -> str:
+        items = "".join(
+            f'<li><a href="{file_name}">{html.escape(title)}</a></li>'
+            for _, file_name, title in self.pages
+        )
+        body = f'<nav epub:type="toc" id="toc"><h2>{html.escape(self.novel_info["title"])}</h2><ol>{items}</ol></nav>'
+        return EPUB_XHTML_TEMPLATE.format(lang=self.language, title=html.escape(self.novel_info['title']), body=body)
+    
+    def _ncx_document(self) -> str:
+        nav_points = "".join(
+            f'<navPoint id="{item_id}" playOrder="{order}"><navLabel><text>{html.escape(title)}</text></navLabel>'
+            f'<content src="{file_name}"/></navPoint>'
+            for order, (item_id, file_name, title) in enumerate(self.pages, 1)
+        )
+        return f"""<?xml version="1.0" encoding="utf-8"?>
+<ncx xmlns="http://www.daisy.org/z3986/2005/ncx/" version="2005-1">
+<head><meta name="dtb:uid" content="{html.escape(self._identifier())}"/></head>
+<docTitle><text>{html.escape(self.novel_info['title'])}</text></docTitle>
+<navMap>{nav_points}</navMap>
+</ncx>
+"""
+
+
+# Extensions of the plain text formats and their compressed variants
+TEXT_FORMATS = {'txt': '.txt', 'md': '.md', 'jsonl': '.jsonl'}
+COMPRESSION_EXTENSIONS = {'gzip': '.gz', 'zstd': '.zst'}
+
+
+class StreamingTextWriter:
+    """Write a novel as plain text, Markdown or JSON Lines, chapter by chapter.
+    
+    Chapters are written to the (optionally gzip or zstd compressed) file as
+    they are added, so memory use does not grow with the novel. JSON Lines
+    output has one record per chapter with index, title, arc, url and content.
+    """
+    
+    def __init__(self, filename: str, novel_info: Dict, include_novel_info: bool = True,
+                 format_type: str = 'txt', compression: Optional[str] = None):
+        if format_type not in TEXT_FORMATS:
+            raise ValueError(f"Unsupported format: {format_type}")
+        if compression in (None, 'none'):
+            compression = None
+        elif compression not in COMPRESSION_EXTENSIONS:
+            raise ValueError(f"Unsupported compression: {compression}")
+        elif compression == 'zstd' and not ZSTD_AVAILABLE:
+            raise ImportError("zstandard is not available. Install it with: pip install zstandard")
+        
+        # Ensure filename has the format (and compression) extension
+        extension = TEXT_FORMATS[format_type] + COMPRESSION_EXTENSIONS.get(compression, '')
+        if not filename.lower().endswith(extension):
+            filename += extension
+        self.filename = filename
+        self.novel_info = novel_info
+        self.include_novel_info = include_novel_info
+        self.format_type = format_type
+        self.compression = compression
+        self.file = None
+        self.current_arc = None
+    
+    def __enter__(self):
+        if self.file is None:
+            self.open()
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        if exc_type is not None:
+            # Don't leave a half-written file behind
+            os.remove(self.filename)
+    
+    def open(self):
+        """Create the output file and write the novel information."""
+        # Create directory if it doesn't exist
+        os.makedirs(os.path.dirname(os.path.abspath(self.filename)), exist_ok=True)
+        
+        if self.compression == 'gzip':
+            self.file = gzip.open(self.filename, 'wt', encoding='utf-8', newline='\n')
+        elif self.compression == 'zstd':
+            raw = zstandard.ZstdCompressor().stream_writer(open(self.filename, 'wb'))
+            self.file = io.TextIOWrapper(raw, encoding='utf-8', newline='\n')
+        else:
+            self.file = open(self.filename, 'w', encoding='utf-8', newline='\n')
+        
+        if self.include_novel_info and self.format_type != 'jsonl':
+            self.file.write(self._render_info())
+    
+    @staticmethod
+    def _underline(text: str, char: str) -> str:
+        """Underline matching the display width of text (wide characters count twice)."""
+        width = sum(2 if unicodedata.east_asian_width(c) in ('W', 'F') else 1 for c in text)
+        return char * width
+    
+    def _render_info(self) -> str:
+        info = self.novel_info
+        metadata = []
+        for key, value in info.get('metadata', {}).items():
+            if isinstance(value, list):
+                value = ", ".join(value)
+            metadata.append(f"{key}: {value}")
+        
+        if self.format_type == 'md':
+            lines = [f"# {info['title']}", "", f"**Author:** {info['author']}", ""]
+            if info.get('description'):
+                lines += [info['description'], ""]
+            lines += [f"- {entry}" for entry in metadata]
+            lines += [f"- URL: {info['url']}", "", ""]
+        else:
+            lines = [info['title'], self._underline(info['title'], "="), "", f"Author: {info['author']}", ""]
+            if info.get('description'):
+                lines += [info['description'], ""]
+            lines += metadata
+            lines += [f"URL: {info['url']}", "", ""]
+        return "\n".join(lines) + "\n"
+    
+    def add_chapter(self, chapter: Dict):
+        """Write one chapter."""
+        if self.format_type == 'jsonl':
+            record = {
+                'index': chapter.get('index'),
+                'title': chapter['title'],
+                'arc': chapter.get('arc'),
+                'url': chapter.get('url'),
+                'content': chapter.get('content', '')
+            }
+            if chapter.get('images'):
+                # Content keeps the [[image:N]] markers, N indexing this list
+                record['images'] = [image['url'] for image in chapter['images']]
+            self.file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            return
+        
+        parts = []
+        # Check if arc changed
+        if 'arc' in chapter and chapter['arc'] != self.current_arc:
+            self.current_arc = chapter['arc']
+            if self.current_arc:
+                if self.format_type == 'md':
+                    parts.append(f"## {self.current_arc}\n\n")
+                else:
+                    parts.append(f"{self.current_arc}\n{self._underline(self.current_arc, '=')}\n\n")
+        
+        if self.format_type == 'md':
+            parts.append(f"### {chapter['title']}\n\n")
+        else:
+            parts.append(f"{chapter['title']}\n{self._underline(chapter['title'], '-')}\n\n")
+        content = chapter.get('content', '').strip('\n')
+        if chapter.get('images'):
+            content = replace_image_markers(
+                content, lambda n: illustration_text(chapter['images'], n, self.format_type == 'md'))
+        parts.append(content)
+        parts.append("\n\n\n")
+        self.file.write(''.join(parts))
+    
+    def write(self, chapters: Iterable[Dict]) -> str:
+        """Write all chapters from an iterator and finish the file."""
+        with self:
+            for chapter in chapters:
+                self.add_chapter(chapter)
+        return self.filename
+    
+    def close(self):
+        """Flush and close the output file."""
+        if self.file:
+            self.file.close()
+            self.file = None
+
+
+# Kinsoku shori: characters that may not start or end a line
+KINSOKU_NOT_AT_LINE_START = frozenset(
+    "、。，．,.・：；:;？！?!ー―‐…‥～〜)]}）〕］｝〉》」』】〙〗'\"”’»"
+    "ぁぃぅぇぉっゃゅょゎゕゖァィゥェォッャュョヮヵヶㇰㇱㇲㇳㇴㇵㇶㇷㇸㇹㇺㇻㇼㇽㇾㇿ々〻ゝゞヽヾ゛゜"
+)
+KINSOKU_NOT_AT_LINE_END = frozenset("([{（〔［｛〈《「『【〘〖'\"“‘«")
+
+# How far a break may move to satisfy kinsoku rules before giving up
+KINSOKU_MAX_SHIFT = 3
+
+
+def _is_word_char(char: str) -> bool:
+    """Whether char belongs to a space-separated word that must not be split."""
+    return not char.isspace() and ord(char) < 0x2E80
+
+
+class LineBreaker:
+    """Line breaker using cached per-glyph advance widths.
+    
+    Glyph widths are measured once per font and size, so breaking a paragraph
+    is a cumulative sum plus a binary search per line instead of re-measuring
+    the growing line after every character. Japanese text may break between
+    any two characters subject to kinsoku rules; Latin words are only broken
+    at spaces unless a single word is wider than the line.
+    """
+    
+    _instances = {}
+    
+    def __init__(self, font_name: str, font_size: float):
+        self.font_name = font_name
+        self.font_size = font_size
+        self.widths = {}
+    
+    @classmethod
+    def for_font(cls, font_name: str, font_size: float) -> 'LineBreaker':
+        """Get the shared breaker for a font and size."""
+        key = (font_name, font_size)
+        if key not in cls._instances:
+            cls._instances[key] = cls(font_name, font_size)
+        return cls._instances[key]
+    
+    def char_width(self, char: str) -> float:
+        """Advance width of a single character."""
+        width = self.widths.get(char)
+        if width is None:
+            width = pdfmetrics.stringWidth(char, self.font_name, self.font_size)
+            self.widths[char] = width
+        return width
+    
+    def string_width(self, text: str) -> float:
+        """Width of a string, from cached glyph widths."""
+        return sum(self.char_width(char) for char in text)
+    
+    def break_lines(self, text: str, max_width: float) -> List[str]:
+        """Break text into lines no wider than max_width.
+        
+        Args:
+            text (str): Paragraph text (without newlines)
+            max_width (float): Available line width in points
             
-            # Author
-            pdf.setFont(font_name, 16)
-            pdf.drawCentredString(width/2, height-150, f"Author: {self.novel_info['author']}")
+        Returns:
+            List[str]: Lines of text
+        """
+        if not text:
+            return []
+        
+        # cumulative[i] is the width of text[:i]
+        widths = self.widths
+        try:
+            advances = [widths[char] for char in text]
+        except KeyError:
+            advances = [self.char_width(char) for char in text]
+        cumulative = [0.0]
+        cumulative.extend(itertools.accumulate(advances))
+        
+        lines = []
+        start = 0
+        length = len(text)
+        while start < length:
+            # Skip spaces at the start of a wrapped line
+            if lines:
+                while start < length and text[start] == ' ':
+                    start += 1
+                if start >= length:
+                    break
             
-            # Description
-            y_pos = height - 200
-            pdf.setFont(font_name, 14)
-            pdf.drawString(50, y_pos, "Description:")
-            y_pos -= 30
-            y_pos = add_text(self.novel_info['description'], 50, y_pos, width-100)
+            # Longest prefix that fits, with at least one character per line
+            end = bisect.bisect_right(cumulative, cumulative[start] + max_width, start + 1) - 1
+            end = max(end, start + 1)
             
-            # Metadata
-            if self.novel_info['metadata']:
-                y_pos -= 20
-                pdf.setFont(font_name, 14)
-                pdf.drawString(50, y_pos, "Metadata:")
-                y_pos -= 20
-                
-                for key, value in self.novel_info['metadata'].items():
-                    if isinstance(value, list):
-                        value_str = ", ".join(value)
-                        y_pos = add_text(f"{key}: {value_str}", 50, y_pos, width-100)
-                    else:
-                        y_pos = add_text(f"{key}: {value}", 50, y_pos, width-100)
+            if end < length:
+                end = self._adjust_break(text, start, end)
             
-            # URL
+            lines.append(text[start:end].rstrip(' '))
+            start = end
+        
+        return lines
+    
+    def _adjust_break(self, text: str, start: int, end: int) -> int:
+        """Move a break at text[end] back to a word boundary that satisfies kinsoku rules."""
+        # Don't split Latin words: back up to the last space or CJK boundary
+        if _is_word_char(text[end - 1]) and _is_word_char(text[end]):
+            candidate = end - 1
+            while candidate > start and _is_word_char(text[candidate - 1]) and _is_word_char(text[candidate]):
+                candidate -= 1
+            if candidate > start:
+                end = candidate
+        
+        # Push characters that can't start a line (or open a bracket at its end) to the next line
+        for shift in range(KINSOKU_MAX_SHIFT + 1):
+            candidate = end - shift
+            if candidate <= start:
+                break
+            if (text[candidate] not in KINSOKU_NOT_AT_LINE_START
+                    and text[candidate - 1] not in KINSOKU_NOT_AT_LINE_END):
+                return candidate
+        
+        return end
+
+
+class PdfPageRenderer:
+    """Draws the cover, table of contents and chapters onto a reportlab canvas."""
+    
+    def __init__(self, pdf, font_name: str):
+        self.pdf = pdf
+        self.font_name = font_name
+        self.width, self.height = letter
+        
+        # Set default font
+        pdf.setFont(font_name, 12)
+    
+    def add_text(self, text, x, y, width, font_size=12, leading=14):
+        """Add text with proper wrapping and return the new y position."""
+        pdf = self.pdf
+        pdf.setFont(self.font_name, font_size)
+        text_obj = pdf.beginText(x, y)
+        text_obj.setFont(self.font_name, font_size)
+        text_obj.setLeading(leading)  # Line spacing
+        
+        # Wrap using cached glyph widths and kinsoku rules
+        breaker = LineBreaker.for_font(self.font_name, font_size)
+        for line in breaker.break_lines(text, width - 2*x):
+            text_obj.textLine(line)
+        
+        pdf.drawText(text_obj)
+        return y - (text_obj.getY() - y + 10)  # Return new y position based on actual text height
+    
+    def cover(self, novel_info: Dict):
+        """Draw the novel information on the current page."""
+        pdf, font_name, width, height = self.pdf, self.font_name, self.width, self.height
+        
+        # Title
+        pdf.setFont(font_name, 24)
+        pdf.drawCentredString(width/2, height-100, novel_info['title'])
+        
+        # Author
+        pdf.setFont(font_name, 16)
+        pdf.drawCentredString(width/2, height-150, f"Author: {novel_info['author']}")
+        
+        # Description
+        y_pos = height - 200
+        pdf.setFont(font_name, 14)
+        pdf.drawString(50, y_pos, "Description:")
+        y_pos -= 30
+        y_pos = self.add_text(novel_info['description'], 50, y_pos, width-100)
+        
+        # Metadata
+        if novel_info['metadata']:
+            y_pos -= 20
+            pdf.setFont(font_name, 14)
+            pdf.drawString(50, y_pos, "Metadata:")
             y_pos -= 20
-            pdf.drawString(50, y_pos, f"URL: {self.novel_info['url']}")
             
-            # Add TOC page
-            pdf.showPage()
-            pdf.setFont(font_name, 18)
-            pdf.drawCentredString(width/2, height-100, "Table of Contents")
+            for key, value in novel_info['metadata'].items():
+                if isinstance(value, list):
+                    value_str = ", ".join(value)
+                    y_pos = self.add_text(f"{key}: {value_str}", 50, y_pos, width-100)
+                else:
+                    y_pos = self.add_text(f"{key}: {value}", 50, y_pos, width-100)
+        
+        # URL
+        y_pos -= 20
+        pdf.drawString(50, y_pos, f"URL: {novel_info['url']}")
+    
+    def toc(self, chapters: List[Dict], page_numbers: Optional[List[int]] = None):
+        """Start a new page and draw the table of contents, with optional page numbers."""
+        pdf, font_name, width, height = self.pdf, self.font_name, self.width, self.height
+        
+        pdf.showPage()
+        pdf.setFont(font_name, 18)
+        pdf.drawCentredString(width/2, height-100, "Table of Contents")
+        
+        # Add TOC entries
+        y_pos = height - 150
+        for i, chapter in enumerate(chapters):
+            pdf.setFont(font_name, 12)
+            toc_entry = f"{chapter['index']}. {chapter['title']}"
+            pdf.drawString(50, y_pos, toc_entry)
+            if page_numbers:
+                pdf.drawRightString(width - 50, y_pos, str(page_numbers[i]))
+            y_pos -= 20
             
-            # Filter chapters based on range
-            filtered_chapters = self.chapters
-            if chapter_range:
-                start, end = chapter_range
-                filtered_chapters = [ch for ch in self.chapters if start <= ch['index'] <= end]
+            # Add new page if needed
+            if y_pos < 50:
+                pdf.showPage()
+                pdf.setFont(font_name, 18)
+                pdf.drawCentredString(width/2, height-100, "Table of Contents (continued)")
+                y_pos = height - 150
+    
+    @staticmethod
+    def toc_page_count(entries: int) -> int:
+        """Number of pages toc() uses for the given number of entries."""
+        _, height = letter
+        pages = 1
+        y_pos = height - 150
+        for _ in range(entries):
+            y_pos -= 20
+            if y_pos < 50:
+                pages += 1
+                y_pos = height - 150
+        return pages
+    
+    def chapter(self, chapter: Dict, current_arc: Optional[str]) -> Optional[str]:
+        """Draw a chapter starting on the current page and return the arc in effect after it."""
+        pdf, font_name, width, height = self.pdf, self.font_name, self.width, self.height
+        
+        # Check if arc changed
+        if 'arc' in chapter and chapter['arc'] != current_arc:
+            current_arc = chapter['arc']
+            if current_arc:
+                pdf.setFont(font_name, 16)
+                pdf.drawCentredString(width/2, height-100, current_arc)
+                y_pos = height - 130
+            else:
+                y_pos = height - 100
+        else:
+            y_pos = height - 100
+        
+        # Chapter title
+        pdf.setFont(font_name, 18)
+        pdf.drawCentredString(width/2, y_pos, chapter['title'])
+        y_pos -= 40
+        
+        # Chapter content
+        if 'content' in chapter:
+            # Illustrations are not embedded in PDFs, only noted
+            content = replace_image_markers(chapter['content'], lambda n: illustration_text(chapter.get('images'), n))
             
-            # Add TOC entries
-            y_pos = height - 150
-            for chapter in filtered_chapters:
-                pdf.setFont(font_name, 12)
-                toc_entry = f"{chapter['index']}. {chapter['title']}"
-                pdf.drawString(50, y_pos, toc_entry)
-                y_pos -= 20
+            # Split content into paragraphs
+            paragraphs = content.split('\n')
+            for paragraph in paragraphs:
+                if paragraph.strip():
+                    y_pos = self.add_text(paragraph, 50, y_pos, width-100)
+                    y_pos -= 10
                 
                 # Add new page if needed
                 if y_pos < 50:
                     pdf.showPage()
-                    pdf.setFont(font_name, 18)
-                    pdf.drawCentredString(width/2, height-100, "Table of Contents (continued)")
-                    y_pos = height - 150
+                    pdf.setFont(font_name, 12)
+                    y_pos = height - 50
+        
+        return current_arc
+
+
+def _render_pdf_fragment(job) -> Tuple[str, List[int], int]:
+    """Render a group of chapters into a standalone PDF (runs in a worker process).
+    
+    Returns the fragment path, the 0-based page each chapter starts on, and the
+    fragment's page count.
+    """
+    path, chapters, current_arc, font_path, render_cache = job
+    RenderCache.configure(**render_cache)
+    from fonts import FontManager
+    font_name = FontManager.shared(font_path, allow_download=False).register()
+    
+    pdf = canvas.Canvas(path, pagesize=letter)
+    renderer = PdfPageRenderer(pdf, font_name)
+    starts = []
+    for i, chapter in enumerate(chapters):
+        # New page for each chapter
+        if i:
+            pdf.showPage()
+        starts.append(pdf.getPageNumber() - 1)
+        current_arc = renderer.chapter(chapter, current_arc)
+    
+    page_count = pdf.getPageNumber()
+    pdf.save()
+    return path, starts, page_count
+
+
+class JapanesePdfExporter:
+    """Export novel to PDF format with Japanese font support."""
+    
+    def __init__(self, novel_info: Dict, chapters: List[Dict], font_path: Optional[str] = None, workers: int = 1):
+        self.novel_info = novel_info
+        self.chapters = chapters
+        self.font_path = font_path
+        self.workers = workers
+        
+    def _get_japanese_font(self) -> str:
+        """Register a Japanese font (once per process) and return its name."""
+        from fonts import FontManager
+        return FontManager.shared(self.font_path).register()
+    
+    def create_pdf(self, output_path: str, include_novel_info: bool = True):
+        """Create PDF with Japanese font support.
+        
+        The chapters are written as given; callers select the range, by list
+        position, since chapter indexes restart in every arc on some sites.
+        """
+        if not REPORTLAB_AVAILABLE:
+            raise ImportError("reportlab is not available. Cannot create PDF.")
+        
+        chapters = self.chapters
+        
+        if self.workers > 1 and len(chapters) > 1:
+            if PYPDF_AVAILABLE:
+                return self._create_pdf_parallel(output_path, include_novel_info, chapters)
+            print("pypdf is not available, rendering PDF in a single process. Install it with: pip install pypdf")
+        
+        # Register the font (a no-op after the first export in this process)
+        font_name = self._get_japanese_font()
+        
+        # Create PDF
+        pdf = canvas.Canvas(output_path, pagesize=letter)
+        renderer = PdfPageRenderer(pdf, font_name)
+        
+        # Add cover and TOC pages if novel info is included
+        if include_novel_info:
+            renderer.cover(self.novel_info)
+            renderer.toc(chapters)
         
         # Add chapters
         current_arc = None
-        for chapter in self.chapters:
-            # Skip if not in range
-            if chapter_range and not (chapter_range[0] <= chapter['index'] <= chapter_range[1]):
-                continue
-            
+        for chapter in chapters:
             # New page for each chapter
             pdf.showPage()
+            current_arc = renderer.chapter(chapter, current_arc)
+        
+        # Save the PDF
+        pdf.save()
+        return output_path
+    
+    def _create_pdf_parallel(self, output_path: str, include_novel_info: bool, chapters: List[Dict]) -> str:
+        """Render groups of chapters on a process pool and merge the fragments.
+        
+        The front matter is rendered last, once every chapter's page is known,
+        so the table of contents carries correct page numbers. Each chapter also
+        gets a PDF bookmark.
+        """
+        self._get_japanese_font()
+        from fonts import FontManager
+        font_path = FontManager.shared().font_path
+        
+        # Several groups per worker keeps the pool busy when chapter sizes vary
+        group_size = max(1, math.ceil(len(chapters) / (self.workers * 4)))
+        groups = [chapters[i:i + group_size] for i in range(0, len(chapters), group_size)]
+        
+        # Worker processes don't inherit this process's cache settings
+        render_cache = RenderCache.shared().settings()
+        temp_dir = tempfile.mkdtemp(prefix="syosetu_pdf_")
+        try:
+            jobs = []
+            current_arc = None
+            for n, group in enumerate(groups):
+                jobs.append((os.path.join(temp_dir, f"fragment_{n:05d}.pdf"), group, current_arc, font_path,
+                             render_cache))
+                # Arc headers depend on the previous chapter's arc, so carry it into the next group
+                for chapter in group:
+                    if 'arc' in chapter:
+                        current_arc = chapter['arc']
             
-            # Check if arc changed
-            if 'arc' in chapter and chapter['arc'] != current_arc:
-                current_arc = chapter['arc']
-                if current_arc:
-                    pdf.setFont(font_name, 16)
-                    pdf.drawCentredString(width/2, height-100, current_arc)
-                    y_pos = height - 130
-                else:
-                    y_pos = height - 100
-            else:
-                y_pos = height - 100
+            with concurrent.futures.ProcessPoolExecutor(max_workers=self.workers) as executor:
+                fragments = list(executor.map(_render_pdf_fragment, jobs))
             
-            # Chapter title
-            pdf.setFont(font_name, 18)
-            pdf.drawCentredString(width/2, y_pos, chapter['title'])
-            y_pos -= 40
+            # 1-based page number of every chapter in the merged document
+            front_pages = 1 + PdfPageRenderer.toc_page_count(len(chapters)) if include_novel_info else 0
+            page_numbers = []
+            offset = front_pages
+            for _, starts, page_count in fragments:
+                page_numbers.extend(offset + start + 1 for start in starts)
+                offset += page_count
             
-            # Chapter content
-            if 'content' in chapter:
-                # Split content into paragraphs
-                paragraphs = chapter['content'].split('\n')
-                for paragraph in paragraphs:
-                    if paragraph.strip():
-                        y_pos = add_text(paragraph, 50, y_pos, width-100)
-                        y_pos -= 10
-                    
-                    # Add new page if needed
-                    if y_pos < 50:
-                        pdf.showPage()
-                        pdf.setFont(font_name, 12)
-                        y_pos = height - 50
+            writer = PdfWriter()
+            if include_novel_info:
+                front_path = os.path.join(temp_dir, "front.pdf")
+                pdf = canvas.Canvas(front_path, pagesize=letter)
+                renderer = PdfPageRenderer(pdf, FontManager.shared().font_name)
+                renderer.cover(self.novel_info)
+                renderer.toc(chapters, page_numbers)
+                pdf.save()
+                writer.append(front_path)
+            
+            for path, _, _ in fragments:
+                writer.append(path)
+            
+            for chapter, page_number in zip(chapters, page_numbers):
+                writer.add_outline_item(chapter['title'], page_number - 1)
+            
+            with open(output_path, 'wb') as f:
+                writer.write(f)
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
         
-        # Save the PDF
-        pdf.save()
         return output_path
     
-    def save(self, filename: str, include_novel_info: bool = True, chapter_range: Optional[List[int]] = None) -> str:
+    def save(self, filename: str, include_novel_info: bool = True) -> str:
         if not REPORTLAB_AVAILABLE:
             raise ImportError("reportlab is not available. Cannot create PDF.")
             
@@ -392,12 +1322,11 @@ class JapanesePdfExporter:
         os.makedirs(os.path.dirname(os.path.abspath(filename)), exist_ok=True)
         
         # Create PDF
-        return self.create_pdf(filename, include_novel_info, chapter_range)
+        return self.create_pdf(filename, include_novel_info)
 
 
-def download_novel(novel_info: Dict, chapters: List[Dict], format_type: str = 'epub', 
-                  include_novel_info: bool = True, chapter_range: Optional[List[int]] = None) -> str:
-    """Download novel in specified format."""
+def _output_basepath(novel_info: Dict, chapter_range: Optional[List[int]] = None) -> str:
+    """Path (without extension) of a new download for the novel."""
     # Create filename from novel title
     title = sanitize_filename(novel_info['title'])
     timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -412,21 +1341,248 @@ def download_novel(novel_info: Dict, chapters: List[Dict], format_type: str = 'e
     else:
         filename = f"{title}_full_{timestamp}"
     
-    filepath = os.path.join(download_dir, filename)
+    return os.path.join(download_dir, filename)
+
+
+def chapter_size(chapter: Dict) -> int:
+    """Approximate size of a chapter in the output, in bytes."""
+    return len(chapter['title'].encode('utf-8')) + len(chapter.get('content', '').encode('utf-8'))
+
+
+def split_volumes(chapters: List[Dict], split_by: str, volume_chapters: int = 500,
+                  volume_size: int = 20 * 1024 * 1024) -> List[List[Dict]]:
+    """Split chapters into volumes.
+    
+    ``split_by`` is one of:
+    
+    - ``'arc'``: a new volume starts whenever the ``arc`` field changes
+      (chapters without an arc stay in the current volume)
+    - ``'count'``: at most ``volume_chapters`` chapters per volume
+    - ``'size'``: at most ``volume_size`` bytes of text per volume (a single
+      larger chapter still gets a volume of its own)
+    """
+    volumes: List[List[Dict]] = []
+    current: List[Dict] = []
+    current_arc = None
+    current_size = 0
+    
+    for chapter in chapters:
+        if split_by == 'arc':
+            arc = chapter.get('arc')
+            start_new = bool(arc) and arc != current_arc
+            if arc:
+                current_arc = arc
+        elif split_by == 'count':
+            start_new = len(current) >= volume_chapters
+        elif split_by == 'size':
+            size = chapter_size(chapter)
+            start_new = current_size + size > volume_size
+            current_size = size if start_new or not current else current_size + size
+        else:
+            raise ValueError(f"Unsupported volume split: {split_by}")
+        
+        if start_new and current:
+            volumes.append(current)
+            current = []
+        current.append(chapter)
+    
+    if current:
+        volumes.append(current)
+    return volumes
+
+
+def _export_volume(job) -> str:
+    """Write one volume (runs in a worker process)."""
+    filepath, novel_info, chapters, format_type, include_novel_info, font_path, compression, render_cache = job
+    RenderCache.configure(**render_cache)
+    if format_type in TEXT_FORMATS:
+        return StreamingTextWriter(filepath, novel_info, include_novel_info, format_type, compression).write(chapters)
+    if format_type == 'epub':
+        return StreamingEpubWriter(filepath + ".epub", novel_info, include_novel_info).write(chapters)
+    from fonts import FontManager
+    FontManager.shared(font_path, allow_download=False)
+    exporter = JapanesePdfExporter(novel_info, chapters, font_path=font_path)
+    return exporter.save(filepath + ".pdf", include_novel_info)
+
+
+def download_volumes(novel_info: Dict, chapters: Iterable[Dict], format_type: Union[str, List[str]] = 'epub',
+                     include_novel_info: bool = True, chapter_range: Optional[List[int]] = None,
+                     split_by: str = 'arc', volume_chapters: int = 500,
+                     volume_size: int = 20 * 1024 * 1024, workers: int = 4,
+                     compression: Optional[str] = None) -> List[str]:
+    """Download a novel as several volumes, generated in parallel.
+    
+    Volume files share the name of a single download with a ``_volNN`` suffix,
+    and each volume has its own cover and table of contents. ``format_type``
+    may be a list of formats; every volume in every format is generated on
+    the same pool. Returns the file paths in volume order.
+    """
+    format_types = [format_type] if isinstance(format_type, str) else list(format_type)
+    format_types = list(dict.fromkeys(f.lower() for f in format_types))
+    for format_type in format_types:
+        if format_type not in ('epub', 'pdf') and format_type not in TEXT_FORMATS:
+            raise ValueError(f"Unsupported format: {format_type}")
+    if 'pdf' in format_types and not REPORTLAB_AVAILABLE:
+        raise ImportError("reportlab is not available. Cannot create PDF.")
+    
+    # The chapters are already selected; chapter_range only names the files
+    chapters = list(chapters)
+    volumes = split_volumes(chapters, split_by, volume_chapters, volume_size)
+    
+    # Resolve the font once so worker processes don't each search for one
+    font_path = None
+    if 'pdf' in format_types:
+        from fonts import FontManager
+        FontManager.shared().register()
+        font_path = FontManager.shared().font_path
+    
+    basepath = _output_basepath(novel_info, chapter_range)
+    digits = max(2, len(str(len(volumes))))
+    # Worker processes don't inherit this process's cache settings
+    render_cache = RenderCache.shared().settings()
+    jobs = []
+    for number, volume in enumerate(volumes, 1):
+        volume_info = dict(novel_info)
+        volume_info['title'] = f"{novel_info['title']} Vol. {number}"
+        if split_by == 'arc' and volume[0].get('arc'):
+            volume_info['title'] += f": {volume[0]['arc']}"
+        for format_type in format_types:
+            jobs.append((f"{basepath}_vol{number:0{digits}d}", volume_info, volume,
+                         format_type, include_novel_info, font_path, compression, render_cache))
+    
+    if workers > 1 and len(jobs) > 1:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(_export_volume, jobs))
+    return [_export_volume(job) for job in jobs]
+
+
+def download_novel(novel_info: Dict, chapters: Iterable[Dict], format_type: str = 'epub', 
+                  include_novel_info: bool = True, chapter_range: Optional[List[int]] = None,
+                  pdf_workers: int = 1, compression: Optional[str] = None,
+                  filepath: Optional[str] = None) -> str:
+    """Download novel in specified format.
+    
+    ``chapters`` may be any iterable, such as a generator yielding chapters as
+    they are fetched. EPUB and the plain text formats (txt, md, jsonl) are
+    streamed into the file one chapter at a time; the text formats can be
+    ``'gzip'`` or ``'zstd'`` compressed. With ``pdf_workers`` above 1, PDF
+    chapters are rendered on a process pool. ``filepath`` (without extension)
+    defaults to a new timestamped file in the downloads directory, named
+    after ``chapter_range``; the chapters themselves are written as given.
+    """
+    if filepath is None:
+        filepath = _output_basepath(novel_info, chapter_range)
     
     # Note: Translation should be applied before this function is called
     # The chapters and novel_info should already contain translated content
     
+    with EXPORT_SECONDS.time(format=format_type.lower()), span("export"):
+        return _export_novel(novel_info, chapters, format_type, include_novel_info, pdf_workers, compression,
+                             filepath)
+
+
+def _export_novel(novel_info: Dict, chapters: Iterable[Dict], format_type: str, include_novel_info: bool,
+                  pdf_workers: int, compression: Optional[str], filepath: str) -> str:
     # Export based on format
-    if format_type.lower() == 'epub':
-        if not EPUB_AVAILABLE:
-            raise ImportError("ebooklib is not available. Cannot create EPUB.")
-        exporter = EpubExporter(novel_info, chapters)
-        return exporter.save(filepath + ".epub", include_novel_info, chapter_range)
+    if format_type.lower() in TEXT_FORMATS:
+        writer = StreamingTextWriter(filepath, novel_info, include_novel_info, format_type.lower(), compression)
+        return writer.write(chapters)
+    elif format_type.lower() == 'epub':
+        writer = StreamingEpubWriter(filepath + ".epub", novel_info, include_novel_info)
+        return writer.write(chapters)
     elif format_type.lower() == 'pdf':
         if not REPORTLAB_AVAILABLE:
             raise ImportError("reportlab is not available. Cannot create PDF.")
-        exporter = JapanesePdfExporter(novel_info, chapters)
-        return exporter.save(filepath + ".pdf", include_novel_info, chapter_range)
+        exporter = JapanesePdfExporter(novel_info, list(chapters), workers=pdf_workers)
+        return exporter.save(filepath + ".pdf", include_novel_info)
     else:
-        raise ValueError(f"Unsupported format: {format_type}")
\ No newline at end of file
+        raise ValueError(f"Unsupported format: {format_type}")
+
+
+# Formats written one chapter at a time, while the chapters are still being fetched
+STREAMING_FORMATS = ('epub',) + tuple(TEXT_FORMATS)
+
+
+def download_formats(novel_info: Dict, chapters: Iterable[Dict], format_types: List[str],
+                     include_novel_info: bool = True, chapter_range: Optional[List[int]] = None,
+                     pdf_workers: int = 1, compression: Optional[str] = None) -> List[str]:
+    """Download a novel in several formats from a single pass over the chapters.
+    
+    Chapters are read from ``chapters`` once. The first streaming format
+    (EPUB or text) is written as they arrive, and the chapters it received
+    are kept for the other formats, which are written afterwards. Chapters
+    that aren't already in a chapter store are moved to a temporary one, so
+    only their titles and URLs stay in memory. The formats run one
+    after another in the calling thread rather than side by side: EPUB and
+    PDF rendering are CPU-bound, so threads would only take turns holding
+    the GIL, and the PDF process pool is always started from the caller's
+    thread. The files share a name and differ only in extension. An
+    exporter that fails is reported without stopping the others.
+    
+    Returns the paths of the files that were written.
+    """
+    format_types = list(dict.fromkeys(format_type.lower() for format_type in format_types))
+    for format_type in format_types:
+        if format_type not in ('epub', 'pdf') and format_type not in TEXT_FORMATS:
+            raise ValueError(f"Unsupported format: {format_type}")
+    
+    filepath = _output_basepath(novel_info, chapter_range)
+    if len(format_types) == 1:
+        return [download_novel(novel_info, chapters, format_types[0], include_novel_info, chapter_range,
+                               pdf_workers, compression, filepath)]
+    
+    # The streaming format goes first, so it overlaps with fetching
+    order = sorted(range(len(format_types)), key=lambda n: format_types[n] not in STREAMING_FORMATS)
+    results: List[Optional[str]] = [None] * len(format_types)
+    errors: List[Optional[Exception]] = [None] * len(format_types)
+    
+    received: List[Chapter] = []
+    source = iter(chapters)
+    source_error: Optional[Exception] = None
+    spill_directory = tempfile.mkdtemp(prefix="syosetu_formats_")
+    spill = ChapterStore(os.path.join(spill_directory, "chapters.sqlite"))
+    
+    def keep(chapter):
+        # A copy, so the caller's chapter never points into the temporary store
+        record = Chapter.from_dict(chapter).copy()
+        if not record.stored:
+            record.offload(spill, str(len(received)))
+        received.append(record)
+    
+    def stream():
+        nonlocal source_error
+        while True:
+            try:
+                chapter = next(source)
+            except StopIteration:
+                return
+            except Exception as e:
+                # Failed fetches end the download instead of counting as an exporter error
+                source_error = e
+                raise
+            keep(chapter)
+            yield chapter
+    
+    try:
+        for n in order:
+            try:
+                results[n] = download_novel(novel_info, stream() if n == order[0] else received, format_types[n],
+                                            include_novel_info, chapter_range, pdf_workers, compression, filepath)
+            except Exception as e:
+                if source_error is not None:
+                    raise source_error
+                errors[n] = e
+            if n == order[0]:
+                # Fetch whatever the first exporter left unread, e.g. after it failed
+                for chapter in source:
+                    keep(chapter)
+    finally:
+        spill.close()
+        shutil.rmtree(spill_directory, ignore_errors=True)
+    
+    for format_type, error in zip(format_types, errors):
+        if error:
+            print(f"Error creating {format_type.upper()} file: {error}")
+    if not any(results):
+        raise next(error for error in errors if error)
+    return [result for result in results if result]
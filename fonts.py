@@ -0,0 +1,207 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import glob
+import json
+import threading
+import urllib.request
+from typing import List, Optional
+
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont, TTFError
+from reportlab.pdfbase.cidfonts import UnicodeCIDFont
+
+from config import CONFIG_DIR, ensure_config_dir
+
+# Directory for fonts bundled with or downloaded by the scraper
+FONT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fonts")
+
+# Resolved font path, remembered between runs to skip the system font scan
+FONT_CACHE_FILE = os.path.join(CONFIG_DIR, "font_cache.json")
+
+# Real TrueType font to download if nothing usable is installed
+FONT_DOWNLOAD_URL = "https://github.com/google/fonts/raw/main/ofl/notosansjp/NotoSansJP%5Bwght%5D.ttf"
+FONT_DOWNLOAD_NAME = "NotoSansJP-VariableFont_wght.ttf"
+
+# Font files known to cover Japanese, in order of preference. reportlab can
+# only embed TrueType outlines, so CFF-based .otf fonts are not listed.
+JAPANESE_FONT_FILES = [
+    "NotoSansJP-Regular.ttf",
+    "NotoSansJP-VariableFont_wght.ttf",
+    "NotoSerifJP-Regular.ttf",
+    "ipaexg.ttf",
+    "ipaexm.ttf",
+    "ipag.ttf",
+    "ipagp.ttf",
+    "ipam.ttf",
+    "TakaoGothic.ttf",
+    "TakaoPGothic.ttf",
+    "VL-Gothic-Regular.ttf",
+    "fonts-japanese-gothic.ttf",
+    "YuGothR.ttc",
+    "YuGothM.ttc",
+    "meiryo.ttc",
+    "msgothic.ttc",
+    "msmincho.ttc",
+    "Osaka.ttf",
+]
+
+# Built-in CID font used when no TrueType font is available. Its glyphs are
+# not embedded; PDF readers substitute an installed Japanese font.
+CID_FALLBACK_FONT = "HeiseiKakuGo-W5"
+
+
+def system_font_dirs() -> List[str]:
+    """Directories where the operating system keeps fonts."""
+    home = os.path.expanduser("~")
+    if sys.platform.startswith("win"):
+        windir = os.environ.get("WINDIR", r"C:\Windows")
+        return [os.path.join(windir, "Fonts"),
+                os.path.join(os.environ.get("LOCALAPPDATA", ""), "Microsoft", "Windows", "Fonts")]
+    if sys.platform == "darwin":
+        return ["/System/Library/Fonts", "/Library/Fonts", os.path.join(home, "Library", "Fonts")]
+    return ["/usr/share/fonts", "/usr/local/share/fonts",
+            os.path.join(home, ".fonts"), os.path.join(home, ".local", "share", "fonts")]
+
+
+class FontManager:
+    """Locate, provision and register a Japanese font for PDF export.
+
+    The font is resolved and registered with reportlab once per process and
+    shared by every exporter. reportlab embeds only the glyphs actually used
+    (subsetting), so PDFs stay small even with a full CJK font.
+    """
+
+    FONT_NAME = "JapaneseFont"
+
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, font_path: Optional[str] = None, allow_download: bool = True):
+        """Initialize the manager.
+
+        Args:
+            font_path (str, optional): Explicit TrueType font file to use
+            allow_download (bool): Download a font if none is installed
+        """
+        self.font_path = font_path
+        self.allow_download = allow_download
+        self.font_name = None
+        self.lock = threading.Lock()
+
+    @classmethod
+    def shared(cls, font_path: Optional[str] = None, allow_download: bool = True) -> 'FontManager':
+        """Get the process-wide font manager."""
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls(font_path, allow_download)
+            return cls._shared
+
+    def register(self) -> str:
+        """Register the Japanese font with reportlab, once, and return its name."""
+        with self.lock:
+            if self.font_name:
+                return self.font_name
+
+            for path in self._candidate_paths():
+                font = self._load(path)
+                if font:
+                    pdfmetrics.registerFont(font)
+                    self._remember(path)
+                    self.font_path = path
+                    self.font_name = self.FONT_NAME
+                    return self.font_name
+
+            print("No Japanese TrueType font found. Using built-in CID font (glyphs are not embedded).")
+            pdfmetrics.registerFont(UnicodeCIDFont(CID_FALLBACK_FONT))
+            self.font_path = None
+            self.font_name = CID_FALLBACK_FONT
+            return self.font_name
+
+    def _candidate_paths(self):
+        """Yield font files to try, cheapest lookups first."""
+        if self.font_path:
+            yield self.font_path
+
+        cached = self._cached_path()
+        if cached:
+            yield cached
+
+        # Any font placed in the local fonts directory
+        for pattern in ("*.ttf", "*.ttc"):
+            yield from sorted(glob.glob(os.path.join(FONT_DIR, pattern)))
+
+        # Known Japanese fonts installed on the system
+        wanted = {name.lower(): rank for rank, name in enumerate(JAPANESE_FONT_FILES)}
+        found = []
+        for font_dir in system_font_dirs():
+            if not os.path.isdir(font_dir):
+                continue
+            for root, _, files in os.walk(font_dir):
+                for file_name in files:
+                    rank = wanted.get(file_name.lower())
+                    if rank is not None:
+                        found.append((rank, os.path.join(root, file_name)))
+        for _, path in sorted(found):
+            yield path
+
+        if self.allow_download:
+            downloaded = self._download()
+            if downloaded:
+                yield downloaded
+
+    @staticmethod
+    def _load(path: str) -> Optional[TTFont]:
+        """Parse a font file, returning None if reportlab can't embed it."""
+        if not os.path.isfile(path):
+            return None
+        try:
+            return TTFont(FontManager.FONT_NAME, path, subfontIndex=0)
+        except (TTFError, OSError, ValueError) as e:
+            print(f"Skipping unusable font {path}: {e}")
+            return None
+
+    def _download(self) -> Optional[str]:
+        """Download a TrueType font into the local fonts directory."""
+        os.makedirs(FONT_DIR, exist_ok=True)
+        font_path = os.path.join(FONT_DIR, FONT_DOWNLOAD_NAME)
+        partial_path = font_path + ".part"
+
+        print("Downloading Japanese font (Noto Sans JP)...")
+        try:
+            urllib.request.urlretrieve(FONT_DOWNLOAD_URL, partial_path)
+            with open(partial_path, 'rb') as f:
+                magic = f.read(4)
+            # TrueType (0x00010000 or 'true') or TrueType collection ('ttcf')
+            if magic not in (b'\x00\x01\x00\x00', b'true', b'ttcf'):
+                raise ValueError("downloaded file is not a TrueType font")
+            os.replace(partial_path, font_path)
+            print("Font downloaded successfully")
+            return font_path
+        except Exception as e:
+            print(f"Failed to download font: {e}")
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+            return None
+
+    @staticmethod
+    def _cached_path() -> Optional[str]:
+        """Font path resolved by a previous run, if it still exists."""
+        try:
+            with open(FONT_CACHE_FILE, 'r', encoding='utf-8') as f:
+                path = json.load(f).get("font_path")
+        except (OSError, ValueError):
+            return None
+        return path if path and os.path.isfile(path) else None
+
+    @staticmethod
+    def _remember(path: str):
+        """Store the resolved font path for the next run."""
+        try:
+            ensure_config_dir()
+            with open(FONT_CACHE_FILE, 'w', encoding='utf-8') as f:
+                json.dump({"font_path": path}, f)
+        except OSError:
+            pass
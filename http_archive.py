@@ -0,0 +1,294 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Record and replay of the scraper's HTTP traffic.
+
+In record mode every request a scraper's session sends is stored with its
+response (method, URL, headers, status, body and timing) in an archive, a
+SQLite file with zlib-compressed bodies. In replay mode the session is
+answered from the archive instead of the network, in the recorded order and
+optionally with the recorded latency, so a production job can be reproduced
+offline and parser or exporter changes benchmarked against real pages.
+Cookie and authorization headers are not stored.
+
+Usage:
+    python http_archive.py ARCHIVE             list the recorded requests
+    python http_archive.py ARCHIVE --har FILE  convert to HAR for browser developer tools
+"""
+
+import os
+import sys
+import json
+import time
+import zlib
+import atexit
+import base64
+import sqlite3
+import argparse
+import datetime
+import threading
+from typing import Any, Dict, Iterator, Optional
+
+import requests
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from metrics import CACHE_HITS, CACHE_MISSES
+
+MODES = ("record", "replay")
+
+# Headers replaced by this value before they are stored
+REDACTED_HEADERS = {'cookie', 'set-cookie', 'authorization', 'proxy-authorization'}
+REDACTED = "[redacted]"
+
+
+class ArchiveMiss(requests.exceptions.RequestException):
+    """A replayed request that the archive has no response for."""
+
+
+def _headers(headers) -> str:
+    return json.dumps({name: REDACTED if name.lower() in REDACTED_HEADERS else value
+                       for name, value in headers.items()}, ensure_ascii=False)
+
+
+class HttpArchive:
+    """Archive of HTTP exchanges, recorded from or replayed into requests sessions."""
+
+    _shared: Dict[str, 'HttpArchive'] = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(self, path: str, mode: str = "record", timing: bool = False):
+        """Open or create the archive.
+
+        Args:
+            path (str): SQLite archive file; recording appends to it
+            mode (str): "record" or "replay"
+            timing (bool): When replaying, wait as long as each original response took
+        """
+        if mode not in MODES:
+            raise ValueError(f"Unknown archive mode: {mode}. Options: {', '.join(MODES)}")
+        if mode == "replay" and not os.path.exists(path):
+            raise FileNotFoundError(f"HTTP archive not found: {path}")
+        self.path = path
+        self.mode = mode
+        self.timing = timing
+        self.lock = threading.Lock()
+        self._connection = None
+        # Responses replayed per (method, URL), so repeated requests get the following recordings
+        self.replayed: Dict[tuple, int] = {}
+
+    @classmethod
+    def shared(cls, path: str, mode: str = "record", timing: bool = False) -> 'HttpArchive':
+        """Get the process-wide archive of a file, so scrapers recording to it share one connection."""
+        key = os.path.abspath(path)
+        with cls._shared_lock:
+            archive = cls._shared.get(key)
+            if archive is None or (archive.mode, archive.timing) != (mode, timing):
+                if not cls._shared:
+                    atexit.register(cls.close_shared)
+                if archive is not None:
+                    # Scrapers still using the previous mode keep their own object
+                    archive.close()
+                archive = cls._shared[key] = cls(path, mode, timing)
+            return archive
+
+    @classmethod
+    def close_shared(cls):
+        with cls._shared_lock:
+            for archive in cls._shared.values():
+                archive.close()
+            cls._shared.clear()
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == "replay"
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS entries (id INTEGER PRIMARY KEY, started REAL, elapsed REAL, "
+                "method TEXT, url TEXT, request_headers TEXT, status INTEGER, reason TEXT, "
+                "response_headers TEXT, body BLOB)")
+            self._connection.execute("CREATE INDEX IF NOT EXISTS entries_url ON entries (url, method, id)")
+        return self._connection
+
+    def attach(self, session: requests.Session):
+        """Route a session's requests through the archive, wrapping its existing adapters."""
+        for prefix in ("https://", "http://"):
+            adapter = session.adapters.get(prefix)
+            if not isinstance(adapter, ArchiveAdapter):
+                session.mount(prefix, ArchiveAdapter(self, adapter))
+
+    def record(self, request: requests.PreparedRequest, response: requests.Response, started: float,
+               elapsed: float):
+        """Store an exchange; started is a Unix time, elapsed in seconds."""
+        row = (started, elapsed, request.method, request.url, _headers(request.headers), response.status_code,
+               response.reason, _headers(response.headers), zlib.compress(response.content or b"", 6))
+        with self.lock:
+            self.connection.execute(
+                "INSERT INTO entries (started, elapsed, method, url, request_headers, status, reason, "
+                "response_headers, body) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", row)
+            self.connection.commit()
+
+    def replay(self, request: requests.PreparedRequest) -> requests.Response:
+        """Recorded response to a request.
+
+        Repeated requests for a URL get its recordings in order, e.g. a 503 and
+        then the successful retry, and the last one once they run out.
+
+        Raises:
+            ArchiveMiss: If the URL was never recorded
+        """
+        key = (request.method, request.url)
+        query = ("SELECT elapsed, status, reason, response_headers, body FROM entries "
+                 "WHERE url = ? AND method = ? ORDER BY id")
+        with self.lock:
+            position = self.replayed.get(key, 0)
+            row = self.connection.execute(query + " LIMIT 1 OFFSET ?",
+                                          (request.url, request.method, position)).fetchone()
+            if row is not None:
+                self.replayed[key] = position + 1
+            elif position:
+                row = self.connection.execute(query.replace("ORDER BY id", "ORDER BY id DESC") + " LIMIT 1",
+                                              (request.url, request.method)).fetchone()
+        if row is None:
+            CACHE_MISSES.inc(cache="archive")
+            raise ArchiveMiss(f"{request.method} {request.url} is not in the archive {self.path}",
+                              request=request)
+        CACHE_HITS.inc(cache="archive")
+        elapsed, status, reason, headers, body = row
+        if self.timing:
+            time.sleep(elapsed)
+
+        response = requests.Response()
+        response.status_code = status
+        response.reason = reason
+        response.headers = CaseInsensitiveDict(json.loads(headers))
+        # The stored body is already decoded
+        response.headers.pop('Content-Encoding', None)
+        response._content = zlib.decompress(body)
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.url = request.url
+        response.request = request
+        response.elapsed = datetime.timedelta(seconds=elapsed)
+        return response
+
+    def latest(self, url: str, method: str = "GET") -> Optional[bytes]:
+        """Body of the last successful response recorded for a URL, or None if there is none."""
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT body FROM entries WHERE url = ? AND method = ? AND status BETWEEN 200 AND 299 "
+                "ORDER BY id DESC LIMIT 1", (url, method)).fetchone()
+        return zlib.decompress(row[0]) if row is not None else None
+
+    def has(self, url: str, method: str = "GET") -> bool:
+        """Whether a successful response was recorded for a URL."""
+        with self.lock:
+            return self.connection.execute(
+                "SELECT 1 FROM entries WHERE url = ? AND method = ? AND status BETWEEN 200 AND 299 LIMIT 1",
+                (url, method)).fetchone() is not None
+
+    def entries(self) -> Iterator[Dict[str, Any]]:
+        """Every recorded exchange in order, bodies decompressed."""
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT started, elapsed, method, url, request_headers, status, reason, response_headers, body "
+                "FROM entries ORDER BY id").fetchall()
+        for started, elapsed, method, url, request_headers, status, reason, response_headers, body in rows:
+            yield {'started': started, 'elapsed': elapsed, 'method': method, 'url': url,
+                   'request_headers': json.loads(request_headers), 'status': status, 'reason': reason,
+                   'response_headers': json.loads(response_headers), 'body': zlib.decompress(body)}
+
+    def to_har(self) -> Dict[str, Any]:
+        """The archive in the HAR 1.2 format."""
+        entries = []
+        for entry in self.entries():
+            headers = CaseInsensitiveDict(entry['response_headers'])
+            mime_type = headers.get('Content-Type', "")
+            content = {'size': len(entry['body']), 'mimeType': mime_type}
+            try:
+                content['text'] = entry['body'].decode(get_encoding_from_headers(headers) or 'utf-8')
+            except (UnicodeDecodeError, LookupError):
+                content['text'] = base64.b64encode(entry['body']).decode('ascii')
+                content['encoding'] = "base64"
+            milliseconds = round(entry['elapsed'] * 1000, 3)
+            entries.append({
+                'startedDateTime': datetime.datetime.fromtimestamp(entry['started'], datetime.timezone.utc).isoformat(),
+                'time': milliseconds,
+                'request': {'method': entry['method'], 'url': entry['url'], 'httpVersion': "HTTP/1.1",
+                            'headers': [{'name': k, 'value': v} for k, v in entry['request_headers'].items()],
+                            'queryString': [], 'cookies': [], 'headersSize': -1, 'bodySize': 0},
+                'response': {'status': entry['status'], 'statusText': entry['reason'] or "", 'httpVersion': "HTTP/1.1",
+                             'headers': [{'name': k, 'value': v} for k, v in entry['response_headers'].items()],
+                             'cookies': [], 'content': content, 'redirectURL': headers.get('Location', ""),
+                             'headersSize': -1, 'bodySize': len(entry['body'])},
+                'cache': {},
+                'timings': {'send': 0, 'wait': milliseconds, 'receive': 0}
+            })
+        return {'log': {'version': "1.2", 'creator': {'name': "syosetu-scraper", 'version': "1.0"},
+                        'entries': entries}}
+
+    def close(self):
+        with self.lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+
+class ArchiveAdapter(BaseAdapter):
+    """Transport adapter that records through another adapter, or replays from the archive."""
+
+    def __init__(self, archive: HttpArchive, inner: Optional[BaseAdapter] = None):
+        super().__init__()
+        self.archive = archive
+        self.inner = inner or requests.adapters.HTTPAdapter()
+
+    def send(self, request, **kwargs):
+        if self.archive.replaying:
+            return self.archive.replay(request)
+        started = time.time()
+        start = time.perf_counter()
+        response = self.inner.send(request, **kwargs)
+        # Reads the whole body, as the session does anyway for non-streamed requests
+        response.content
+        self.archive.record(request, response, started, time.perf_counter() - start)
+        return response
+
+    def close(self):
+        self.inner.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect a recorded HTTP archive")
+    parser.add_argument("archive", help="Archive file written with --record")
+    parser.add_argument("--har", metavar="FILE", help="Write the archive as a HAR file")
+    args = parser.parse_args(argv)
+
+    try:
+        archive = HttpArchive(args.archive, "replay")
+    except FileNotFoundError as e:
+        print(e)
+        return 1
+    if args.har:
+        with open(args.har, 'w', encoding='utf-8') as f:
+            json.dump(archive.to_har(), f, ensure_ascii=False)
+        print(f"Wrote {args.har}")
+        return 0
+
+    count = total_bytes = 0
+    for entry in archive.entries():
+        count += 1
+        total_bytes += len(entry['body'])
+        print(f"{entry['status']:>3} {entry['elapsed'] * 1000:8.1f} ms {len(entry['body']):>9} B  "
+              f"{entry['method']} {entry['url']}")
+    print(f"{count} requests, {total_bytes / 2 ** 20:.1f} MB of responses, "
+          f"{os.path.getsize(args.archive) / 2 ** 20:.1f} MB archived")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
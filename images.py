@@ -0,0 +1,269 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import io
+import os
+import re
+import json
+import hashlib
+import threading
+import concurrent.futures
+from typing import Dict, Iterable, List, Optional
+
+import requests
+
+from config import CONFIG_DIR
+from metrics import REQUESTS, DOWNLOADED_BYTES, CACHE_HITS, CACHE_MISSES
+from profiling import span
+
+# Pillow is optional; without it images are embedded as downloaded
+try:
+    from PIL import Image
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+# Paragraph standing in for an illustration in chapter content. It has no
+# Japanese text, so the translator passes it through unchanged.
+IMAGE_MARKER = "[[image:{}]]"
+IMAGE_MARKER_PATTERN = re.compile(r'\[\[image:(\d+)\]\]')
+
+# Content-addressed store of downloaded images, with an index.json mapping URLs to files
+IMAGE_CACHE_DIR = os.path.join(CONFIG_DIR, "image_cache")
+
+MEDIA_TYPES = {
+    'JPEG': ('image/jpeg', '.jpg'),
+    'PNG': ('image/png', '.png'),
+    'GIF': ('image/gif', '.gif'),
+    'WEBP': ('image/webp', '.webp')
+}
+
+
+def sniff_image_format(data: bytes) -> Optional[str]:
+    """Image format from the file signature, or None if it's not a known image."""
+    if data.startswith(b'\xff\xd8\xff'):
+        return 'JPEG'
+    if data.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'PNG'
+    if data[:6] in (b'GIF87a', b'GIF89a'):
+        return 'GIF'
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'WEBP'
+    return None
+
+
+def replace_image_markers(text: str, render) -> str:
+    """Replace illustration markers in text with render(index)."""
+    return IMAGE_MARKER_PATTERN.sub(lambda match: render(int(match.group(1))), text)
+
+
+class ImageFetcher:
+    """Download chapter illustrations concurrently into a content-addressed cache.
+
+    Every URL is downloaded at most once, across chapters and runs: the cache
+    index maps URLs to files named after the SHA-256 of the stored image, so
+    the same picture under different URLs is also stored once. With Pillow,
+    images larger than ``max_dimension`` are downscaled and large JPEGs are
+    recompressed to keep EPUB files small.
+    """
+
+    def __init__(self, session: Optional[requests.Session] = None, workers: int = 4,
+                 max_dimension: int = 1600, jpeg_quality: int = 85,
+                 directory: str = IMAGE_CACHE_DIR, timeout: float = 30.0):
+        """Initialize the fetcher.
+
+        Args:
+            session (requests.Session, optional): Session to download with
+            workers (int): Number of concurrent downloads
+            max_dimension (int): Longest side of stored images in pixels (0 keeps the size)
+            jpeg_quality (int): Quality used when recompressing JPEGs
+            directory (str): Cache directory
+            timeout (float): Request timeout in seconds
+        """
+        self.session = session or requests.Session()
+        self.workers = workers
+        self.max_dimension = max_dimension
+        self.jpeg_quality = jpeg_quality
+        self.directory = directory
+        self.index_file = os.path.join(directory, "index.json")
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.in_flight: Dict[str, concurrent.futures.Future] = {}
+        self.failed = set()  # URLs that failed this run are not retried
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+        self.stats = {"downloaded": 0, "cached": 0, "failed": 0, "bytes_downloaded": 0, "bytes_stored": 0}
+        self.index = self._load_index()
+        self.index_changed = False
+
+    def _load_index(self) -> Dict[str, Dict]:
+        try:
+            with open(self.index_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save_index(self):
+        """Write the URL index if new images were downloaded."""
+        with self.lock:
+            if not self.index_changed:
+                return
+            index = dict(self.index)
+            self.index_changed = False
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            partial_path = f"{self.index_file}.{os.getpid()}.part"
+            with open(partial_path, 'w', encoding='utf-8') as f:
+                json.dump(index, f)
+            os.replace(partial_path, self.index_file)
+        except OSError as e:
+            print(f"Could not save image cache index: {e}")
+
+    def path(self, record: Dict) -> str:
+        """Path of a cached image."""
+        return os.path.join(self.directory, record['file_name'])
+
+    def fetch_all(self, urls: Iterable[str], referer: Optional[str] = None) -> Dict[str, Optional[Dict]]:
+        """Fetch images concurrently.
+
+        Args:
+            urls (Iterable[str]): Image URLs; duplicates are fetched once
+            referer (str, optional): Referer header, usually the chapter URL
+
+        Returns:
+            Dict[str, Optional[Dict]]: For each URL, a record with ``file_name``,
+                ``media_type`` and ``path``, or None if the image could not be fetched
+        """
+        futures = {url: self.fetch_async(url, referer) for url in dict.fromkeys(urls)}
+        results = {url: future.result() for url, future in futures.items()}
+        self.save_index()
+        return results
+
+    def resolve(self, images: List[Dict], referer: Optional[str] = None) -> List[Dict]:
+        """Fetch a chapter's illustrations and add their records.
+
+        Args:
+            images (List[Dict]): Illustrations with ``url`` and ``alt``
+            referer (str, optional): Referer header, usually the chapter URL
+
+        Returns:
+            List[Dict]: Copies of the illustrations, with ``file_name``, ``media_type``
+                and ``path`` added for those that could be fetched
+        """
+        images = [dict(image) for image in images]
+        records = self.fetch_all([image['url'] for image in images], referer=referer)
+        for image in images:
+            if records.get(image['url']):
+                image.update(records[image['url']])
+        return images
+
+    def fetch_async(self, url: str, referer: Optional[str] = None) -> concurrent.futures.Future:
+        """Start fetching an image, sharing the download with other callers."""
+        with self.lock:
+            record = self.index.get(url)
+            if record and os.path.isfile(self.path(record)):
+                self.stats["cached"] += 1
+                CACHE_HITS.inc(cache="image")
+                future = concurrent.futures.Future()
+                future.set_result(dict(record, path=self.path(record)))
+                return future
+            if url in self.failed:
+                future = concurrent.futures.Future()
+                future.set_result(None)
+                return future
+            if url not in self.in_flight:
+                CACHE_MISSES.inc(cache="image")
+                self.in_flight[url] = self.executor.submit(self._fetch, url, referer)
+            return self.in_flight[url]
+
+    def _fetch(self, url: str, referer: Optional[str]) -> Optional[Dict]:
+        with span("images"):
+            return self._download(url, referer)
+
+    def _download(self, url: str, referer: Optional[str]) -> Optional[Dict]:
+        try:
+            headers = {'Referer': referer} if referer else None
+            response = self.session.get(url, headers=headers, timeout=self.timeout)
+            REQUESTS.inc(kind="image", status=response.status_code)
+            DOWNLOADED_BYTES.inc(len(response.content), kind="image")
+            response.raise_for_status()
+            data = response.content
+            image_format = sniff_image_format(data)
+            if not image_format:
+                raise ValueError("response is not an image")
+
+            downloaded_size = len(data)
+            data, image_format = self._optimize(data, image_format)
+            media_type, extension = MEDIA_TYPES[image_format]
+            file_name = hashlib.sha256(data).hexdigest() + extension
+
+            os.makedirs(self.directory, exist_ok=True)
+            path = os.path.join(self.directory, file_name)
+            if not os.path.exists(path):
+                partial_path = f"{path}.{threading.get_ident()}.part"
+                with open(partial_path, 'wb') as f:
+                    f.write(data)
+                os.replace(partial_path, path)
+
+            record = {'file_name': file_name, 'media_type': media_type}
+            with self.lock:
+                self.index[url] = record
+                self.stats["downloaded"] += 1
+                self.stats["bytes_downloaded"] += downloaded_size
+                self.stats["bytes_stored"] += len(data)
+                self.index_changed = True
+            return dict(record, path=path)
+        except Exception as e:
+            if isinstance(e, requests.exceptions.RequestException) and e.response is None:
+                REQUESTS.inc(kind="image", status="error")
+            print(f"Failed to download image {url}: {e}")
+            with self.lock:
+                self.stats["failed"] += 1
+                self.failed.add(url)
+            return None
+        finally:
+            with self.lock:
+                self.in_flight.pop(url, None)
+
+    def _optimize(self, data: bytes, image_format: str):
+        """Downscale and recompress an image if Pillow is available and it helps."""
+        if not PIL_AVAILABLE or image_format == 'GIF':
+            # Animated GIFs would lose their frames
+            return data, image_format
+        try:
+            with Image.open(io.BytesIO(data)) as image:
+                image.load()
+                too_large = self.max_dimension and max(image.size) > self.max_dimension
+                if not too_large and image_format in ('JPEG', 'PNG'):
+                    return data, image_format
+
+                if too_large:
+                    image.thumbnail((self.max_dimension, self.max_dimension), Image.LANCZOS)
+
+                output = io.BytesIO()
+                if image.mode in ('RGBA', 'LA', 'P') and image_format != 'JPEG':
+                    # Keep transparency
+                    image.save(output, 'PNG', optimize=True)
+                    new_format = 'PNG'
+                else:
+                    image.convert('RGB').save(output, 'JPEG', quality=self.jpeg_quality, optimize=True)
+                    new_format = 'JPEG'
+
+                # Re-encoding a small image can make it bigger
+                if not too_large and output.tell() >= len(data) and image_format in ('JPEG', 'PNG'):
+                    return data, image_format
+                return output.getvalue(), new_format
+        except Exception as e:
+            print(f"Could not recompress image: {e}")
+            return data, image_format
+
+    def report(self) -> str:
+        """Human-readable summary of the images fetched this run."""
+        stats = self.stats
+        return (f"Images: {stats['downloaded']} downloaded ({stats['bytes_downloaded'] // 1024} KB, "
+                f"{stats['bytes_stored'] // 1024} KB stored), {stats['cached']} from cache, "
+                f"{stats['failed']} failed")
+
+    def close(self):
+        """Stop the download threads and save the URL index."""
+        self.executor.shutdown(wait=True)
+        self.save_index()
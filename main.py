@@ -12,8 +12,13 @@ import sys
 import os
 import subprocess
 import importlib
+import atexit
+import zipfile
 from typing import Dict, List, Optional, Union, Any
 from site_parsers import get_parser
+from models import Chapter, ChapterStore, CHAPTER_STORE_FILE
+from offline import LocalSources, MissingPages, OfflineAdapter, StoredChapter, keep_page, store_namespace
+from metrics import REGISTRY, FETCH_SECONDS, REQUESTS, DOWNLOADED_BYTES, RETRIES
 from config import load_config, setup_cli_args, process_cli_args
 
 # Try to import rich, install if not available
@@ -50,6 +55,9 @@ try:
 except ImportError:
     CLOUDSCRAPER_AVAILABLE = False
 
+# Output formats accepted by --download
+DOWNLOAD_FORMATS = ["pdf", "epub", "txt", "md", "jsonl"]
+
 
 class SyosetuScraper:
     """A flexible scraper for various Syosetu web novel sites."""
@@ -63,6 +71,12 @@ class SyosetuScraper:
         'hameln': 'https://syosetu.org'
     }
     
+    # Responses worth retrying: rate limiting and transient server errors
+    RETRY_STATUSES = (429, 500, 502, 503, 504)
+    
+    # Longest wait before a retry, whatever the server asks for
+    MAX_RETRY_WAIT = 60.0
+    
     # URL patterns for different sites
     URL_PATTERNS = {
         'ncode': {
@@ -133,6 +147,43 @@ class SyosetuScraper:
                 self.session.cookies.set('over18', 'off', domain='syosetu.org')
                 logger.warning("cloudscraper not available. Hameln chapters may not be accessible.")
                 logger.warning("Install cloudscraper with: pip install cloudscraper")
+        
+        # Offline runs only read local data; see offline.py
+        self.offline = self.general_config.get("offline", False)
+        
+        # Record the traffic to an HTTP archive, or answer it from one instead of the network
+        self.archive = None
+        archive_config = self.config.get("archive", {})
+        if archive_config.get("mode", "off") != "off" and archive_config.get("path"):
+            from http_archive import HttpArchive
+            self.archive = HttpArchive.shared(archive_config["path"],
+                                              "replay" if self.offline else archive_config["mode"],
+                                              archive_config.get("replay_timing", False))
+            self.archive.attach(self.session)
+            if self.archive.replaying:
+                self.delay = 0
+        
+        self.local = None
+        if self.offline:
+            self.local = LocalSources(self.translation_config, self.archive)
+            self.delay = 0
+            if self.archive is None:
+                for prefix in ("https://", "http://"):
+                    self.session.mount(prefix, OfflineAdapter())
+    
+    def close(self):
+        """Release the translator, the local sources and the HTTP session."""
+        self.parser.close()
+        if self.local is not None:
+            self.local.close()
+            self.local = None
+        self.session.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
     
     def _make_request(self, url: str) -> BeautifulSoup:
         """Make a request and return BeautifulSoup object.
@@ -143,40 +194,95 @@ class SyosetuScraper:
         Returns:
             BeautifulSoup: Parsed HTML
         """
-        logger.debug(f"Requesting: {url}")
-        try:
-            # For Hameln site, set proper referer
-            if self.site_type == 'hameln' and '.html' in url:
-                novel_base = url.rsplit('/', 1)[0] + '/'
-                self.session.headers.update({'Referer': novel_base})
-            
-            # Make the request
-            response = self.session.get(url)
-            response.raise_for_status()
-            time.sleep(self.delay)  # Be nice to the server
-            return BeautifulSoup(response.content, 'lxml')
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Request failed: {e}")
-            
-            # If Hameln chapter fails and cloudscraper is not available, suggest installation
-            if self.site_type == 'hameln' and '.html' in url and not CLOUDSCRAPER_AVAILABLE:
-                logger.error("Hameln chapters require cloudscraper to bypass JavaScript checks")
-                logger.error("Install cloudscraper with: pip install cloudscraper")
+        return BeautifulSoup(self.fetch_page(url), 'lxml')
+    
+    def fetch_page(self, url: str) -> bytes:
+        """Download a page without parsing it.
+        
+        Args:
+            url (str): URL to request
             
-            raise
+        Returns:
+            bytes: Response body
+        """
+        if self.local is not None:
+            return self.local.page(url)
+        
+        logger.debug(f"Requesting: {url}")
+        max_retries = self.general_config.get("max_retries", 3)
+        attempt = 0
+        while True:
+            try:
+                # For Hameln site, set proper referer
+                if self.site_type == 'hameln' and '.html' in url:
+                    novel_base = url.rsplit('/', 1)[0] + '/'
+                    self.session.headers.update({'Referer': novel_base})
+                
+                # Make the request
+                start = time.perf_counter()
+                response = self.session.get(url)
+                FETCH_SECONDS.observe(time.perf_counter() - start, site=self.site_type)
+                REQUESTS.inc(kind="page", status=response.status_code)
+                DOWNLOADED_BYTES.inc(len(response.content), kind="page")
+                response.raise_for_status()
+                time.sleep(self.delay)  # Be nice to the server
+                return response.content
+            except requests.exceptions.RequestException as e:
+                if e.response is None:
+                    REQUESTS.inc(kind="page", status="error")
+                
+                # Rate limiting, transient server errors and dropped connections are retried
+                retryable = (e.response.status_code in self.RETRY_STATUSES if e.response is not None
+                             else isinstance(e, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)))
+                if retryable and attempt < max_retries:
+                    attempt += 1
+                    wait = self._retry_wait(e.response, attempt)
+                    RETRIES.inc(operation="fetch")
+                    logger.warning(f"Request failed: {e}. Retrying in {wait:.1f} s (attempt {attempt}/{max_retries})")
+                    time.sleep(wait)
+                    continue
+                
+                logger.error(f"Request failed: {e}")
+                
+                # If Hameln chapter fails and cloudscraper is not available, suggest installation
+                if self.site_type == 'hameln' and '.html' in url and not CLOUDSCRAPER_AVAILABLE:
+                    logger.error("Hameln chapters require cloudscraper to bypass JavaScript checks")
+                    logger.error("Install cloudscraper with: pip install cloudscraper")
+                
+                raise
+    
+    def _retry_wait(self, response, attempt: int) -> float:
+        """Seconds to wait before retrying: the server's Retry-After, or exponential backoff."""
+        if self.archive is not None and self.archive.replaying and not self.archive.timing:
+            return 0.0
+        backoff = self.general_config.get("retry_backoff", 1.0) * 2 ** (attempt - 1)
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after:
+            try:
+                return min(float(retry_after), self.MAX_RETRY_WAIT)
+            except ValueError:
+                pass  # An HTTP date; fall back to backoff
+        return min(backoff, self.MAX_RETRY_WAIT)
+    
+    def _novel_page(self, url: str) -> BeautifulSoup:
+        """Request a novel page, keeping it for offline runs if chapters are stored on disk."""
+        page = self.fetch_page(url)
+        if self.local is None and self.config.get("export", {}).get("chapter_store", "memory") == "disk":
+            keep_page(url, page)
+        return BeautifulSoup(page, 'lxml')
     
     def get_novel_info(self, novel_id: str) -> Dict:
         url_pattern = self.URL_PATTERNS.get(self.site_type, {}).get('novel', '{base_url}/{novel_id}/')
         url = url_pattern.format(base_url=self.base_url, novel_id=novel_id)
         
-        soup = self._make_request(url)
+        soup = self._novel_page(url)
         return self.parser.parse_novel_info(soup, url)
     
     def get_chapter_list(self, novel_id: str) -> List[Dict]:
         url_pattern = self.URL_PATTERNS.get(self.site_type, {}).get('novel', '{base_url}/{novel_id}/')
         url = url_pattern.format(base_url=self.base_url, novel_id=novel_id)
         
-        soup = self._make_request(url)
+        soup = self._novel_page(url)
         chapters = self.parser.parse_chapter_list(soup, novel_id, self.base_url)
         
         # Format chapter URLs according to site-specific patterns
@@ -193,49 +299,172 @@ class SyosetuScraper:
         
         return chapters
 
-    def get_chapter_content(self, chapter_url: str, chapter_title: str = None) -> Dict:
+    def get_chapter_content(self, chapter_url: str, chapter_title: str = None) -> Chapter:
         soup = self._make_request(chapter_url)
         return self.parser.parse_chapter_content(soup, chapter_url, chapter_title)
 
 
-def download_chapters(scraper, novel_id, novel_info, chapters, chapter_input):
-    """Download chapters based on user input."""
-    from exporter import download_novel
+def parse_chapter_range(chapter_input, chapter_count):
+    """Parse a chapter selection such as "0" (all), "12" or "1-5".
     
-    # Parse chapter input
-    chapter_range = None
+    Args:
+        chapter_input (str): Chapter selection
+        chapter_count (int): Number of chapters of the novel
+        
+    Returns:
+        Optional[List[int]]: [start, end] (1-based, inclusive), or None for all chapters
+        
+    Raises:
+        ValueError: If the selection is malformed or out of range
+    """
+    chapter_input = str(chapter_input).strip()
     if chapter_input == "0":
-        # Download all chapters
-        print(f"Downloading all {len(chapters)} chapters...")
-    elif "-" in chapter_input:
-        # Download range of chapters
+        return None
+    if "-" in chapter_input:
         try:
             start, end = map(int, chapter_input.split("-"))
-            if 1 <= start <= len(chapters) and 1 <= end <= len(chapters):
-                chapter_range = [start, end]
-                print(f"Downloading chapters {start} to {end}...")
-            else:
-                print(f"Invalid chapter range. Valid range: 1-{len(chapters)}")
-                return
         except ValueError:
-            print("Invalid chapter range format. Use 'start-end' (e.g., '1-5')")
-            return
+            raise ValueError("Invalid chapter range format. Use 'start-end' (e.g., '1-5')")
+        if 1 <= start <= chapter_count and 1 <= end <= chapter_count:
+            return [start, end]
+        raise ValueError(f"Invalid chapter range. Valid range: 1-{chapter_count}")
+    try:
+        chapter_num = int(chapter_input)
+    except ValueError:
+        raise ValueError("Invalid chapter number. Please enter a number.")
+    if 1 <= chapter_num <= chapter_count:
+        return [chapter_num, chapter_num]
+    raise ValueError(f"Invalid chapter number. Valid range: 1-{chapter_count}")
+
+
+def select_chapters(chapters, chapter_range=None):
+    """(position, chapter) pairs of the chapters in chapter_range, or of all chapters."""
+    if chapter_range:
+        start, end = chapter_range
+        return [(i, chapters[i]) for i in range(start-1, end) if i < len(chapters)]
+    return list(enumerate(chapters))
+
+
+def chapter_source(scraper, novel_id, chapters_to_process, console=None, verbose=True):
+    """Chapters with their content, fetched here or by worker nodes in distributed mode."""
+    if scraper.config.get("distributed", {}).get("enabled", False) and not scraper.offline:
+        # Worker nodes fetch and translate; this node only exports
+        return collect_distributed_chapters(scraper, novel_id, chapters_to_process, console, verbose)
+    return fetch_chapters(scraper, chapters_to_process, console, verbose)
+
+
+def translate_novel_info(scraper, novel_info):
+    """Copy of novel_info with the title and description translated, if translation is enabled."""
+    if not scraper.translation_config.get("enabled", False):
+        return novel_info
+    
+    # Create a copy to avoid modifying the original
+    translated_novel_info = novel_info.copy()
+    
+    # Translate title and description if needed
+    if scraper.translation_config.get("translate_title", True):
+        translated_novel_info['title'] = scraper.parser.translate_text(novel_info['title'])
+    
+    if scraper.translation_config.get("translate_content", True):
+        translated_novel_info['description'] = scraper.parser.translate_text(novel_info['description'])
+    
+    return translated_novel_info
+
+
+def export_chapters(scraper, novel_id, novel_info, chapters, chapter_range, format_types, include_info,
+                    console=None, verbose=True):
+    """Fetch chapters and write them in one or more formats, without prompting.
+    
+    Args:
+        scraper (SyosetuScraper): Scraper of the novel
+        novel_id (str): Novel ID
+        novel_info (Dict): Novel information
+        chapters (List[Chapter]): Chapter list of the novel
+        chapter_range (List[int], optional): [start, end] of the chapters to export, all if None
+        format_types (List[str]): Output formats
+        include_info (bool): Whether to include novel information
+        console (Console, optional): Rich console for the progress display
+        verbose (bool): Print per-chapter progress and summaries
+        
+    Returns:
+        List[str]: Written files
+    """
+    from exporter import download_formats, download_volumes, RenderCache
+    
+    chapters_to_process = select_chapters(chapters, chapter_range)
+    
+    # Translate titles only for the chapters being downloaded
+    scraper.parser.translate_chapter_titles([chapter for _, chapter in chapters_to_process])
+    
+    # Make sure novel_info is also translated if translation is enabled
+    if scraper.translation_config.get("enabled", False) and verbose:
+        if console:
+            console.print("[yellow]Applying translations to novel information...[/yellow]")
+        else:
+            print("Applying translations to novel information...")
+    novel_info_for_download = translate_novel_info(scraper, novel_info)
+    
+    export_config = scraper.config.get("export", {})
+    RenderCache.configure(export_config.get("render_cache", True),
+                          export_config.get("render_cache_mb", 256) * 1024 * 1024)
+    source = chapter_source(scraper, novel_id, chapters_to_process, console, verbose)
+    split_by = export_config.get("split_volumes", "none")
+    if split_by != "none":
+        # Volumes are generated together once every chapter is fetched
+        return download_volumes(
+            novel_info_for_download,
+            source,
+            format_type=format_types,
+            include_novel_info=include_info,
+            chapter_range=chapter_range,
+            split_by=split_by,
+            volume_chapters=export_config.get("volume_chapters", 500),
+            volume_size=int(export_config.get("volume_size_mb", 20) * 1024 * 1024),
+            workers=export_config.get("volume_workers", 4),
+            compression=export_config.get("compression", "none")
+        )
+    
+    # Chapters are fetched lazily as the first exporter consumes them, so a
+    # single format never holds them all in memory. Every format is written
+    # from the same fetch.
+    return download_formats(
+        novel_info_for_download, 
+        source, 
+        format_types,
+        include_novel_info=include_info,
+        chapter_range=chapter_range,
+        pdf_workers=export_config.get("pdf_workers", 1),
+        compression=export_config.get("compression", "none")
+    )
+
+
+def download_chapters(scraper, novel_id, novel_info, chapters, chapter_input, format_types=None, include_info=None):
+    """Download chapters based on user input.
+    
+    The output formats and whether to include novel information are asked
+    for unless ``format_types`` and ``include_info`` are given. All formats
+    are produced from a single fetch of the chapters.
+    
+    Returns:
+        List[str]: Written files, empty if the download failed
+    """
+    # Parse chapter input
+    try:
+        chapter_range = parse_chapter_range(chapter_input, len(chapters))
+    except ValueError as e:
+        print(e)
+        return []
+    if chapter_range is None:
+        # Download all chapters
+        print(f"Downloading all {len(chapters)} chapters...")
+    elif chapter_range[0] == chapter_range[1]:
+        print(f"Downloading chapter {chapter_range[0]}...")
     else:
-        # Download single chapter
-        try:
-            chapter_num = int(chapter_input)
-            if 1 <= chapter_num <= len(chapters):
-                chapter_range = [chapter_num, chapter_num]
-                print(f"Downloading chapter {chapter_num}...")
-            else:
-                print(f"Invalid chapter number. Valid range: 1-{len(chapters)}")
-                return
-        except ValueError:
-            print("Invalid chapter number. Please enter a number.")
-            return
+        print(f"Downloading chapters {chapter_range[0]} to {chapter_range[1]}...")
     
     # Ask if novel info should be included
-    include_info = input("Include novel information (title, author, description)? (y/n): ").lower().strip() == 'y'
+    if include_info is None:
+        include_info = input("Include novel information (title, author, description)? (y/n): ").lower().strip() == 'y'
     
     # Check for Japanese content and suggest EPUB
     has_japanese = False
@@ -248,191 +477,486 @@ def download_chapters(scraper, novel_id, novel_info, chapters, chapter_input):
         print("EPUB format is recommended for proper character display.")
 
 
-    format_type = input("Download as PDF or EPUB? (pdf/epub): ").lower().strip()
-    if format_type not in ['pdf', 'epub']:
-        print("Invalid format. Using EPUB as default.")
-        format_type = 'epub'
+    if format_types is None:
+        format_input = input("Download as PDF, EPUB, plain text, Markdown or JSON Lines? "
+                             "(pdf/epub/txt/md/jsonl, several separated by commas): ")
+        format_types = [f.strip().lower() for f in format_input.split(",") if f.strip()]
+    invalid = [f for f in format_types if f not in DOWNLOAD_FORMATS]
+    format_types = [f for f in dict.fromkeys(format_types) if f in DOWNLOAD_FORMATS]
+    if invalid or not format_types:
+        print(f"Invalid format: {', '.join(invalid) or 'none given'}.")
+    if not format_types:
+        print("Using EPUB as default.")
+        format_types = ['epub']
+    
+    # Create a single console instance for the entire function
+    console = Console() if RICH_AVAILABLE else None
+    
+    # Download novel
+    try:
+        filepaths = export_chapters(scraper, novel_id, novel_info, chapters, chapter_range,
+                                    format_types, include_info, console)
+        if scraper.config.get("export", {}).get("split_volumes", "none") != "none":
+            if console:
+                console.print(f"[bold green]Novel downloaded successfully in {len(filepaths)} volumes:[/bold green]")
+            else:
+                print(f"Novel downloaded successfully in {len(filepaths)} volumes:")
+            for filepath in filepaths:
+                print(f"  {filepath}")
+            return filepaths
+        
+        for filepath in filepaths:
+            if console:
+                console.print(f"[bold green]Novel downloaded successfully:[/bold green] {filepath}")
+            else:
+                print(f"Novel downloaded successfully: {filepath}")
+        return filepaths
+    except Exception as e:
+        if console:
+            console.print(f"[bold red]Error downloading novel:[/bold red] {e}")
+        else:
+            print(f"Error downloading novel: {e}")
+        # Log the full error details in debug mode
+        logger.debug(f"Error details: {e}", exc_info=True)
+        return []
+
 
-    # Download chapters with content
-    chapters_to_download = []
+def update_epub_download(scraper, chapters, filepath):
+    """Append chapters published since an EPUB was downloaded to that EPUB.
     
-    # Determine which chapters to download
-    if chapter_range:
-        start, end = chapter_range
-        chapters_to_process = [(i, chapters[i]) for i in range(start-1, end) if i < len(chapters)]
+    Args:
+        scraper (SyosetuScraper): Scraper to fetch with
+        chapters (List[Dict]): Current chapter list of the novel
+        filepath (str): EPUB previously downloaded with this tool
+    """
+    from exporter import StreamingEpubWriter, RenderCache
+    
+    export_config = scraper.config.get("export", {})
+    RenderCache.configure(export_config.get("render_cache", True),
+                          export_config.get("render_cache_mb", 256) * 1024 * 1024)
+    console = Console() if RICH_AVAILABLE else None
+    try:
+        writer = StreamingEpubWriter.reopen(filepath)
+    except (OSError, ValueError, zipfile.BadZipFile) as e:
+        print(f"Cannot update {filepath}: {e}")
+        return
+    
+    # Resume after the last written chapter's position in the list; indexes restart per arc on Hameln
+    urls = [chapter.get('url') for chapter in chapters]
+    if writer.last_url:
+        if writer.last_url not in urls:
+            print(f"Cannot update {filepath}: its last chapter {writer.last_url} is no longer in the chapter list.")
+            return
+        start = urls.index(writer.last_url) + 1
     else:
-        chapters_to_process = list(enumerate(chapters))
-    
-    # Use Rich progress bar if available
-    if RICH_AVAILABLE:
-        # Create a single console instance for the entire function
-        console = Console()
-        
-        # Track time for ETA calculation
-        start_time = time.time()
-        completed_chapters = 0
-        avg_time_per_chapter = 0
-        chapter_times = []  # Store individual chapter times for analysis
-        
-        with Progress(
-            TextColumn("[bold blue]{task.description}"),
-            BarColumn(),
-            TaskProgressColumn(),
-            TextColumn("[cyan]{task.fields[eta]}"),
-            console=console
-        ) as progress:
-            download_task = progress.add_task(
-                "[green]Downloading chapters", 
-                total=len(chapters_to_process),
-                eta="Calculating...",
-                start_time=time.time()  # Store start time in task fields
-            )
+        # Books written before the URL was recorded, by ncode-style indexes that match list positions
+        start = writer.last_index or 0
+    chapters_to_process = list(enumerate(chapters))[start:]
+    if not chapters_to_process:
+        print(f"No new chapters since chapter {start}.")
+        return
+    
+    print(f"Appending {len(chapters_to_process)} new chapters after chapter {start}...")
+    scraper.parser.translate_chapter_titles([chapter for _, chapter in chapters_to_process])
+    try:
+        writer.write(fetch_chapters(scraper, chapters_to_process, console))
+        print(f"Novel updated successfully: {filepath}")
+    except Exception as e:
+        print(f"Error updating novel: {e}")
+        logger.debug(f"Error details: {e}", exc_info=True)
+
+
+def build_chapter(chapter, chapter_content, image_fetcher=None, chapter_store=None):
+    """Combine a chapter list entry with its fetched content.
+    
+    Args:
+        chapter (Chapter): Chapter from the chapter list
+        chapter_content (Chapter): Result of get_chapter_content
+        image_fetcher (ImageFetcher, optional): Fetcher for the chapter's illustrations
+        chapter_store (ChapterStore, optional): On-disk store to move the content to
+        
+    Returns:
+        Chapter: Copy of the chapter with its content, ruby readings and illustrations
+    """
+    # Content is shared with the fetched chapter in compressed form, not copied
+    chapter_copy = Chapter.from_dict(chapter).with_content(chapter_content)
+    if chapter_content.get('images') and image_fetcher:
+        # All illustrations of the chapter are downloaded concurrently
+        chapter_copy['images'] = image_fetcher.resolve(chapter_content['images'], referer=chapter['url'])
+    if chapter_store:
+        chapter_copy.offload(chapter_store)
+    return chapter_copy
+
+
+def build_chapter_pipeline(scraper, image_fetcher=None, chapter_store=None):
+    """Pipeline turning chapter list entries into chapters with their content.
+    
+    Stages are fetch (download the page), parse (extract text, ruby readings
+    and illustrations), translate and assemble (download illustrations and
+    combine the content with the list entry). Worker counts and queue sizes
+    come from the "pipeline" configuration section.
+    
+    Args:
+        scraper (SyosetuScraper): Scraper to fetch and parse with
+        image_fetcher (ImageFetcher, optional): Fetcher for illustrations
+        chapter_store (ChapterStore, optional): On-disk store for chapter content
+        
+    Returns:
+        Pipeline: Pipeline taking chapters from the chapter list and producing
+            results of build_chapter; the consumer of its output is reported as "export"
+    """
+    from pipeline import Pipeline, Stage
+    
+    pipeline_config = scraper.config.get("pipeline", {})
+    parser = scraper.parser
+    
+    def fetch(chapter):
+        if scraper.local is not None:
+            stored = scraper.local.chapter(chapter)
+            if stored is not None:
+                return chapter, stored
+        return chapter, scraper.fetch_page(chapter['url'])
+    
+    def parse(fetched):
+        chapter, page = fetched
+        if isinstance(page, StoredChapter):
+            return fetched
+        title = chapter.get('source_title', chapter['title'])
+        return chapter, parser.extract_chapter_content(BeautifulSoup(page, 'lxml'), chapter['url'], title)
+    
+    def translate(parsed):
+        chapter, chapter_content = parsed
+        if isinstance(chapter_content, StoredChapter):
+            if chapter_content.translated:
+                return chapter, chapter_content.chapter
+            chapter_content = chapter_content.chapter
+        return chapter, parser.translate_chapter(chapter_content)
+    
+    def assemble(translated):
+        chapter, chapter_content = translated
+        return build_chapter(chapter, chapter_content, image_fetcher, chapter_store)
+    
+    stages = [
+        Stage("fetch", fetch, pipeline_config.get("fetch_workers", 1)),
+        Stage("parse", parse, pipeline_config.get("parse_workers", 1)),
+        Stage("translate", translate, pipeline_config.get("translate_workers", 1)),
+        Stage("assemble", assemble, pipeline_config.get("assemble_workers", 2))
+    ]
+    return Pipeline(stages, queue_size=pipeline_config.get("queue_size", 8), sink_name="export")
+
+
+def fetch_chapters(scraper, chapters_to_process, console=None, verbose=True):
+    """Fetch chapter contents through the chapter pipeline, yielding chapters in order.
+    
+    Args:
+        scraper (SyosetuScraper): Scraper to fetch with
+        chapters_to_process (List[Tuple[int, Dict]]): (position, chapter) pairs
+        console (Console, optional): Rich console for the progress display
+        verbose (bool): Print progress and summaries; with a console, Rich progress is shown regardless
+        
+    Yields:
+        Chapter: Copy of the chapter with its content
+        
+    Raises:
+        MissingPages: Offline, before any chapter is processed, if some aren't available locally
+    """
+    if scraper.local is not None:
+        missing = scraper.local.missing(chapter for _, chapter in chapters_to_process)
+        if missing:
+            raise MissingPages(missing)
+    
+    image_fetcher = None
+    export_config = scraper.config.get("export", {})
+    if export_config.get("images", True):
+        from images import ImageFetcher
+        image_fetcher = ImageFetcher(
+            scraper.session,
+            workers=export_config.get("image_workers", 4),
+            max_dimension=export_config.get("image_max_dimension", 1600)
+        )
+    
+    # Keep only chapter metadata in memory for very long novels
+    chapter_store = None
+    if export_config.get("chapter_store", "memory") == "disk":
+        chapter_store = ChapterStore(CHAPTER_STORE_FILE, store_namespace(scraper.translation_config))
+    
+    # Fetching, parsing, translation and illustration downloads run as separate
+    # stages, so chapters are fetched ahead while earlier ones are translated
+    pipeline = build_chapter_pipeline(scraper, image_fetcher, chapter_store)
+    chapters = [chapter for _, chapter in chapters_to_process]
+    
+    results = pipeline.run(chapters)
+    try:
+        # Use Rich progress bar if available
+        if console:
+            # Track time for ETA calculation
+            start_time = time.time()
+            completed_chapters = 0
+            avg_time_per_chapter = 0
+            chapter_times = []  # Store individual chapter times for analysis
+        
+            with Progress(
+                TextColumn("[bold blue]{task.description}"),
+                BarColumn(),
+                TaskProgressColumn(),
+                TextColumn("[cyan]{task.fields[eta]}"),
+                console=console
+            ) as progress:
+                download_task = progress.add_task(
+                    "[green]Downloading chapters", 
+                    total=len(chapters_to_process),
+                    eta="Calculating...",
+                    start_time=time.time()  # Store start time in task fields
+                )
             
-            for i, chapter in chapters_to_process:
                 chapter_start_time = time.time()
+                for chapter, (i, _) in zip(results, chapters_to_process):
+                    # Truncate long titles for display
+                    display_title = chapter['title'][:30] + "..." if len(chapter['title']) > 30 else chapter['title']
+                    progress.update(
+                        download_task, 
+                        description=f"[green]Chapter {i+1}/{len(chapters_to_process)}: {display_title}"
+                    )
                 
-                # Truncate long titles for display
-                display_title = chapter['title'][:30] + "..." if len(chapter['title']) > 30 else chapter['title']
-                progress.update(
-                    download_task, 
-                    description=f"[green]Chapter {i+1}/{len(chapters_to_process)}: {display_title}"
-                )
-                
-                # Download chapter content
-                chapter_content = scraper.get_chapter_content(chapter['url'], chapter['title'])
-                
-                # Create a new chapter object to avoid modifying the original
-                chapter_copy = chapter.copy()
-                chapter_copy['content'] = chapter_content['content']
-                chapter_copy['title'] = chapter_content['title']
-                chapters_to_download.append(chapter_copy)
+                    yield chapter
                 
-                # Calculate time taken for this chapter
-                chapter_time = time.time() - chapter_start_time
-                completed_chapters += 1
-                chapter_times.append(chapter_time)
+                    # Calculate time taken for this chapter
+                    chapter_time = time.time() - chapter_start_time
+                    completed_chapters += 1
+                    chapter_times.append(chapter_time)
                 
-                # Update running average with more weight to recent chapters
-                if completed_chapters == 1:
-                    avg_time_per_chapter = chapter_time
-                else:
-                    # Use weighted average (70% previous average, 30% new data)
-                    avg_time_per_chapter = (avg_time_per_chapter * 0.7) + (chapter_time * 0.3)
+                    # Update running average with more weight to recent chapters
+                    if completed_chapters == 1:
+                        avg_time_per_chapter = chapter_time
+                    else:
+                        # Use weighted average (70% previous average, 30% new data)
+                        avg_time_per_chapter = (avg_time_per_chapter * 0.7) + (chapter_time * 0.3)
                     
-                    # If we have enough data, use median of last 5 chapters for more stability
-                    if len(chapter_times) >= 5:
-                        recent_times = sorted(chapter_times[-5:])
-                        median_time = recent_times[len(recent_times) // 2]
-                        # Blend median with weighted average for better stability
-                        avg_time_per_chapter = (avg_time_per_chapter * 0.6) + (median_time * 0.4)
+                        # If we have enough data, use median of last 5 chapters for more stability
+                        if len(chapter_times) >= 5:
+                            recent_times = sorted(chapter_times[-5:])
+                            median_time = recent_times[len(recent_times) // 2]
+                            # Blend median with weighted average for better stability
+                            avg_time_per_chapter = (avg_time_per_chapter * 0.6) + (median_time * 0.4)
                 
-                # Calculate ETA based on refined average
-                chapters_remaining = len(chapters_to_process) - completed_chapters
-                eta_seconds = avg_time_per_chapter * chapters_remaining
+                    # Calculate ETA based on refined average
+                    chapters_remaining = len(chapters_to_process) - completed_chapters
+                    eta_seconds = avg_time_per_chapter * chapters_remaining
                 
-                # Calculate elapsed time
-                elapsed = time.time() - start_time
-                elapsed_hours, elapsed_remainder = divmod(elapsed, 3600)
-                elapsed_minutes, elapsed_seconds = divmod(elapsed_remainder, 60)
+                    # Calculate elapsed time
+                    elapsed = time.time() - start_time
+                    elapsed_hours, elapsed_remainder = divmod(elapsed, 3600)
+                    elapsed_minutes, elapsed_seconds = divmod(elapsed_remainder, 60)
                 
-                # Format ETA in HH:MM:SS format for better readability
-                hours, remainder = divmod(eta_seconds, 3600)
-                minutes, seconds = divmod(remainder, 60)
+                    # Format ETA in HH:MM:SS format for better readability
+                    hours, remainder = divmod(eta_seconds, 3600)
+                    minutes, seconds = divmod(remainder, 60)
                 
-                # Format strings based on duration
-                if hours > 0:
-                    eta_str = f"ETA: {int(hours):02d}:{int(minutes):02d}:{int(seconds):02d}"
-                else:
-                    eta_str = f"ETA: {int(minutes):02d}:{int(seconds):02d}"
+                    # Format strings based on duration
+                    if hours > 0:
+                        eta_str = f"ETA: {int(hours):02d}:{int(minutes):02d}:{int(seconds):02d}"
+                    else:
+                        eta_str = f"ETA: {int(minutes):02d}:{int(seconds):02d}"
                 
-                # Add elapsed time
-                if elapsed_hours > 0:
-                    eta_str += f" | Elapsed: {int(elapsed_hours):02d}:{int(elapsed_minutes):02d}:{int(elapsed_seconds):02d}"
-                else:
-                    eta_str += f" | Elapsed: {int(elapsed_minutes):02d}:{int(elapsed_seconds):02d}"
+                    # Add elapsed time
+                    if elapsed_hours > 0:
+                        eta_str += f" | Elapsed: {int(elapsed_hours):02d}:{int(elapsed_minutes):02d}:{int(elapsed_seconds):02d}"
+                    else:
+                        eta_str += f" | Elapsed: {int(elapsed_minutes):02d}:{int(elapsed_seconds):02d}"
                 
-                # Add average time per chapter to display
-                avg_time_min = int(avg_time_per_chapter // 60)
-                avg_time_sec = int(avg_time_per_chapter % 60)
-                if avg_time_min > 0:
-                    eta_str += f" | {avg_time_min}m {avg_time_sec}s/ch"
-                else:
-                    eta_str += f" | {avg_time_sec}s/ch"
+                    # Add average time per chapter to display
+                    avg_time_min = int(avg_time_per_chapter // 60)
+                    avg_time_sec = int(avg_time_per_chapter % 60)
+                    if avg_time_min > 0:
+                        eta_str += f" | {avg_time_min}m {avg_time_sec}s/ch"
+                    else:
+                        eta_str += f" | {avg_time_sec}s/ch"
                 
-                # Update progress with ETA
-                progress.update(download_task, advance=1, eta=eta_str)
+                    # Update progress with ETA
+                    progress.update(download_task, advance=1, eta=eta_str)
+                    chapter_start_time = time.time()
+        else:
+            # Fallback to standard output if Rich is not available
+            for chapter, (i, _) in zip(results, chapters_to_process):
+                if verbose:
+                    print(f"Fetched chapter {i+1}/{len(chapters_to_process)}: {chapter['title']}")
+                yield chapter
+    finally:
+        # Stops the pipeline too if the consumer gave up early
+        results.close()
+        if image_fetcher:
+            image_fetcher.close()
+    
+    if not verbose:
+        return
+    
+    print(pipeline.report())
+    
+    # Report how much text never had to go to the translation service
+    if scraper.translation_config.get("enabled", False):
+        print(scraper.parser.segment_filter.report())
+    
+    if image_fetcher and any(image_fetcher.stats.values()):
+        print(image_fetcher.report())
+    
+    if console:
+        console.print("[bold green]Creating output file...[/bold green]")
     else:
-        # Fallback to standard output if Rich is not available
-        for i, chapter in chapters_to_process:
-            print(f"Fetching chapter {i+1}/{len(chapters_to_process)}: {chapter['title']}...")
-            chapter_content = scraper.get_chapter_content(chapter['url'], chapter['title'])
-            
-            # Create a new chapter object to avoid modifying the original
-            chapter_copy = chapter.copy()
-            chapter_copy['content'] = chapter_content['content']
-            chapter_copy['title'] = chapter_content['title']
-            chapters_to_download.append(chapter_copy)
+        print("Creating output file...")
+
+
+def collect_distributed_chapters(scraper, novel_id, chapters_to_process, console=None, verbose=True):
+    """Queue chapters for worker nodes and yield them in order as they finish.
+    
+    Args:
+        scraper (SyosetuScraper): Scraper of the novel
+        novel_id (str): Novel ID
+        chapters_to_process (List[Tuple[int, Dict]]): (position, chapter) pairs
+        console (Console, optional): Rich console for messages
+        verbose (bool): Print the queued job and each received chapter; otherwise they are only logged
+        
+    Yields:
+        Chapter: Copy of the chapter with its content, read from the shared store
+    """
+    from distributed import TaskQueue, collect_chapters, shared_paths
+    
+    distributed_config = scraper.config.get("distributed", {})
+    queue_path, store_path = shared_paths(distributed_config)
+    task_queue = TaskQueue(queue_path, distributed_config.get("max_attempts", 3))
+    chapters = [chapter for _, chapter in chapters_to_process]
+    translate = scraper.translation_config.get("enabled", False)
+    job_id = task_queue.submit(scraper.site_type, novel_id, chapters, translate,
+                               scraper.translation_config.get("target_language", "en"))
+    message = (f"Queued {len(chapters)} chapters as job {job_id} in {queue_path}. "
+               f"Start workers with: python main.py --worker --shared-dir {os.path.dirname(queue_path)}")
+    if not verbose:
+        logger.info(message)
+    elif console:
+        console.print(f"[yellow]{message}[/yellow]")
+    else:
+        print(message)
+    
+    image_fetcher = None
+    export_config = scraper.config.get("export", {})
+    if export_config.get("images", True):
+        from images import ImageFetcher
+        image_fetcher = ImageFetcher(
+            scraper.session,
+            workers=export_config.get("image_workers", 4),
+            max_dimension=export_config.get("image_max_dimension", 1600)
+        )
     
-    # Download novel
     try:
-        # Make sure novel_info is also translated if translation is enabled
-        if scraper.translation_config.get("enabled", False):
-            if RICH_AVAILABLE:
-                # Reuse the console object if it exists in the current scope
-                if 'console' not in locals():
-                    console = Console()
-                console.print("[yellow]Applying translations to novel information...[/yellow]")
-            else:
-                print("Applying translations to novel information...")
-                
-            # Create a copy to avoid modifying the original
-            translated_novel_info = novel_info.copy()
-            
-            # Translate title and description if needed
-            if scraper.translation_config.get("translate_title", True):
-                translated_novel_info['title'] = scraper.parser.translate_text(novel_info['title'])
-            
-            if scraper.translation_config.get("translate_content", True):
-                translated_novel_info['description'] = scraper.parser.translate_text(novel_info['description'])
-                
-            # Use translated novel info for download
-            novel_info_for_download = translated_novel_info
-        else:
-            novel_info_for_download = novel_info
-            
-        if RICH_AVAILABLE:
-            # Reuse the console object if it exists in the current scope
-            if 'console' not in locals():
-                console = Console()
-            with console.status("[bold green]Creating output file...", spinner="dots"):
-                filepath = download_novel(
-                    novel_info_for_download, 
-                    chapters_to_download, 
-                    format_type=format_type,
-                    include_novel_info=include_info,
-                    chapter_range=chapter_range
-                )
-            console.print(f"[bold green]Novel downloaded successfully:[/bold green] {filepath}")
-        else:
-            print("Creating output file...")
-            filepath = download_novel(
-                novel_info_for_download, 
-                chapters_to_download, 
-                format_type=format_type,
-                include_novel_info=include_info,
-                chapter_range=chapter_range
-            )
-            print(f"Novel downloaded successfully: {filepath}")
-    except Exception as e:
-        if RICH_AVAILABLE:
-            # Reuse the console object if it exists in the current scope
-            if 'console' not in locals():
-                console = Console()
-            console.print(f"[bold red]Error downloading novel:[/bold red] {e}")
-        else:
-            print(f"Error downloading novel: {e}")
-        # Log the full error details in debug mode
-        logger.debug(f"Error details: {e}", exc_info=True)
+        for done, chapter in enumerate(collect_chapters(task_queue, store_path, job_id, chapters,
+                                                        image_fetcher=image_fetcher), 1):
+            if verbose:
+                print(f"Received chapter {done}/{len(chapters)}: {chapter['title']}")
+            yield chapter
+    finally:
+        if image_fetcher:
+            image_fetcher.close()
+        task_queue.close()
+
+
+def run_worker(config):
+    """Process chapter tasks from the shared queue until no work is left.
+    
+    Args:
+        config (Dict[str, Any]): Configuration of this node
+    """
+    from distributed import TaskQueue, Worker, shared_paths
+    
+    distributed_config = config.get("distributed", {})
+    queue_path, store_path = shared_paths(distributed_config)
+    task_queue = TaskQueue(queue_path, distributed_config.get("max_attempts", 3))
+    worker = Worker(
+        task_queue,
+        store_path,
+        config,
+        lambda site_type, site_config: SyosetuScraper(site_type=site_type, config=site_config),
+        kinds=distributed_config.get("worker_tasks", ["fetch", "translate"]),
+        lease_seconds=distributed_config.get("lease_seconds", 120)
+    )
+    print(f"Worker {worker.worker_id} taking {', '.join(worker.kinds)} tasks from {queue_path}")
+    worker.run(
+        threads=distributed_config.get("worker_threads", 2),
+        idle_timeout=distributed_config.get("idle_timeout", 60)
+    )
+    print(worker.report())
+    task_queue.close()
+
+
+def show_queue_status(config):
+    """Print the number of tasks in the shared queue per kind and state."""
+    from distributed import TaskQueue, shared_paths
+    
+    queue_path, _ = shared_paths(config.get("distributed", {}))
+    task_queue = TaskQueue(queue_path)
+    counts = task_queue.counts()
+    task_queue.close()
+    if not counts:
+        print(f"No tasks in {queue_path}")
+        return
+    for kind, states in sorted(counts.items()):
+        print(f"{kind}: " + ", ".join(f"{count} {state}" for state, count in sorted(states.items())))
+
+
+def start_metrics(config):
+    """Serve metrics and arrange for the JSON dump as configured in the "metrics" section.
+    
+    Args:
+        config (Dict[str, Any]): Configuration
+    """
+    metrics_config = config.get("metrics", {})
+    port = metrics_config.get("port", 0)
+    if port:
+        try:
+            REGISTRY.serve(port)
+            print(f"Serving metrics on http://127.0.0.1:{port}/metrics")
+        except OSError as e:
+            print(f"Cannot serve metrics on port {port}: {e}")
+    
+    json_file = metrics_config.get("json_file", "")
+    if json_file:
+        def dump_metrics():
+            try:
+                REGISTRY.dump_json(json_file)
+                print(f"Metrics written to {json_file}")
+            except OSError as e:
+                print(f"Cannot write metrics to {json_file}: {e}")
+        
+        # Written however the run ends, including interactive mode and workers
+        atexit.register(dump_metrics)
+
+
+def start_profiler(directory, interval, memory):
+    """Profile the rest of the run and write the results to directory when it ends.
+    
+    Args:
+        directory (str): Output directory
+        interval (float): Seconds between samples
+        memory (bool): Whether to trace memory allocations
+    """
+    from profiling import Profiler
+    
+    profiler = Profiler(interval=max(0.001, interval), memory=memory)
+    
+    def write_profile():
+        profiler.stop()
+        try:
+            paths = profiler.write(directory)
+        except OSError as e:
+            print(f"Cannot write profile to {directory}: {e}")
+            return
+        print(profiler.report())
+        print("Profile written to:")
+        for path in paths:
+            print(f"  {path}")
+    
+    # Registered before the run starts, so it's written however the run ends
+    atexit.register(write_profile)
+    profiler.start()
+    print(f"Profiling to {directory}...")
 
 
 def interactive_mode(config):
@@ -632,6 +1156,7 @@ def interactive_mode(config):
             
             # Show chapters in the box format
             max_display = 10  # Show up to 10 chapters
+            scraper.parser.translate_chapter_titles(chapters[:max_display])
             first_chapter = True
             for i, chapter in enumerate(chapters[:max_display]):
                 chapter_title = f"{chapter['index']}. {chapter['title']}"
@@ -688,7 +1213,7 @@ def interactive_mode(config):
                         chapter_idx = int(chapter_num) - 1
                         if 0 <= chapter_idx < len(chapters):
                             print(f"\nDownloading chapter: {chapters[chapter_idx]['title']}")
-                            chapter_content = scraper.get_chapter_content(chapters[chapter_idx]['url'], chapters[chapter_idx]['title'])
+                            chapter_content = scraper.get_chapter_content(chapters[chapter_idx]['url'], chapters[chapter_idx].get('source_title', chapters[chapter_idx]['title']))
                             
                             print(f"\n{chapter_content['title']}")
                             print("=" * len(chapter_content['title']))
@@ -705,6 +1230,8 @@ def interactive_mode(config):
         print(f"An error occurred: {e}")
         # Log the full error details in debug mode
         logger.debug(f"Error details: {e}", exc_info=True)
+    finally:
+        scraper.close()
 
 
 def main():
@@ -717,11 +1244,28 @@ def main():
     parser.add_argument("--site", choices=list(SyosetuScraper.SITES.keys()), help="Site type to scrape")
     parser.add_argument("--novel-id", help="Novel ID to scrape")
     parser.add_argument("--chapter", help="Chapter number to download (0 for all, or range like 1-5)")
-    parser.add_argument("--download", choices=["pdf", "epub"], help="Download novel in specified format")
+    parser.add_argument("--download", nargs="+", choices=DOWNLOAD_FORMATS, metavar="FORMAT",
+                        help=f"Download novel in one or more formats ({', '.join(DOWNLOAD_FORMATS)})")
     parser.add_argument("--include-info", action="store_true", help="Include novel info in download")
+    parser.add_argument("--update-epub", metavar="PATH", help="Append new chapters to an EPUB downloaded earlier")
+    parser.add_argument("--worker", action="store_true", help="Process fetch and translate tasks from the shared queue")
+    parser.add_argument("--queue-status", action="store_true", help="Show the tasks in the shared queue")
     parser.add_argument("--install-deps", action="store_true", help="Install required dependencies")
     parser.add_argument("--no-rich", action="store_true", help="Disable Rich progress display")
     parser.add_argument("--debug", action="store_true", help="Enable debug logging")
+    parser.add_argument("--profile", nargs="?", const="profile", metavar="DIR",
+                        help="Profile the run per stage and write the results to DIR (default ./profile)")
+    parser.add_argument("--profile-interval", type=float, default=5.0, metavar="MS",
+                        help="Milliseconds between profiler samples")
+    parser.add_argument("--no-profile-memory", action="store_true",
+                        help="Don't trace memory allocations while profiling (tracing slows the run down)")
+    parser.add_argument("--record", metavar="FILE", help="Record every request and response of this run to an HTTP archive")
+    parser.add_argument("--replay", metavar="FILE", help="Answer requests from an HTTP archive instead of the network")
+    parser.add_argument("--replay-timing", action="store_true",
+                        help="Wait as long as each recorded response originally took when replaying")
+    parser.add_argument("--offline", action="store_true",
+                        help="Read pages and chapters only from the chapter store and the --replay archive, never the sites; "
+                             "the novel must have been downloaded with --chapter-store disk or recorded with --record")
     
     # Parse arguments
     args = parser.parse_args()
@@ -748,6 +1292,19 @@ def main():
     # Process configuration arguments
     config = process_cli_args(args)
     
+    # Recording and replaying apply to this run only
+    if args.record and args.replay:
+        print("Error: --record and --replay can't be used together")
+        return
+    if args.record or args.replay:
+        config = dict(config, archive={
+            "mode": "record" if args.record else "replay",
+            "path": args.record or args.replay,
+            "replay_timing": args.replay_timing
+        })
+    if args.offline:
+        config = dict(config, general=dict(config.get("general", {}), offline=True))
+    
     # Override Rich availability if --no-rich is specified
     if args.no_rich:
         globals()["RICH_AVAILABLE"] = False
@@ -763,8 +1320,25 @@ def main():
         logger.addHandler(console_handler)
         logger.debug("Debug logging enabled")
     
+    start_metrics(config)
+    
+    if args.profile:
+        start_profiler(args.profile, args.profile_interval / 1000, not args.no_profile_memory)
+    
+    if args.clear_render_cache:
+        from exporter import RenderCache
+        RenderCache.shared().clear()
+        print("Render cache cleared.")
+    
+    if args.queue_status:
+        show_queue_status(config)
+    
+    if args.worker:
+        run_worker(config)
+        return
+    
     # If no action arguments provided, default to interactive mode
-    if not (args.show_config or args.reset_config or args.novel_id):
+    if not (args.show_config or args.reset_config or args.clear_render_cache or args.queue_status or args.novel_id):
         args.interactive = True
     
     # Run in interactive mode if requested
@@ -856,6 +1430,7 @@ def main():
                 
                 # Show a few chapters as preview
                 max_preview = 5
+                scraper.parser.translate_chapter_titles(chapters[:max_preview])
                 for i, chapter in enumerate(chapters[:max_preview]):
                     chapter_title = f"{chapter['index']}. {chapter['title']}"
                     
@@ -892,19 +1467,21 @@ def main():
             # Close the box
             print(border)
             
-            # Download novel if requested
-            if args.download:
+            # Update an earlier download, or download novel if requested
+            if args.update_epub:
+                update_epub_download(scraper, chapters, args.update_epub)
+            elif args.download:
                 if args.chapter:
-                    download_chapters(scraper, args.novel_id, novel_info, chapters, args.chapter)
+                    download_chapters(scraper, args.novel_id, novel_info, chapters, args.chapter, args.download)
                 else:
                     # Download all chapters
-                    download_chapters(scraper, args.novel_id, novel_info, chapters, "0")
+                    download_chapters(scraper, args.novel_id, novel_info, chapters, "0", args.download)
             # Display specific chapter if requested
             elif args.chapter and args.chapter.isdigit():
                 chapter_idx = int(args.chapter) - 1
                 if 0 <= chapter_idx < len(chapters):
                     print(f"Downloading chapter {args.chapter}: {chapters[chapter_idx]['title']}")
-                    chapter_content = scraper.get_chapter_content(chapters[chapter_idx]['url'], chapters[chapter_idx]['title'])
+                    chapter_content = scraper.get_chapter_content(chapters[chapter_idx]['url'], chapters[chapter_idx].get('source_title', chapters[chapter_idx]['title']))
                     
                     print(f"\n{chapter_content['title']}")
                     print("=" * len(chapter_content['title']))
@@ -917,6 +1494,8 @@ def main():
             print(f"An error occurred: {e}")
             # Log the full error details in debug mode
             logger.debug(f"Error details: {e}", exc_info=True)
+        finally:
+            scraper.close()
 
 
 if __name__ == "__main__":
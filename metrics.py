@@ -0,0 +1,298 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Process-wide counters and latency histograms.
+
+Instrumented code updates the metrics defined at the bottom of this module.
+They can be served in the Prometheus text format while a job runs
+(``--metrics-port``) and written as JSON when it ends (``--metrics-json``).
+"""
+
+import json
+import time
+import threading
+import http.server
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Upper bounds in seconds, from fast parses to slow translations
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Metric:
+    """A named metric with one series per combination of label values."""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.lock = threading.Lock()
+        self.series: Dict[Tuple[str, ...], Any] = {}
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"{self.name} takes labels {', '.join(self.label_names) or 'none'}, "
+                             f"got {', '.join(labels) or 'none'}")
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def _labels(self, key: Tuple[str, ...], extra: Optional[Dict[str, str]] = None) -> str:
+        pairs = list(zip(self.label_names, key)) + list((extra or {}).items())
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+    def reset(self):
+        with self.lock:
+            self.series.clear()
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        with self.lock:
+            for key in sorted(self.series):
+                lines.extend(self._render_series(key, self.series[key]))
+        return lines
+
+    def _render_series(self, key: Tuple[str, ...], value: Any) -> List[str]:
+        raise NotImplementedError
+
+    def as_dict(self) -> Dict[str, Any]:
+        with self.lock:
+            samples = [dict(self._sample(value), labels=dict(zip(self.label_names, key)))
+                       for key, value in sorted(self.series.items())]
+        return {"type": self.kind, "help": self.help_text, "samples": samples}
+
+    def _sample(self, value: Any) -> Dict[str, Any]:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    """Monotonically increasing total, such as requests made or bytes downloaded."""
+
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.series[key] = self.series.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self.lock:
+            return self.series.get(self._key(labels), 0)
+
+    def _render_series(self, key: Tuple[str, ...], value: float) -> List[str]:
+        return [f"{self.name}{self._labels(key)} {_format_value(value)}"]
+
+    def _sample(self, value: float) -> Dict[str, Any]:
+        return {"value": value}
+
+
+class Histogram(Metric):
+    """Distribution of observed values, usually durations in seconds."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, label_names)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self.lock:
+            series = self.series.get(key)
+            if series is None:
+                # Per-bucket (not cumulative) counts, sum and count
+                series = self.series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for position, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][position] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        """Observe the duration of the with block, also when it raises."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def quantile(self, q: float, **labels) -> Optional[float]:
+        """Estimate of a quantile, interpolated within its bucket; None without observations."""
+        with self.lock:
+            series = self.series.get(self._key(labels))
+            return self._quantile(series, q) if series else None
+
+    def _quantile(self, series: list, q: float) -> Optional[float]:
+        counts, _, total = series
+        if not total:
+            return None
+        rank = q * total
+        seen = 0
+        lower = 0.0
+        for bound, count in zip(self.buckets, counts):
+            if count and seen + count >= rank:
+                if bound == float('inf'):
+                    # Nothing to interpolate towards; the highest finite bound is the best estimate
+                    return lower
+                return lower + (bound - lower) * (rank - seen) / count
+            seen += count
+            lower = bound if bound != float('inf') else lower
+        return lower
+
+    def _render_series(self, key: Tuple[str, ...], series: list) -> List[str]:
+        counts, total_sum, total = series
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, counts):
+            cumulative += count
+            lines.append(f"{self.name}_bucket{self._labels(key, {'le': _format_value(bound)})} {cumulative}")
+        lines.append(f"{self.name}_sum{self._labels(key)} {_format_value(total_sum)}")
+        lines.append(f"{self.name}_count{self._labels(key)} {total}")
+        return lines
+
+    def _sample(self, series: list) -> Dict[str, Any]:
+        counts, total_sum, total = series
+        cumulative = 0
+        buckets = {}
+        for bound, count in zip(self.buckets, counts):
+            cumulative += count
+            buckets[_format_value(bound)] = cumulative
+        return {"count": total, "sum": total_sum, "mean": total_sum / total if total else None,
+                "p50": self._quantile(series, 0.5), "p95": self._quantile(series, 0.95),
+                "p99": self._quantile(series, 0.99), "buckets": buckets}
+
+
+class MetricsRegistry:
+    """Set of metrics rendered together."""
+
+    def __init__(self):
+        self.metrics: Dict[str, Metric] = {}
+        self.lock = threading.Lock()
+        self.started = time.time()
+
+    def _register(self, metric: Metric) -> Metric:
+        with self.lock:
+            existing = self.metrics.get(metric.name)
+            if existing is not None:
+                if type(existing) is not type(metric) or existing.label_names != metric.label_names:
+                    raise ValueError(f"Metric {metric.name} is already registered differently")
+                return existing
+            self.metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, help_text: str, label_names: Sequence[str] = ()) -> Counter:
+        """Get or create a counter."""
+        return self._register(Counter(name, help_text, label_names))
+
+    def histogram(self, name: str, help_text: str, label_names: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        """Get or create a histogram."""
+        return self._register(Histogram(name, help_text, label_names, buckets))
+
+    def reset(self):
+        """Clear every series, e.g. between benchmark runs."""
+        with self.lock:
+            for metric in self.metrics.values():
+                metric.reset()
+            self.started = time.time()
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        with self.lock:
+            metrics = list(self.metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def as_dict(self) -> Dict[str, Any]:
+        with self.lock:
+            metrics = list(self.metrics.values())
+        return {"started": self.started, "elapsed_s": time.time() - self.started,
+                "metrics": {metric.name: metric.as_dict() for metric in metrics}}
+
+    def dump_json(self, path: str):
+        """Write all metrics to a JSON file."""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.as_dict(), f, indent=2)
+
+    def serve(self, port: int, host: str = "127.0.0.1") -> http.server.ThreadingHTTPServer:
+        """Serve /metrics (Prometheus) and /metrics.json on a background thread.
+
+        Args:
+            port (int): Port to listen on, 0 for any free port
+            host (str): Address to bind; local only by default
+
+        Returns:
+            ThreadingHTTPServer: Running server; call shutdown() to stop it
+        """
+        registry = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = self.path.split('?', 1)[0]
+                if path in ("/", "/metrics"):
+                    body = registry.render().encode('utf-8')
+                    content_type = "text/plain; version=0.0.4; charset=utf-8"
+                elif path == "/metrics.json":
+                    body = json.dumps(registry.as_dict()).encode('utf-8')
+                    content_type = "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = http.server.ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+        return server
+
+
+REGISTRY = MetricsRegistry()
+
+FETCH_SECONDS = REGISTRY.histogram(
+    "syosetu_fetch_seconds", "Page download latency", ("site",))
+STAGE_SECONDS = REGISTRY.histogram(
+    "syosetu_stage_seconds", "Time a chapter spends in each pipeline stage, export being the consumer", ("stage",))
+TRANSLATE_SECONDS = REGISTRY.histogram(
+    "syosetu_translate_seconds", "Latency of single requests to a translation service", ("service",))
+EXPORT_SECONDS = REGISTRY.histogram(
+    "syosetu_export_seconds", "Time to write an output file, including waiting for its chapters",
+    ("format",), buckets=DEFAULT_BUCKETS + (120.0, 300.0, 600.0, 1800.0, 3600.0))
+
+REQUESTS = REGISTRY.counter(
+    "syosetu_requests_total", "HTTP requests by kind and outcome (status code or 'error')", ("kind", "status"))
+DOWNLOADED_BYTES = REGISTRY.counter(
+    "syosetu_downloaded_bytes_total", "Response bytes downloaded", ("kind",))
+RETRIES = REGISTRY.counter(
+    "syosetu_retries_total", "Operations retried after an error", ("operation",))
+CACHE_HITS = REGISTRY.counter(
+    "syosetu_cache_hits_total", "Lookups answered from a cache", ("cache",))
+CACHE_MISSES = REGISTRY.counter(
+    "syosetu_cache_misses_total", "Lookups a cache could not answer", ("cache",))
+TRANSLATED_CHARS = REGISTRY.counter(
+    "syosetu_translated_chars_total", "Characters sent to a translation service", ("service",))
+TRANSLATION_ERRORS = REGISTRY.counter(
+    "syosetu_translation_errors_total", "Failed requests to a translation service", ("service",))
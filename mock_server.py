@@ -0,0 +1,276 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Local stand-in for the novel sites and a translation service.
+
+Serves generated novels (see corpus.py) in the page structures the site parsers expect,
+so the whole scraper can be exercised and benchmarked without touching
+the real sites. Latency, jitter, server errors and rate limiting can be
+injected. A stub of the Google Translate endpoint is served under
+/translate (point ``translation.service_url`` at it).
+
+Usage:
+    python mock_server.py [--port N] [--chapters N] [--latency S] [--jitter S]
+                          [--error-rate P] [--rate-limit-rate P]
+
+URLs, with SITE one of ncode, novel18, mnlt, yomou, hameln:
+    http://HOST:PORT/SITE/<novel_id>/          novel page (hameln: /hameln/novel/<novel_id>/)
+    http://HOST:PORT/SITE/<novel_id>/<n>/      chapter (hameln: /hameln/novel/<novel_id>/<n>.html)
+    http://HOST:PORT/translate?q=...&tl=en     translation stub
+    http://HOST:PORT/images/<name>             image added with add_image
+"""
+
+import sys
+import html
+import time
+import random
+import argparse
+import threading
+import http.server
+import urllib.parse
+from typing import Dict, Optional, Tuple, Union
+
+from corpus import SITE_LAYOUTS, SyntheticNovel, render_chapter_page, render_novel_page
+
+def fake_translation(text: str, target_language: str) -> str:
+    """Deterministic stand-in for a translation, a little longer than the source like real output."""
+    return f"[{target_language}] {text}"
+
+
+class MockServer:
+    """Threaded HTTP server serving mock novels and a translation stub."""
+
+    def __init__(self, chapters: int = 100, paragraphs: int = 30, latency: float = 0.0, jitter: float = 0.0,
+                 error_rate: float = 0.0, rate_limit_rate: float = 0.0, retry_after: float = 1.0,
+                 translate_latency: float = 0.0, seed: int = 0, host: str = "127.0.0.1", port: int = 0,
+                 large_every: int = 0, large_chars: int = 1_000_000):
+        """Initialize the server; call start() to serve.
+
+        Args:
+            chapters (int): Chapters of novels not added with add_novel
+            paragraphs (int): Paragraphs per chapter of those novels
+            latency (float): Seconds every page response is delayed
+            jitter (float): Random extra delay of up to this many seconds, either way
+            error_rate (float): Share of requests answered with 503
+            rate_limit_rate (float): Share of requests answered with 429
+            retry_after (float): Retry-After seconds sent with 429 responses
+            translate_latency (float): Seconds every translation response is delayed
+            seed (int): Seed of the generated text and of injected faults
+            host (str): Address to bind
+            port (int): Port to listen on, 0 for any free port
+            large_every (int): Make every Nth chapter of those novels a large one, 0 for none
+            large_chars (int): Approximate characters of a large chapter
+        """
+        self.chapters = chapters
+        self.paragraphs = paragraphs
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.translate_latency = translate_latency
+        self.seed = seed
+        self.large_every = large_every
+        self.large_chars = large_chars
+        self.novels: Dict[str, SyntheticNovel] = {}
+        # Path -> (body, content type) of served illustrations
+        self.images: Dict[str, Tuple[bytes, str]] = {}
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats: Dict[str, int] = {"requests": 0, "pages": 0, "translations": 0, "errors": 0,
+                                      "rate_limited": 0, "not_found": 0, "images": 0, "bytes": 0}
+        self.server = http.server.ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self.thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def site_url(self, site_type: str) -> str:
+        """Base URL standing in for a site; use it as the scraper's base_url."""
+        return f"{self.url}/{site_type}"
+
+    @property
+    def translate_url(self) -> str:
+        """Endpoint for the translation service_url setting (Google protocol)."""
+        return f"{self.url}/translate"
+
+    def add_novel(self, novel_id: str, chapters: Optional[int] = None, paragraphs: Optional[int] = None,
+                  **kwargs) -> SyntheticNovel:
+        """Serve a novel with a specific size; other IDs get the server's default size.
+
+        Keyword arguments are passed to SyntheticNovel, e.g. large_every and
+        large_chars for megabyte chapters.
+        """
+        novel = SyntheticNovel(novel_id, chapters or self.chapters, paragraphs=paragraphs or self.paragraphs,
+                               seed=self.seed, **dict({'large_every': self.large_every,
+                                                       'large_chars': self.large_chars}, **kwargs))
+        self.novels[novel_id] = novel
+        return novel
+
+    def add_image(self, name: str, data: bytes, content_type: str = "image/jpeg") -> str:
+        """Serve data as an illustration and return its URL."""
+        path = f"/images/{name}"
+        with self.lock:
+            self.images[path] = (data, content_type)
+        return self.url + path
+
+    def novel(self, novel_id: str) -> SyntheticNovel:
+        with self.lock:
+            if novel_id not in self.novels:
+                self.novels[novel_id] = SyntheticNovel(novel_id, self.chapters, paragraphs=self.paragraphs,
+                                                       large_every=self.large_every,
+                                                       large_chars=self.large_chars, seed=self.seed)
+            return self.novels[novel_id]
+
+    def start(self) -> 'MockServer':
+        self.thread = threading.Thread(target=self.server.serve_forever, name="mock-server", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self) -> 'MockServer':
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _count(self, key: str, amount: int = 1):
+        with self.lock:
+            self.stats[key] += amount
+
+    def _fault(self) -> Tuple[Optional[int], float]:
+        """(status to fail with or None, delay) for one request."""
+        with self.lock:
+            roll = self.rng.random()
+            delay = max(0.0, self.latency + self.rng.uniform(-self.jitter, self.jitter)) if self.jitter else self.latency
+        if roll < self.rate_limit_rate:
+            return 429, delay
+        if roll < self.rate_limit_rate + self.error_rate:
+            return 503, delay
+        return None, delay
+
+    def _route(self, path: str) -> Optional[str]:
+        """Page for a site path, or None if there is none."""
+        parts = [part for part in path.split('/') if part]
+        if not parts or parts[0] not in SITE_LAYOUTS:
+            return None
+        layout = SITE_LAYOUTS[parts[0]]
+        parts = parts[1:]
+        if layout == 'hameln':
+            if not parts or parts[0] != 'novel':
+                return None
+            parts = parts[1:]
+            if len(parts) == 2 and parts[1].endswith('.html'):
+                parts[1] = parts[1][:-len('.html')]
+        if len(parts) == 1:
+            return render_novel_page(layout, self.novel(parts[0]))
+        if len(parts) == 2 and parts[1].isdigit():
+            novel = self.novel(parts[0])
+            number = int(parts[1])
+            if 1 <= number <= novel.chapters:
+                return render_chapter_page(layout, novel, number)
+        return None
+
+    def _handler(self):
+        server = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _send(self, status: int, body: Union[str, bytes], headers: Optional[Dict[str, str]] = None,
+                      content_type: str = "text/html; charset=utf-8"):
+                data = body.encode('utf-8') if isinstance(body, str) else body
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+                server._count("bytes", len(data))
+
+            def do_GET(self):
+                server._count("requests")
+                url = urllib.parse.urlsplit(self.path)
+                translating = url.path.rstrip('/') == "/translate"
+                status, delay = server._fault()
+                if translating:
+                    delay = server.translate_latency
+                if delay:
+                    time.sleep(delay)
+                if status == 429:
+                    server._count("rate_limited")
+                    self._send(429, "Too Many Requests", {'Retry-After': f"{server.retry_after:g}"})
+                    return
+                if status:
+                    server._count("errors")
+                    self._send(status, "Service Unavailable")
+                    return
+
+                if translating:
+                    query = urllib.parse.parse_qs(url.query)
+                    text = query.get('q', [""])[0]
+                    server._count("translations")
+                    translated = html.escape(fake_translation(text, query.get('tl', ["en"])[0]))
+                    self._send(200, f"<html><body><div class=\"result-container\">{translated}</div></body></html>")
+                    return
+
+                image = server.images.get(url.path)
+                if image is not None:
+                    server._count("images")
+                    self._send(200, image[0], content_type=image[1])
+                    return
+
+                page = server._route(url.path)
+                if page is None:
+                    server._count("not_found")
+                    self._send(404, "Not Found")
+                    return
+                server._count("pages")
+                self._send(200, page)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mock novel sites and translation service")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to bind")
+    parser.add_argument("--port", type=int, default=8800, help="Port to listen on, 0 for any free port")
+    parser.add_argument("--chapters", type=int, default=100, help="Chapters per novel")
+    parser.add_argument("--paragraphs", type=int, default=30, help="Paragraphs per chapter")
+    parser.add_argument("--large-every", type=int, default=0, help="Make every Nth chapter a large one")
+    parser.add_argument("--large-chars", type=int, default=1_000_000, help="Approximate characters of a large chapter")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds every page response is delayed")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Random variation of the latency in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with 503")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Share of requests answered with 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds sent with 429 responses")
+    parser.add_argument("--translate-latency", type=float, default=0.0, help="Seconds every translation is delayed")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the generated text and injected faults")
+    args = parser.parse_args(argv)
+
+    server = MockServer(args.chapters, args.paragraphs, args.latency, args.jitter, args.error_rate,
+                        args.rate_limit_rate, args.retry_after, args.translate_latency, args.seed,
+                        args.host, args.port, args.large_every, args.large_chars)
+    # The first line is read by benchmark.py to find the port
+    print(f"Serving on {server.url}", flush=True)
+    try:
+        server.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server.server_close()
+        print(f"Stats: {server.stats}", flush=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,289 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import zlib
+import sqlite3
+import threading
+from typing import Any, Dict, Iterator, List, Optional
+
+from config import CONFIG_DIR
+
+# Store used for fetched chapters with the "disk" chapter store setting
+CHAPTER_STORE_FILE = os.path.join(CONFIG_DIR, "chapters.sqlite")
+
+# Content shorter than this is kept as a plain string
+COMPRESS_THRESHOLD = 256
+
+
+def _pack(text: str) -> Any:
+    """Compact in-memory form of a string: zlib-compressed UTF-8 unless it's short."""
+    if len(text) < COMPRESS_THRESHOLD:
+        return text
+    return zlib.compress(text.encode('utf-8'), 1)
+
+
+def _unpack(value: Any) -> str:
+    if isinstance(value, bytes):
+        return zlib.decompress(value).decode('utf-8')
+    return value
+
+
+class ChapterStore:
+    """On-disk store of chapter content and ruby readings in a SQLite file.
+
+    Chapters offloaded to the store keep only their key in memory and read
+    their content back when it is accessed. The store is safe to share
+    between threads and is reopened by path in worker processes.
+    """
+
+    def __init__(self, path: str, namespace: str = ""):
+        """Open or create the store.
+
+        Args:
+            path (str): SQLite database file
+            namespace (str): Prefix for keys, e.g. the translation language, so
+                differently processed copies of a chapter don't overwrite each other
+        """
+        self.path = path
+        self.namespace = namespace
+        self.lock = threading.Lock()
+        self._connection = None
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            # The store only holds data that can be fetched again, so skip fsyncs
+            self._connection.execute("PRAGMA synchronous = OFF")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS chapters (key TEXT PRIMARY KEY, content BLOB, ruby BLOB)")
+        return self._connection
+
+    def __getstate__(self):
+        # Connections can't be pickled; worker processes reopen the file
+        return {'path': self.path, 'namespace': self.namespace}
+
+    def __setstate__(self, state):
+        self.__init__(state['path'], state['namespace'])
+
+    def put(self, key: str, content: Optional[str], ruby: Optional[List] = None):
+        """Store a chapter's content and ruby readings under key."""
+        self.put_packed(key, _pack(content) if content is not None else None,
+                        _pack(json.dumps(ruby, ensure_ascii=False)) if ruby else None)
+
+    def put_packed(self, key: str, content: Any, ruby: Any):
+        """Store content and JSON ruby readings already in the form made by _pack."""
+        with self.lock:
+            self.connection.execute("INSERT OR REPLACE INTO chapters VALUES (?, ?, ?)",
+                                    (self.namespace + key, content, ruby))
+            self.connection.commit()
+
+    def get_packed(self, key: str) -> Optional[tuple]:
+        """Stored (content, ruby) of key as passed to put_packed, or None if it isn't stored."""
+        with self.lock:
+            return self.connection.execute("SELECT content, ruby FROM chapters WHERE key = ?",
+                                           (self.namespace + key,)).fetchone()
+
+    def get(self, key: str) -> Optional[Dict]:
+        """Stored content and ruby readings of key, or None if it isn't stored."""
+        row = self.get_packed(key)
+        if row is None:
+            return None
+        return {
+            'content': _unpack(row[0]) if row[0] is not None else None,
+            'ruby': json.loads(_unpack(row[1])) if row[1] is not None else None
+        }
+
+    def __contains__(self, key: str) -> bool:
+        with self.lock:
+            return self.connection.execute("SELECT 1 FROM chapters WHERE key = ?",
+                                            (self.namespace + key,)).fetchone() is not None
+
+    def close(self):
+        with self.lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+
+class Chapter:
+    """Compact chapter record.
+
+    Content and ruby readings are held zlib-compressed and decompressed when
+    accessed, or offloaded to a ChapterStore so only a key stays in memory.
+    Chapters also support the dict-style access the rest of the code uses
+    (``chapter['title']``, ``chapter.get('arc')``, ``'content' in chapter``);
+    a field that is None counts as missing, as an absent dict key did.
+    """
+
+    FIELDS = ('index', 'title', 'url', 'chapter_num', 'arc', 'publish_date',
+              'source_title', 'source_arc', 'content', 'ruby', 'images')
+
+    __slots__ = ('index', 'title', 'url', 'chapter_num', 'arc', 'publish_date',
+                 'source_title', 'source_arc', 'images', '_content', '_ruby', '_store', '_store_key', 'extra')
+
+    def __init__(self, index: Optional[int] = None, title: Optional[str] = None, url: Optional[str] = None,
+                 chapter_num: Optional[str] = None, arc: Optional[str] = None, publish_date: Optional[str] = None,
+                 content: Optional[str] = None, ruby: Optional[List] = None, images: Optional[List[Dict]] = None,
+                 **extra):
+        self.index = index
+        self.title = title
+        self.url = url
+        self.chapter_num = chapter_num
+        self.arc = arc
+        self.publish_date = publish_date
+        self.source_title = None
+        self.source_arc = None
+        self.images = images
+        self._content = None
+        self._ruby = None
+        self._store = None
+        self._store_key = None
+        self.extra = None
+        self.content = content
+        self.ruby = ruby
+        for key, value in extra.items():
+            self[key] = value
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'Chapter':
+        """Build a chapter from a dict, or return it unchanged if it already is one."""
+        if isinstance(data, Chapter):
+            return data
+        chapter = cls()
+        for key, value in data.items():
+            chapter[key] = value
+        return chapter
+
+    # Lazily materialized fields
+
+    @property
+    def content(self) -> Optional[str]:
+        if self._store is not None:
+            stored = self._store.get(self._store_key)
+            return stored['content'] if stored else None
+        return _unpack(self._content) if self._content is not None else None
+
+    @content.setter
+    def content(self, value: Optional[str]):
+        self._detach()
+        self._content = _pack(value) if value is not None else None
+
+    @property
+    def ruby(self) -> Optional[List]:
+        if self._store is not None:
+            stored = self._store.get(self._store_key)
+            return stored['ruby'] if stored else None
+        return json.loads(_unpack(self._ruby)) if self._ruby is not None else None
+
+    @ruby.setter
+    def ruby(self, value: Optional[List]):
+        self._detach()
+        self._ruby = _pack(json.dumps(value, ensure_ascii=False)) if value else None
+
+    def _detach(self):
+        """Bring stored content back into memory before one of the fields changes."""
+        if self._store is not None:
+            stored = self._store.get_packed(self._store_key) or (None, None)
+            self._store = None
+            self._store_key = None
+            self._content, self._ruby = stored
+
+    def offload(self, store: ChapterStore, key: Optional[str] = None):
+        """Move content and ruby readings to an on-disk store.
+
+        Args:
+            store (ChapterStore): Store to write to
+            key (str, optional): Store key, the chapter URL by default
+        """
+        self._detach()
+        key = key or self.url or str(self.index)
+        store.put_packed(key, self._content, self._ruby)
+        self.attach(store, key)
+
+    @property
+    def stored(self) -> bool:
+        """Whether content and ruby readings are read from a ChapterStore."""
+        return self._store is not None
+
+    def attach(self, store: ChapterStore, key: str):
+        """Read content and ruby readings from a store that already holds them under key."""
+        self._content = None
+        self._ruby = None
+        self._store = store
+        self._store_key = key
+
+    def with_content(self, fetched: 'Chapter') -> 'Chapter':
+        """Copy of this chapter with the title, content, ruby and images of a fetched chapter."""
+        chapter = self.copy()
+        chapter.title = fetched.title
+        fetched._detach()
+        chapter._content = fetched._content
+        chapter._ruby = fetched._ruby
+        chapter._store = None
+        chapter._store_key = None
+        chapter.images = fetched.images
+        return chapter
+
+    # Mapping compatibility
+
+    def __getitem__(self, key: str) -> Any:
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key: str, value: Any):
+        if key in self.FIELDS:
+            setattr(self, key, value)
+        else:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[key] = value
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if key in self.FIELDS:
+            value = getattr(self, key)
+        else:
+            value = self.extra.get(key) if self.extra else None
+        return default if value is None else value
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key) is not None
+
+    def keys(self) -> List[str]:
+        keys = [key for key in self.FIELDS if key in self]
+        if self.extra:
+            keys.extend(key for key, value in self.extra.items() if value is not None)
+        return keys
+
+    def items(self) -> Iterator:
+        return ((key, self[key]) for key in self.keys())
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.keys())
+
+    def to_dict(self) -> Dict:
+        return dict(self.items())
+
+    def copy(self) -> 'Chapter':
+        """Shallow copy; compressed or stored content is shared, not duplicated."""
+        chapter = Chapter.__new__(Chapter)
+        for slot in self.__slots__:
+            setattr(chapter, slot, getattr(self, slot))
+        if self.extra is not None:
+            chapter.extra = dict(self.extra)
+        return chapter
+
+    def __getstate__(self):
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+    def __setstate__(self, state):
+        for slot, value in state.items():
+            setattr(self, slot, value)
+
+    def __repr__(self) -> str:
+        return f"Chapter(index={self.index!r}, title={self.title!r})"
@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Offline runs, answered from local data without requests to the novel sites.
+
+Novel pages come from the chapter store, which keeps them whenever a novel
+is downloaded with the disk chapter store, or from an HTTP archive recorded
+with ``--record``. Chapter text comes from the chapter store, either as
+final text or as source text that is translated again, or else from chapter
+pages in the archive. Translation services are still used. Before any
+chapter is processed, every page the run needs is checked, and the run
+stops with the complete list of missing ones.
+"""
+
+import zlib
+from typing import Dict, Iterable, List, Optional
+
+import requests
+from requests.adapters import BaseAdapter
+
+from models import Chapter, ChapterStore, CHAPTER_STORE_FILE
+
+# Chapter store namespace of raw novel pages
+PAGE_NAMESPACE = "page:"
+
+# Missing pages shown in an error message; the exception holds all of them
+SHOWN_MISSING = 20
+
+
+class MissingPages(Exception):
+    """Pages an offline run needs that aren't available locally."""
+
+    def __init__(self, urls: List[str]):
+        self.urls = list(urls)
+        lines = [f"{len(self.urls)} page(s) needed offline are not in the chapter store or HTTP archive:"]
+        lines.extend(f"  {url}" for url in self.urls[:SHOWN_MISSING])
+        if len(self.urls) > SHOWN_MISSING:
+            lines.append(f"  ... and {len(self.urls) - SHOWN_MISSING} more")
+        lines.append("Pages are only kept by downloads with --chapter-store disk or recorded with --record.")
+        super().__init__("\n".join(lines))
+
+
+class StoredChapter:
+    """Chapter text read from the chapter store in place of a fetched page."""
+
+    __slots__ = ('chapter', 'translated')
+
+    def __init__(self, chapter: Chapter, translated: bool):
+        self.chapter = chapter
+        self.translated = translated
+
+
+class OfflineAdapter(BaseAdapter):
+    """Transport adapter that refuses every request, e.g. for illustrations not in the image cache."""
+
+    def send(self, request, **kwargs):
+        raise requests.exceptions.ConnectionError(f"Offline: {request.url} was not requested", request=request)
+
+    def close(self):
+        pass
+
+
+def store_namespace(translation_config: Dict) -> str:
+    """ChapterStore namespace of final chapter text under a translation configuration."""
+    if translation_config.get("enabled", False):
+        return f"{translation_config.get('target_language', 'en')}:"
+    return ""
+
+
+def keep_page(url: str, page: bytes, store_path: str = CHAPTER_STORE_FILE):
+    """Keep a novel page in the chapter store for later offline runs."""
+    store = ChapterStore(store_path, PAGE_NAMESPACE)
+    try:
+        store.put_packed(url, zlib.compress(page, 6), None)
+    finally:
+        store.close()
+
+
+class LocalSources:
+    """Pages and chapter text available without network access."""
+
+    def __init__(self, translation_config: Dict, archive=None, store_path: str = CHAPTER_STORE_FILE):
+        """Initialize the sources.
+
+        Args:
+            translation_config (Dict): Translation settings, selecting the final text namespace
+            archive (HttpArchive, optional): Recorded pages
+            store_path (str): Chapter store file
+        """
+        self.archive = archive
+        self.pages = ChapterStore(store_path, PAGE_NAMESPACE)
+        self.source = ChapterStore(store_path, "")
+        namespace = store_namespace(translation_config)
+        self.final = ChapterStore(store_path, namespace) if namespace else self.source
+
+    def page(self, url: str) -> bytes:
+        """A page from the chapter store or the archive.
+
+        Raises:
+            MissingPages: If neither has it
+        """
+        row = self.pages.get_packed(url)
+        if row is not None:
+            return zlib.decompress(row[0])
+        body = self.archive.latest(url) if self.archive is not None else None
+        if body is None:
+            raise MissingPages([url])
+        return body
+
+    def has_page(self, url: str) -> bool:
+        return url in self.pages or (self.archive is not None and self.archive.has(url))
+
+    def chapter(self, chapter: Dict) -> Optional[StoredChapter]:
+        """A chapter's stored text, final or to be translated, or None if only a page can provide it."""
+        url = chapter['url']
+        for store, translated in ((self.final, True), (self.source, False)):
+            if url in store:
+                stored = Chapter.from_dict(chapter).copy()
+                if not translated:
+                    # Source text gets its source title, to be translated along with it
+                    stored.title = chapter.get('source_title') or chapter['title']
+                stored.attach(store, url)
+                return StoredChapter(stored, translated)
+        return None
+
+    def missing(self, chapters: Iterable[Dict]) -> List[str]:
+        """URLs of chapters that neither the chapter store nor the archive can provide."""
+        return [chapter['url'] for chapter in chapters
+                if chapter['url'] not in self.final and chapter['url'] not in self.source
+                and not self.has_page(chapter['url'])]
+
+    def close(self):
+        for store in (self.pages, self.source, self.final):
+            store.close()
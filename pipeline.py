@@ -0,0 +1,277 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import time
+import queue
+import threading
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+from metrics import STAGE_SECONDS
+from profiling import span
+
+# Put on a queue once for every worker of the next stage when the input runs out
+_END = object()
+# Returned by Pipeline._get when the pipeline stopped
+_STOPPED = object()
+
+
+class PipelineCancelled(Exception):
+    """Raised from Pipeline.run when the pipeline was cancelled."""
+
+
+class Stage:
+    """One step of a pipeline: a function applied to every item by a pool of threads."""
+
+    def __init__(self, name: str, func: Callable[[Any], Any], workers: int = 1, queue_size: Optional[int] = None):
+        """Initialize the stage.
+
+        Args:
+            name (str): Name shown in metrics
+            func (Callable): Function applied to every item
+            workers (int): Number of threads running func
+            queue_size (int, optional): Capacity of the queue feeding this stage,
+                the pipeline's queue size by default
+        """
+        self.name = name
+        self.func = func
+        self.workers = max(1, workers)
+        self.queue_size = queue_size
+
+
+class StageMetrics:
+    """Counters of one pipeline stage, updated by its workers."""
+
+    def __init__(self, name: str, workers: int):
+        self.name = name
+        self.workers = workers
+        self.items = 0
+        self.errors = 0
+        self.busy = 0.0  # Seconds spent processing, summed over workers
+        self.starved = 0.0  # Seconds spent waiting for input
+        self.blocked = 0.0  # Seconds spent waiting for room downstream (backpressure)
+        self.lock = threading.Lock()
+
+    def add(self, items: int = 0, errors: int = 0, busy: float = 0.0, starved: float = 0.0, blocked: float = 0.0):
+        with self.lock:
+            self.items += items
+            self.errors += errors
+            self.busy += busy
+            self.starved += starved
+            self.blocked += blocked
+
+    def as_dict(self) -> Dict[str, Any]:
+        with self.lock:
+            return {"name": self.name, "workers": self.workers, "items": self.items, "errors": self.errors,
+                    "busy_s": self.busy, "starved_s": self.starved, "blocked_s": self.blocked}
+
+
+class Pipeline:
+    """Run items through stages connected by bounded queues.
+
+    Every stage has its own pool of worker threads, so a slow step (usually
+    fetching or translating) can be given more workers without touching the
+    others. Queues between stages are bounded, and the number of items
+    inside the pipeline at once is capped, so a fast stage blocks instead of
+    piling up results when the next one falls behind. Results come out of
+    ``run`` in input order.
+
+    An exception in any stage stops the pipeline and is re-raised from
+    ``run``. Closing the ``run`` generator or calling ``cancel`` stops all
+    workers after the items they are processing.
+    """
+
+    def __init__(self, stages: List[Stage], queue_size: int = 8, max_in_flight: Optional[int] = None,
+                 sink_name: str = "consumer"):
+        """Initialize the pipeline.
+
+        Args:
+            stages (List[Stage]): Stages in processing order
+            queue_size (int): Default capacity of the queues between stages
+            max_in_flight (int, optional): Most items inside the pipeline at once,
+                including finished ones waiting for an earlier item. Defaults to
+                the total queue capacity plus the number of workers.
+            sink_name (str): Name under which the consumer of ``run`` is reported
+        """
+        if not stages:
+            raise ValueError("A pipeline needs at least one stage")
+        self.stages = stages
+        self.queues = [queue.Queue(maxsize=max(1, stage.queue_size or queue_size)) for stage in stages]
+        self.queues.append(queue.Queue(maxsize=max(1, queue_size)))
+        if max_in_flight is None:
+            max_in_flight = sum(q.maxsize for q in self.queues) + sum(stage.workers for stage in stages)
+        self.slots = threading.BoundedSemaphore(max(1, max_in_flight))
+        self.metrics = [StageMetrics(stage.name, stage.workers) for stage in stages]
+        self.sink_metrics = StageMetrics(sink_name, 1)
+        self.stop = threading.Event()
+        self.cancelled = False
+        self.error = None
+        self.lock = threading.Lock()
+        self.finished_workers = [0] * len(stages)
+        self.threads: List[threading.Thread] = []
+        self.started = 0.0
+        self.elapsed = 0.0
+        self.poll_interval = 0.1
+
+    def cancel(self):
+        """Stop the pipeline; ``run`` raises PipelineCancelled."""
+        self.cancelled = True
+        self.stop.set()
+
+    def _fail(self, error: BaseException):
+        with self.lock:
+            if self.error is None:
+                self.error = error
+        self.stop.set()
+
+    def _put(self, q: queue.Queue, item: Any, metrics: Optional[StageMetrics] = None) -> bool:
+        """Put item on q, waiting while it's full. Returns False if the pipeline stopped."""
+        start = time.perf_counter()
+        try:
+            while not self.stop.is_set():
+                try:
+                    q.put(item, timeout=self.poll_interval)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+        finally:
+            if metrics:
+                metrics.add(blocked=time.perf_counter() - start)
+
+    def _get(self, q: queue.Queue, metrics: Optional[StageMetrics] = None) -> Any:
+        """Take an item from q, waiting while it's empty. Returns _STOPPED if the pipeline stopped."""
+        start = time.perf_counter()
+        try:
+            while not self.stop.is_set():
+                try:
+                    return q.get(timeout=self.poll_interval)
+                except queue.Empty:
+                    continue
+            return _STOPPED
+        finally:
+            if metrics:
+                metrics.add(starved=time.perf_counter() - start)
+
+    def _feed(self, items: Iterable):
+        try:
+            for sequence, item in enumerate(items):
+                # Wait for a free slot so at most max_in_flight items are held
+                while not self.slots.acquire(timeout=self.poll_interval):
+                    if self.stop.is_set():
+                        return
+                if not self._put(self.queues[0], (sequence, item)):
+                    return
+        except BaseException as e:
+            self._fail(e)
+            return
+        for _ in range(self.stages[0].workers):
+            self._put(self.queues[0], _END)
+
+    def _work(self, position: int):
+        stage = self.stages[position]
+        metrics = self.metrics[position]
+        source, target = self.queues[position], self.queues[position + 1]
+        while True:
+            entry = self._get(source, metrics)
+            if entry is _END or entry is _STOPPED:
+                break
+            sequence, item = entry
+            start = time.perf_counter()
+            try:
+                with span(stage.name):
+                    result = stage.func(item)
+            except BaseException as e:
+                metrics.add(errors=1, busy=time.perf_counter() - start)
+                self._fail(e)
+                return
+            busy = time.perf_counter() - start
+            metrics.add(items=1, busy=busy)
+            STAGE_SECONDS.observe(busy, stage=stage.name)
+            if not self._put(target, (sequence, result), metrics):
+                return
+
+        # The last worker to finish tells the next stage there is no more input
+        with self.lock:
+            self.finished_workers[position] += 1
+            last = self.finished_workers[position] == stage.workers
+        if last:
+            next_workers = self.stages[position + 1].workers if position + 1 < len(self.stages) else 1
+            for _ in range(next_workers):
+                self._put(target, _END)
+
+    def run(self, items: Iterable) -> Iterator:
+        """Process items through every stage.
+
+        Args:
+            items (Iterable): Input of the first stage, consumed on a separate thread
+
+        Yields:
+            Output of the last stage for each item, in input order
+
+        Raises:
+            PipelineCancelled: If cancel was called
+        """
+        if self.threads:
+            raise RuntimeError("A pipeline can only be run once")
+        self.started = time.perf_counter()
+        self.threads.append(threading.Thread(target=self._feed, args=(items,), name="pipeline-feed", daemon=True))
+        for position, stage in enumerate(self.stages):
+            for number in range(stage.workers):
+                self.threads.append(threading.Thread(target=self._work, args=(position,),
+                                                     name=f"pipeline-{stage.name}-{number}", daemon=True))
+        for thread in self.threads:
+            thread.start()
+
+        # Results that finished before an earlier item are held here
+        pending = {}
+        next_sequence = 0
+        try:
+            while True:
+                with span(f"{self.sink_metrics.name} (waiting)"):
+                    entry = self._get(self.queues[-1], self.sink_metrics)
+                if entry is _END or entry is _STOPPED:
+                    break
+                sequence, result = entry
+                pending[sequence] = result
+                while next_sequence in pending:
+                    result = pending.pop(next_sequence)
+                    next_sequence += 1
+                    start = time.perf_counter()
+                    with span(self.sink_metrics.name):
+                        yield result
+                    busy = time.perf_counter() - start
+                    self.sink_metrics.add(items=1, busy=busy)
+                    STAGE_SECONDS.observe(busy, stage=self.sink_metrics.name)
+                    self.slots.release()
+            if self.error is not None:
+                raise self.error
+            if self.cancelled:
+                raise PipelineCancelled("Pipeline was cancelled")
+        finally:
+            # Stops the workers too when the consumer gives up early
+            self.stop.set()
+            self.elapsed = time.perf_counter() - self.started
+            for thread in self.threads:
+                thread.join(timeout=self.poll_interval * 2)
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """Metrics of every stage and the consumer."""
+        return [metrics.as_dict() for metrics in self.metrics + [self.sink_metrics]]
+
+    def bottleneck(self) -> Optional[str]:
+        """Name of the stage with the most work per worker."""
+        busiest = max(self.metrics + [self.sink_metrics], key=lambda metrics: metrics.busy / metrics.workers)
+        return busiest.name if busiest.busy > 0 else None
+
+    def report(self) -> str:
+        """Human-readable per-stage summary."""
+        lines = [f"Pipeline: {self.sink_metrics.items} items in {self.elapsed:.1f} s"]
+        for metrics in self.metrics + [self.sink_metrics]:
+            utilization = metrics.busy / (metrics.workers * self.elapsed) if self.elapsed else 0.0
+            lines.append(f"  {metrics.name:<10} {metrics.workers:>2} workers  busy {metrics.busy:7.1f} s "
+                         f"({utilization:4.0%})  waiting for input {metrics.starved:7.1f} s  "
+                         f"blocked {metrics.blocked:7.1f} s")
+        bottleneck = self.bottleneck()
+        if bottleneck:
+            lines.append(f"  Bottleneck: {bottleneck}")
+        return "\n".join(lines)
@@ -0,0 +1,333 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import re
+import threading
+import unicodedata
+from typing import Callable, Dict, List, Optional, Tuple
+
+from metrics import CACHE_HITS, CACHE_MISSES
+
+# Kanji numerals
+KANJI_DIGITS = {
+    '〇': 0, '零': 0, '一': 1, '壱': 1, '二': 2, '弐': 2, '三': 3, '参': 3, '四': 4,
+    '五': 5, '六': 6, '七': 7, '八': 8, '九': 9
+}
+KANJI_UNITS = {'十': 10, '拾': 10, '百': 100, '千': 1000}
+KANJI_MYRIAD = {'万': 10000}
+
+# Full-width digits to ASCII
+FULLWIDTH_DIGITS = str.maketrans('０１２３４５６７８９', '0123456789')
+
+NUMBER_CHARS = '0-9０-９〇零一二三四五六七八九十拾百千万壱弐参'
+
+# Counters used in numbered headings, e.g. 第12話, 第三章
+COUNTER_WORDS = {
+    'en': {
+        '話': 'Episode',
+        '回': 'Episode',
+        '章': 'Chapter',
+        '部': 'Part',
+        '幕': 'Act',
+        '節': 'Section',
+        '巻': 'Volume',
+        '編': 'Arc'
+    }
+}
+
+# Fixed heading phrases, optionally followed by a number (閑話2, プロローグ１)
+PHRASE_TABLE = {
+    'en': {
+        'プロローグ': 'Prologue',
+        'エピローグ': 'Epilogue',
+        '序章': 'Prologue',
+        '終章': 'Final Chapter',
+        '最終話': 'Final Episode',
+        '最終章': 'Final Chapter',
+        '閑話': 'Interlude',
+        '幕間': 'Intermission',
+        '番外編': 'Extra',
+        '番外': 'Extra',
+        '外伝': 'Side Story',
+        '後書き': 'Afterword',
+        'あとがき': 'Afterword',
+        '前書き': 'Foreword',
+        'まえがき': 'Foreword',
+        '登場人物紹介': 'Character Introductions',
+        '登場人物': 'Characters',
+        '人物紹介': 'Character Introductions',
+        '設定資料': 'Setting Notes',
+        'お知らせ': 'Announcement'
+    }
+}
+
+# Characters separating a heading prefix from its subtitle
+SUBTITLE_SEPARATORS = ' 　:：-－―—・|｜'
+SUBTITLE_BRACKETS = {'「': '」', '『': '』', '【': '】', '（': '）', '(': ')'}
+
+NUMBERED_PATTERN = re.compile(rf'^(第)?\s*([{NUMBER_CHARS}]+)\s*([話回章部幕節巻編])')
+
+
+def kanji_to_int(text: str) -> Optional[int]:
+    """Convert an ASCII, full-width or kanji numeral to an integer.
+
+    Handles positional kanji (三十二, 百五), digit-by-digit kanji (二〇) and
+    full-width digits (１２). Returns None if the text is not a numeral.
+    """
+    text = text.translate(FULLWIDTH_DIGITS)
+    if not text:
+        return None
+    if text.isdigit():
+        return int(text)
+
+    total = 0
+    section = 0
+    number = 0
+    for char in text:
+        if char.isdigit():
+            number = number * 10 + int(char)
+        elif char in KANJI_DIGITS:
+            number = number * 10 + KANJI_DIGITS[char]
+        elif char in KANJI_UNITS:
+            section += (number or 1) * KANJI_UNITS[char]
+            number = 0
+        elif char in KANJI_MYRIAD:
+            total += ((section + number) or 1) * KANJI_MYRIAD[char]
+            section = 0
+            number = 0
+        else:
+            return None
+
+    return total + section + number
+
+
+def _clean_subtitle(text: str) -> str:
+    """Strip separators and a single pair of enclosing brackets from a subtitle."""
+    text = text.strip(SUBTITLE_SEPARATORS)
+    if len(text) >= 2 and SUBTITLE_BRACKETS.get(text[0]) == text[-1]:
+        text = text[1:-1].strip()
+    return text
+
+
+def _match_phrase(text: str, target_language: str) -> Optional[Tuple[str, str]]:
+    """Match a fixed heading phrase at the start of text."""
+    phrases = PHRASE_TABLE.get(target_language, {})
+    # Longest phrase first so 番外編 wins over 番外
+    for phrase in sorted(phrases, key=len, reverse=True):
+        if text.startswith(phrase):
+            prefix = phrases[phrase]
+            rest = text[len(phrase):]
+            number_match = re.match(rf'\s*([{NUMBER_CHARS}]+)', rest)
+            if number_match:
+                number = kanji_to_int(number_match.group(1))
+                if number is not None:
+                    prefix = f"{prefix} {number}"
+                    rest = rest[number_match.end():]
+            return prefix, rest
+    return None
+
+
+def _match_numbered(text: str, target_language: str) -> Optional[Tuple[str, str]]:
+    """Match a numbered heading such as 第12話 or 三章 at the start of text."""
+    counters = COUNTER_WORDS.get(target_language)
+    if not counters:
+        return None
+    match = NUMBERED_PATTERN.match(text)
+    if not match:
+        return None
+    rest = text[match.end():]
+    # Without 第 the counter must end the heading prefix (十回目 is not "Episode 10")
+    if not match.group(1) and rest and rest[0] not in SUBTITLE_SEPARATORS and rest[0] not in SUBTITLE_BRACKETS:
+        return None
+    number = kanji_to_int(match.group(2))
+    if number is None:
+        return None
+    return f"{counters[match.group(3)]} {number}", rest
+
+
+def split_heading(text: str, target_language: str = "en") -> Optional[Tuple[str, str]]:
+    """Split a formulaic heading into a locally translated prefix and free text.
+
+    Args:
+        text (str): Source heading, e.g. "第12話　旅立ち"
+        target_language (str): Target language code
+
+    Returns:
+        Optional[Tuple[str, str]]: (translated prefix, remaining subtitle) or None
+            if the heading has no recognised prefix. The subtitle may be empty.
+    """
+    stripped = text.strip()
+    match = _match_numbered(stripped, target_language) or _match_phrase(stripped, target_language)
+    if not match:
+        return None
+
+    prefix, rest = match
+    rest = _clean_subtitle(rest)
+
+    # Nested numbering (第三部 第二章) and subtitles that are themselves a fixed
+    # phrase (第1話 プロローグ) are resolved locally too
+    if rest:
+        numbered = _match_numbered(rest, target_language)
+        if numbered:
+            inner = split_heading(rest, target_language)
+            return f"{prefix}, {inner[0]}", inner[1]
+        phrase = _match_phrase(rest, target_language)
+        if phrase and not _clean_subtitle(phrase[1]):
+            return f"{prefix}: {phrase[0]}", ""
+
+    return prefix, rest
+
+
+def translate_headings(texts: List[str], translate_batch: Callable[[List[str]], List[str]],
+                       target_language: str = "en") -> List[str]:
+    """Translate headings, resolving formulaic prefixes locally.
+
+    Only the free text left after a recognised prefix (or the whole heading if
+    none is recognised) is passed to translate_batch, in a single call.
+
+    Args:
+        texts (List[str]): Source headings
+        translate_batch (Callable[[List[str]], List[str]]): Remote batch translator
+        target_language (str): Target language code
+
+    Returns:
+        List[str]: Translated headings in the same order
+    """
+    splits = [split_heading(text, target_language) for text in texts]
+
+    # Collect the texts that still need the remote service
+    remote: List[str] = []
+    remote_index: Dict[int, int] = {}
+    for i, (text, split) in enumerate(zip(texts, splits)):
+        free_text = text if split is None else split[1]
+        if free_text:
+            remote_index[i] = len(remote)
+            remote.append(free_text)
+
+    translated_remote = translate_batch(remote) if remote else []
+
+    results = []
+    for i, (text, split) in enumerate(zip(texts, splits)):
+        translated = translated_remote[remote_index[i]] if i in remote_index else ""
+        if split is None:
+            results.append(translated)
+        elif translated:
+            results.append(f"{split[0]}: {translated}")
+        else:
+            results.append(split[0])
+
+    return results
+
+
+def has_japanese(text: str) -> bool:
+    """Whether text contains any kana or CJK ideographs."""
+    for char in text:
+        code = ord(char)
+        if (0x3040 <= code <= 0x30FF  # Hiragana, Katakana
+                or 0x3400 <= code <= 0x4DBF  # CJK Extension A
+                or 0x4E00 <= code <= 0x9FFF  # CJK Unified Ideographs
+                or 0xF900 <= code <= 0xFAFF  # CJK Compatibility Ideographs
+                or 0xFF66 <= code <= 0xFF9D):  # Half-width Katakana
+            return True
+    return False
+
+
+def needs_translation(text: str) -> bool:
+    """Classify whether a segment has anything for the translator to do.
+
+    Segments without letters (scene breaks like ◆◇◆ or ＊＊＊, punctuation and
+    ellipsis lines like 「……」, numerals) and segments without any Japanese
+    script (already in the target language) are passed through unchanged.
+    """
+    if not text or text.isspace():
+        return False
+    if not has_japanese(text):
+        return False
+    # Prolonged sound marks and iteration marks (Lm) on their own carry no meaning
+    return any(unicodedata.category(char) in ('Lu', 'Ll', 'Lt', 'Lo') for char in text)
+
+
+class SegmentFilter:
+    """Pass-through classifier and intra-run dedup in front of the translator.
+
+    Keeps per-run statistics of how many characters were not sent to the
+    translation service.
+    """
+
+    def __init__(self):
+        self.cache: Dict[str, str] = {}
+        self.lock = threading.Lock()
+        self.stats = {
+            "passthrough_segments": 0,
+            "passthrough_chars": 0,
+            "dedup_segments": 0,
+            "dedup_chars": 0,
+            "translated_segments": 0,
+            "translated_chars": 0
+        }
+
+    def translate_segments(self, segments: List[str],
+                           translate_batch: Callable[[List[str]], List[str]]) -> List[str]:
+        """Translate segments, skipping pass-through and already translated ones.
+
+        Args:
+            segments (List[str]): Source segments
+            translate_batch (Callable): Remote translator for the unique segments that
+                still need translation. If it does not return one translation per
+                segment, the source segments are kept and nothing is cached.
+                Segments it returns unchanged, which is how the translators
+                report a failure, aren't cached either, so later batches retry them.
+
+        Returns:
+            List[str]: Translated segments in the same order
+        """
+        results: List[Optional[str]] = [None] * len(segments)
+        pending: Dict[str, List[int]] = {}
+
+        with self.lock:
+            for i, segment in enumerate(segments):
+                if not needs_translation(segment):
+                    results[i] = segment
+                    self.stats["passthrough_segments"] += 1
+                    self.stats["passthrough_chars"] += len(segment)
+                elif segment in self.cache:
+                    results[i] = self.cache[segment]
+                    self.stats["dedup_segments"] += 1
+                    self.stats["dedup_chars"] += len(segment)
+                    CACHE_HITS.inc(cache="translation")
+                elif segment in pending:
+                    # Repeated within the same batch: translate once
+                    pending[segment].append(i)
+                    self.stats["dedup_segments"] += 1
+                    self.stats["dedup_chars"] += len(segment)
+                else:
+                    pending[segment] = [i]
+                    CACHE_MISSES.inc(cache="translation")
+
+        if pending:
+            remote = list(pending)
+            translated = translate_batch(remote)
+            aligned = translated is not None and len(translated) == len(remote)
+
+            with self.lock:
+                for j, segment in enumerate(remote):
+                    value = translated[j] if aligned else segment
+                    if aligned and value and value != segment:
+                        self.cache[segment] = value
+                    self.stats["translated_segments"] += 1
+                    self.stats["translated_chars"] += len(segment)
+                    for i in pending[segment]:
+                        results[i] = value
+
+        return results
+
+    def saved_chars(self) -> int:
+        """Total characters not sent to the translation service."""
+        return self.stats["passthrough_chars"] + self.stats["dedup_chars"]
+
+    def report(self) -> str:
+        """Human-readable summary of the characters saved this run."""
+        stats = self.stats
+        return (f"Translated {stats['translated_chars']} chars in {stats['translated_segments']} segments; "
+                f"skipped {stats['passthrough_chars']} chars in {stats['passthrough_segments']} pass-through segments "
+                f"and {stats['dedup_chars']} chars in {stats['dedup_segments']} duplicate segments")
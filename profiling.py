@@ -0,0 +1,265 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Sampling profiler with per-stage attribution.
+
+Code marks what a thread is doing with ``span("fetch")`` and similar. While
+a Profiler runs, a background thread samples the Python stack of every
+thread inside a span (and of the main thread) at a fixed interval and files
+the sample under the innermost span. Sampling sees every thread, including
+time spent sleeping or waiting on the network, which deterministic
+profilers like cProfile either miss or can't attribute to a stage.
+
+The results are written as collapsed stacks (flamegraph.pl, speedscope,
+inferno), a speedscope JSON file with one profile per stage, and a text
+summary of the hottest functions per stage and the largest memory
+allocations recorded by tracemalloc.
+"""
+
+import os
+import sys
+import json
+import time
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# Samples of the main thread outside any span are filed under this stage
+MAIN_STAGE = "main"
+
+# Profiler currently sampling, if any
+_active: Optional['Profiler'] = None
+
+# Frame as (file, function, first line)
+Frame = Tuple[str, str, int]
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    """Attribute the current thread's samples to a stage for the duration of the block.
+
+    Costs next to nothing while no profiler is running. Spans nest; the
+    innermost one wins.
+    """
+    profiler = _active
+    if profiler is None:
+        yield
+        return
+    stack = profiler.stages.setdefault(threading.get_ident(), [])
+    stack.append(name)
+    try:
+        yield
+    finally:
+        stack.pop()
+
+
+def _short_path(path: str) -> str:
+    """Last two components of a source path, enough to tell modules apart."""
+    parts = path.replace('\\', '/').split('/')
+    return '/'.join(parts[-2:])
+
+
+def _frame_name(frame: Frame) -> str:
+    return f"{frame[1]} ({_short_path(frame[0])}:{frame[2]})"
+
+
+class Profiler:
+    """Samples stacks per stage and, optionally, records allocations with tracemalloc."""
+
+    def __init__(self, interval: float = 0.005, memory: bool = True, memory_frames: int = 16):
+        """Initialize the profiler.
+
+        Args:
+            interval (float): Seconds between samples
+            memory (bool): Whether to trace allocations with tracemalloc (slows the run down)
+            memory_frames (int): Frames stored per allocation traceback
+        """
+        self.interval = interval
+        self.memory = memory
+        self.memory_frames = memory_frames
+        # Span stack of every thread by thread ident
+        self.stages: Dict[int, List[str]] = {}
+        # (stage, stack from root to leaf) -> [sample count, seconds]
+        self.samples: Dict[Tuple[str, Tuple[Frame, ...]], List[float]] = {}
+        self.stop_event = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+        self.started = 0.0
+        self.elapsed = 0.0
+        self.start_snapshot = None
+        self.end_snapshot = None
+        self.peak_memory = 0
+
+    def start(self):
+        """Start sampling; spans entered from now on are attributed."""
+        global _active
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start(self.memory_frames)
+            self.start_snapshot = tracemalloc.take_snapshot()
+        self.started = time.perf_counter()
+        _active = self
+        self.thread = threading.Thread(target=self._sample_loop, name="profiler", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stop sampling and take the final memory snapshot."""
+        global _active
+        if self.thread is None:
+            return
+        self.stop_event.set()
+        self.thread.join()
+        self.thread = None
+        _active = None
+        self.elapsed = time.perf_counter() - self.started
+        if self.start_snapshot is not None:
+            self.end_snapshot = tracemalloc.take_snapshot()
+            self.peak_memory = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+    def _sample_loop(self):
+        own = threading.get_ident()
+        main = threading.main_thread().ident
+        last = time.perf_counter()
+        while not self.stop_event.wait(self.interval):
+            now = time.perf_counter()
+            weight = now - last
+            last = now
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                try:
+                    stage = self.stages.get(ident, [])[-1]
+                except IndexError:
+                    if ident != main:
+                        # Idle pool threads and other threads outside any span
+                        continue
+                    stage = MAIN_STAGE
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append((code.co_filename, code.co_name, code.co_firstlineno))
+                    frame = frame.f_back
+                key = (stage, tuple(reversed(stack)))
+                entry = self.samples.get(key)
+                if entry is None:
+                    self.samples[key] = [1, weight]
+                else:
+                    entry[0] += 1
+                    entry[1] += weight
+
+    def stage_totals(self) -> Dict[str, List[float]]:
+        """[samples, seconds] of every stage, summed over threads."""
+        totals: Dict[str, List[float]] = {}
+        for (stage, _), (count, seconds) in self.samples.items():
+            total = totals.setdefault(stage, [0, 0.0])
+            total[0] += count
+            total[1] += seconds
+        return totals
+
+    def collapsed(self) -> str:
+        """Samples in the collapsed-stack format, with the stage as the root frame."""
+        lines = []
+        for (stage, stack), (count, _) in sorted(self.samples.items(), key=lambda item: item[0][0]):
+            lines.append(';'.join([stage] + [_frame_name(frame) for frame in stack]) + f" {int(count)}")
+        return "\n".join(lines) + "\n"
+
+    def speedscope(self) -> Dict:
+        """Samples in the speedscope file format, one sampled profile per stage."""
+        frames: List[Dict] = []
+        frame_ids: Dict[Frame, int] = {}
+        profiles: Dict[str, Dict] = {}
+        for (stage, stack), (_, seconds) in self.samples.items():
+            indexes = []
+            for frame in stack:
+                if frame not in frame_ids:
+                    frame_ids[frame] = len(frames)
+                    frames.append({'name': frame[1], 'file': frame[0], 'line': frame[2]})
+                indexes.append(frame_ids[frame])
+            profile = profiles.setdefault(stage, {'type': "sampled", 'name': stage, 'unit': "seconds",
+                                                  'startValue': 0, 'endValue': 0, 'samples': [], 'weights': []})
+            profile['samples'].append(indexes)
+            profile['weights'].append(seconds)
+            profile['endValue'] += seconds
+        return {
+            '$schema': "https://www.speedscope.app/file-format-schema.json",
+            'name': "Syosetu Novel Scraper profile",
+            'exporter': "syosetu-scraper profiling.py",
+            'activeProfileIndex': 0,
+            'shared': {'frames': frames},
+            'profiles': sorted(profiles.values(), key=lambda profile: -profile['endValue'])
+        }
+
+    def hot_functions(self, stage: str, limit: int = 10) -> List[Tuple[str, int, int]]:
+        """(function, self samples, total samples) of a stage's most sampled functions."""
+        own: Dict[Frame, int] = {}
+        total: Dict[Frame, int] = {}
+        for (sample_stage, stack), (count, _) in self.samples.items():
+            if sample_stage != stage or not stack:
+                continue
+            own[stack[-1]] = own.get(stack[-1], 0) + count
+            # Recursive functions count once per sample
+            for frame in set(stack):
+                total[frame] = total.get(frame, 0) + count
+        ranked = sorted(total, key=lambda frame: (-own.get(frame, 0), -total[frame]))[:limit]
+        return [(_frame_name(frame), own.get(frame, 0), total[frame]) for frame in ranked]
+
+    def memory_report(self, limit: int = 15) -> List[str]:
+        """Lines listing where the memory retained since the start was allocated."""
+        if self.start_snapshot is None or self.end_snapshot is None:
+            return []
+        lines = [f"Memory: peak traced {self.peak_memory / 2 ** 20:.1f} MB; "
+                 f"largest growth since the start by allocation site:"]
+        # The profiler's own sample table isn't a hot spot of the run
+        ignore = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+        end = self.end_snapshot.filter_traces(ignore)
+        start = self.start_snapshot.filter_traces(ignore)
+        for stat in end.compare_to(start, 'lineno')[:limit]:
+            frame = stat.traceback[0]
+            lines.append(f"  {stat.size_diff / 1024:+10.1f} KB  {stat.count_diff:+8d} blocks  "
+                         f"{_short_path(frame.filename)}:{frame.lineno}")
+        return lines
+
+    def report(self, limit: int = 10) -> str:
+        """Text summary: time per stage and its hottest functions, then memory hot spots."""
+        totals = self.stage_totals()
+        lines = [f"Profile: {self.elapsed:.1f} s wall clock, sampled every {self.interval * 1000:.0f} ms",
+                 "Thread-seconds per stage (a stage with several workers can exceed the wall clock):"]
+        for stage, (count, seconds) in sorted(totals.items(), key=lambda item: -item[1][1]):
+            lines.append(f"  {stage:<20} {seconds:8.2f} s  ({int(count)} samples)")
+        for stage, (count, _) in sorted(totals.items(), key=lambda item: -item[1][1]):
+            lines.append("")
+            lines.append(f"[{stage}] hottest functions (self %, total %):")
+            for name, own, total in self.hot_functions(stage, limit):
+                lines.append(f"  {own / count:6.1%} {total / count:6.1%}  {name}")
+        memory = self.memory_report()
+        if memory:
+            lines.append("")
+            lines.extend(memory)
+        return "\n".join(lines)
+
+    def write(self, directory: str) -> List[str]:
+        """Write profile.collapsed, profile.speedscope.json, profile.txt and,
+        with memory tracing, memory.snapshot (loadable with tracemalloc.Snapshot.load).
+
+        Returns:
+            List[str]: Written files
+        """
+        os.makedirs(directory, exist_ok=True)
+        paths = []
+        path = os.path.join(directory, "profile.collapsed")
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(self.collapsed())
+        paths.append(path)
+        path = os.path.join(directory, "profile.speedscope.json")
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.speedscope(), f)
+        paths.append(path)
+        path = os.path.join(directory, "profile.txt")
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(self.report() + "\n")
+        paths.append(path)
+        if self.end_snapshot is not None:
+            path = os.path.join(directory, "memory.snapshot")
+            self.end_snapshot.dump(path)
+            paths.append(path)
+        return paths
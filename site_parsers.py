@@ -2,15 +2,27 @@
 # -*- coding: utf-8 -*-
 
 import time
-from bs4 import BeautifulSoup
-from typing import Dict, List, Optional, Any
+from bs4 import BeautifulSoup, Comment, NavigableString
+from typing import Dict, List, Optional, Any, Tuple
 import re
+from urllib.parse import urljoin
 from translator import BaseTranslator, get_translator
+from pretranslate import SegmentFilter, needs_translation, split_heading, translate_headings
+from images import IMAGE_MARKER
+from models import Chapter
+
+# Content of a chapter page with no text
+NO_CONTENT = "No content available"
 
 
 class BaseSiteParser:
     """Base parser class for Syosetu sites."""
     
+    # Characters per chunk of chapter content sent to the translator
+    chunk_limit = 1000
+    # Seconds to wait after each translated chunk
+    chunk_delay = 0
+    
     def __init__(self):
         """Initialize the parser."""
         self.translator = None
@@ -20,6 +32,10 @@ class BaseSiteParser:
             "translate_title": True,
             "translate_content": True
         }
+        # Skips segments that need no translation and translates repeated ones once per run
+        self.segment_filter = SegmentFilter()
+        # Memoized chapter and arc title translations, only those the translator actually translated
+        self.heading_cache: Dict[str, str] = {}
     
     def configure_translator(self, translation_config: Dict[str, Any]):
         """Configure the translator based on configuration.
@@ -27,6 +43,7 @@ class BaseSiteParser:
         Args:
             translation_config (Dict[str, Any]): Translation configuration
         """
+        self.close()
         self.translation_config = translation_config
         if translation_config.get("enabled", False):
             service = translation_config.get("service", "google")
@@ -41,14 +58,28 @@ class BaseSiteParser:
                 target_language, 
                 concurrent_requests, 
                 request_delay,
-                max_retries
+                max_retries,
+                fallback_services=translation_config.get("fallback_services", []),
+                service_url=translation_config.get("service_url") or None,
+                hedge_percentile=translation_config.get("hedge_percentile", 0.95),
+                failure_threshold=translation_config.get("failure_threshold", 3),
+                failure_cooldown=translation_config.get("failure_cooldown", 60.0)
             )
         else:
             self.translator = None
     
+    def close(self):
+        """Release the translator's threads."""
+        if self.translator:
+            self.translator.close()
+            self.translator = None
+    
     def translate_text(self, text: str) -> str:
         """Translate text if translation is enabled.
         
+        Paragraphs (separated by blank lines) that need no translation or were
+        already translated in this run are not sent to the translator.
+        
         Args:
             text (str): Text to translate
             
@@ -59,18 +90,33 @@ class BaseSiteParser:
             return text
         
         try:
-            # Replace newlines with a special marker before translation
-            text_for_translation = text.replace('\n\n', ' PARAGRAPH_BREAK ')
-            
-            target_lang = self.translation_config.get("target_language", "en")
-            translated_text = self.translator.translate_text(text_for_translation, target_lang)
-            
-            # Restore newlines after translation
-            return translated_text.replace(' PARAGRAPH_BREAK ', '\n\n')
+            paragraphs = text.split('\n\n')
+            translated = self.segment_filter.translate_segments(paragraphs, self._translate_joined)
+            return '\n\n'.join(translated)
         except Exception as e:
             print(f"Translation error: {e}")
             return text
     
+    def _translate_joined(self, paragraphs: List[str]) -> List[str]:
+        """Translate paragraphs in a single request, splitting the result back apart.
+        
+        Args:
+            paragraphs (List[str]): Paragraphs to translate
+            
+        Returns:
+            List[str]: One translated paragraph per input paragraph
+        """
+        target_lang = self.translation_config.get("target_language", "en")
+        
+        # Replace paragraph breaks with a special marker before translation
+        translated_text = self.translator.translate_text(' PARAGRAPH_BREAK '.join(paragraphs), target_lang)
+        parts = [part.strip() for part in translated_text.split('PARAGRAPH_BREAK')]
+        if len(parts) == len(paragraphs):
+            return parts
+        
+        # The service mangled the markers; translate paragraphs individually instead
+        return self.translator.batch_translate(paragraphs, target_lang)
+    
     def batch_translate(self, texts: List[str]) -> List[str]:
         """Batch translate multiple texts if translation is enabled.
         
@@ -84,18 +130,214 @@ class BaseSiteParser:
             return texts
         
         try:
-            # Replace newlines with a special marker before translation
-            texts_for_translation = [text.replace('\n\n', ' PARAGRAPH_BREAK ') for text in texts]
-            
-            target_lang = self.translation_config.get("target_language", "en")
-            translated_texts = self.translator.batch_translate(texts_for_translation, target_lang)
-            
-            # Restore newlines after translation
-            return [text.replace(' PARAGRAPH_BREAK ', '\n\n') for text in translated_texts]
+            return self.segment_filter.translate_segments(texts, self._batch_translate_remote)
         except Exception as e:
             print(f"Translation error: {e}")
             return texts
     
+    def _batch_translate_remote(self, texts: List[str]) -> List[str]:
+        """Send texts to the translator as a batch, preserving paragraph breaks.
+        
+        Args:
+            texts (List[str]): List of texts to translate
+            
+        Returns:
+            List[str]: List of translated texts
+        """
+        # Replace newlines with a special marker before translation
+        texts_for_translation = [text.replace('\n\n', ' PARAGRAPH_BREAK ') for text in texts]
+        
+        target_lang = self.translation_config.get("target_language", "en")
+        translated_texts = self.translator.batch_translate(texts_for_translation, target_lang)
+        
+        # Restore newlines after translation
+        return [text.replace(' PARAGRAPH_BREAK ', '\n\n') for text in translated_texts]
+    
+    def batch_translate_headings(self, titles: List[str]) -> List[str]:
+        """Batch translate chapter or arc titles if translation is enabled.
+        
+        Formulaic prefixes such as 第12話 or プロローグ are translated locally and
+        only the remaining subtitle text is sent to the translation service.
+        Titles whose text came back untranslated, e.g. because the service
+        failed, are not memoized and are sent again next time.
+        
+        Args:
+            titles (List[str]): List of titles to translate
+            
+        Returns:
+            List[str]: List of translated titles or original titles
+        """
+        if not self.translator or not self.translation_config.get("enabled", False) or not titles:
+            return titles
+        
+        # Only titles not seen before go to the translator
+        missing = list(dict.fromkeys(title for title in titles if title not in self.heading_cache))
+        if not missing:
+            return [self.heading_cache[title] for title in titles]
+        
+        target_lang = self.translation_config.get("target_language", "en")
+        # Texts returned unchanged, which is how translation failures come back
+        untranslated = set()
+        
+        def translate_batch(texts: List[str]) -> List[str]:
+            translated_texts = self.batch_translate(texts)
+            untranslated.update(text for text, translated_text in zip(texts, translated_texts)
+                                if translated_text == text and needs_translation(text))
+            return translated_texts
+        
+        translated = dict(zip(missing, translate_headings(missing, translate_batch, target_lang)))
+        for title in missing:
+            split = split_heading(title, target_lang)
+            if (title if split is None else split[1]) not in untranslated:
+                self.heading_cache[title] = translated[title]
+        
+        return [self.heading_cache.get(title, translated.get(title, title)) for title in titles]
+
+    def translate_heading(self, title: str) -> str:
+        """Translate a single chapter title, resolving formulaic prefixes locally.
+
+        Args:
+            title (str): Title to translate
+
+        Returns:
+            str: Translated title or original title
+        """
+        if not title:
+            return title
+        return self.batch_translate_headings([title])[0]
+
+    def translate_chapter_titles(self, chapters: List[Chapter]) -> List[Chapter]:
+        """Translate chapter and arc titles in place, only for the given chapters.
+
+        Chapter lists are returned with source titles; callers translate just the
+        chapters they display or export. The source titles are kept under
+        ``source_title`` and ``source_arc``, and chapters that were already
+        translated are skipped.
+
+        Args:
+            chapters (List[Chapter]): Chapters from parse_chapter_list
+
+        Returns:
+            List[Chapter]: The same chapters
+        """
+        if not self.translator or not self.translation_config.get("enabled", False):
+            return chapters
+
+        pending = [chapter for chapter in chapters if 'source_title' not in chapter]
+        if not pending:
+            return chapters
+
+        # Chapter and arc titles go out in a single batch
+        titles = [chapter['title'] for chapter in pending]
+        arcs = [chapter['arc'] for chapter in pending if chapter.get('arc')]
+        translated = dict(zip(titles + arcs, self.batch_translate_headings(titles + arcs)))
+
+        for chapter in pending:
+            chapter['source_title'] = chapter['title']
+            chapter['title'] = translated.get(chapter['title'], chapter['title'])
+            if chapter.get('arc'):
+                chapter['source_arc'] = chapter['arc']
+                chapter['arc'] = translated.get(chapter['arc'], chapter['arc'])
+
+        return chapters
+
+    def extract_ruby_text(self, elem, images: Optional[List[Dict]] = None,
+                          base_url: str = "") -> Tuple[str, List[Tuple[int, int, str]]]:
+        """Extract text from an element with ruby readings kept separate.
+        
+        ``<rt>`` and ``<rp>`` content is left out of the text, so a ruby-annotated
+        word contributes only its base text. Each reading is returned as a span
+        over the base text it annotates.
+        
+        Args:
+            elem: BeautifulSoup element
+            images (List[Dict], optional): If given, ``<img>`` tags are appended to
+                it as {'url', 'alt'} and replaced in the text by an image marker
+            base_url (str): URL that relative image sources are resolved against
+            
+        Returns:
+            Tuple[str, List[Tuple[int, int, str]]]: Base text and (start, end, reading) spans
+        """
+        parts = []
+        spans = []
+        length = 0
+        
+        def walk(node):
+            nonlocal length
+            for child in node.children:
+                if isinstance(child, Comment):
+                    continue
+                if isinstance(child, NavigableString):
+                    parts.append(str(child))
+                    length += len(child)
+                elif child.name in ('rt', 'rp'):
+                    continue
+                elif child.name == 'img':
+                    src = child.get('src') or child.get('data-src')
+                    if images is not None and src:
+                        marker = IMAGE_MARKER.format(len(images))
+                        images.append({'url': urljoin(base_url, src), 'alt': child.get('alt', '')})
+                        parts.append(marker)
+                        length += len(marker)
+                elif child.name == 'ruby':
+                    start = length
+                    walk(child)
+                    reading = ''.join(rt.get_text() for rt in child.find_all('rt')).strip()
+                    if reading and length > start:
+                        spans.append((start, length, reading))
+                else:
+                    walk(child)
+        
+        walk(elem)
+        return ''.join(parts), spans
+    
+    def extract_paragraphs(self, content_elem, images: Optional[List[Dict]] = None,
+                           base_url: str = "") -> Tuple[List[str], List[List[Tuple[int, int, str]]]]:
+        """Extract non-empty paragraphs and their ruby readings from a content element.
+        
+        Uses ``<p>`` tags if present, otherwise splits the element text into lines.
+        Illustrations are collected into ``images`` and left as image markers.
+        
+        Args:
+            content_elem: BeautifulSoup element holding the chapter body
+            images (List[Dict], optional): List the chapter's illustrations are appended to
+            base_url (str): URL that relative image sources are resolved against
+            
+        Returns:
+            Tuple[List[str], List[List[Tuple[int, int, str]]]]: Paragraph base texts and,
+                for each paragraph, its (start, end, reading) ruby spans
+        """
+        found = [] if images is not None else None
+        candidates = [self.extract_ruby_text(p, found, base_url) for p in content_elem.find_all('p')]
+        if not any(text.strip() for text, _ in candidates):
+            # If no <p> tags, get the text directly
+            found = [] if images is not None else None
+            text, spans = self.extract_ruby_text(content_elem, found, base_url)
+            candidates = []
+            offset = 0
+            for line in text.split('\n'):
+                end = offset + len(line)
+                line_spans = [(s - offset, e - offset, r) for s, e, r in spans if offset <= s and e <= end]
+                candidates.append((line, line_spans))
+                offset = end + 1
+        
+        paragraphs = []
+        ruby = []
+        for text, spans in candidates:
+            stripped = text.strip()
+            if not stripped:
+                continue
+            shift = len(text) - len(text.lstrip())
+            paragraphs.append(stripped)
+            ruby.append([
+                (max(0, s - shift), min(len(stripped), e - shift), r)
+                for s, e, r in spans if e - shift > 0 and s - shift < len(stripped)
+            ])
+        
+        if images is not None:
+            images.extend(found)
+        return paragraphs, ruby
+    
     def parse_novel_info(self, soup: BeautifulSoup, url: str) -> Dict:
         """Parse novel information from soup.
         
@@ -108,7 +350,7 @@ class BaseSiteParser:
         """
         raise NotImplementedError("Subclasses must implement this method")
     
-    def parse_chapter_list(self, soup: BeautifulSoup, novel_id: str, base_url: str) -> List[Dict]:
+    def parse_chapter_list(self, soup: BeautifulSoup, novel_id: str, base_url: str) -> List[Chapter]:
         """Parse chapter list from soup.
         
         Args:
@@ -121,17 +363,115 @@ class BaseSiteParser:
         """
         raise NotImplementedError("Subclasses must implement this method")
     
-    def parse_chapter_content(self, soup: BeautifulSoup, url: str) -> Dict:
-        """Parse chapter content from soup.
+    def parse_chapter_content(self, soup: BeautifulSoup, url: str, chapter_title: str = None) -> Chapter:
+        """Parse chapter content from soup, translated if translation is enabled.
+        
+        Args:
+            soup (BeautifulSoup): Parsed HTML
+            url (str): Chapter URL
+            chapter_title (str, optional): Source title from the chapter list
+            
+        Returns:
+            Chapter: Chapter content and metadata
+        """
+        return self.translate_chapter(self.extract_chapter_content(soup, url, chapter_title))
+    
+    def extract_chapter_content(self, soup: BeautifulSoup, url: str, chapter_title: str = None) -> Chapter:
+        """Parse the untranslated chapter content from soup.
         
         Args:
             soup (BeautifulSoup): Parsed HTML
             url (str): Chapter URL
+            chapter_title (str, optional): Source title from the chapter list
             
         Returns:
-            dict: Chapter content and metadata
+            Chapter: Chapter content and metadata
         """
         raise NotImplementedError("Subclasses must implement this method")
+    
+    def source_chapter(self, title: str, content_elem, url: str) -> Chapter:
+        """Build an untranslated chapter from its title and content element.
+        
+        Args:
+            title (str): Chapter title
+            content_elem: Element holding the chapter text, or None if the page has none
+            url (str): Chapter URL
+            
+        Returns:
+            Chapter: Chapter with its content, ruby readings and illustrations
+        """
+        content = ""
+        ruby = []
+        images = []
+        if content_elem:
+            # Ruby readings are kept apart so only base text is translated
+            paragraphs, ruby = self.extract_paragraphs(content_elem, images, url)
+            content = '\n\n'.join(paragraphs)
+        
+        chapter = Chapter(title=title, url=url, content=content or NO_CONTENT)
+        if any(ruby):
+            chapter.ruby = ruby
+        if images:
+            chapter.images = images
+        return chapter
+    
+    def translate_chapter(self, chapter: Chapter) -> Chapter:
+        """Translate a chapter's title and content in place if translation is enabled.
+        
+        The content is translated in chunks of about ``chunk_limit`` characters,
+        split at paragraph boundaries. A chunk that fails to translate is kept
+        in the original language.
+        
+        Args:
+            chapter (Chapter): Chapter from extract_chapter_content
+            
+        Returns:
+            Chapter: The same chapter
+        """
+        if not self.translation_config.get("enabled", False):
+            return chapter
+        
+        # Always try to translate the title
+        try:
+            chapter.title = self.translate_heading(chapter.title)
+        except Exception as e:
+            print(f"Title translation error: {e}")
+            # Keep original title if translation fails
+        
+        content = chapter.content
+        if content == NO_CONTENT or not self.translation_config.get("translate_content", True):
+            return chapter
+        
+        # Create chunks of approximately chunk_limit characters
+        chunks = []
+        current_chunk = []
+        current_length = 0
+        for paragraph in content.split('\n\n'):
+            # If adding this paragraph would exceed the limit, save the current chunk
+            if current_length + len(paragraph) + 2 > self.chunk_limit and current_chunk:  # +2 for '\n\n'
+                chunks.append('\n\n'.join(current_chunk))
+                current_chunk = []
+                current_length = 0
+            current_chunk.append(paragraph)
+            current_length += len(paragraph) + 2
+        if current_chunk:
+            chunks.append('\n\n'.join(current_chunk))
+        
+        # Translate each chunk separately
+        translated_chunks = []
+        for chunk in chunks:
+            try:
+                translated_chunks.append(self.translate_text(chunk))
+                if self.chunk_delay:
+                    time.sleep(self.chunk_delay)
+            except Exception as e:
+                print(f"Chunk translation error: {e}")
+                translated_chunks.append(chunk)  # Keep original chunk if translation fails
+        
+        chapter.content = '\n\n'.join(translated_chunks)
+        # Readings only line up with the source text, so drop them once translated
+        chapter.ruby = None
+        return chapter
 
 
 class NcodeParser(BaseSiteParser):
@@ -196,109 +536,35 @@ class NcodeParser(BaseSiteParser):
             'metadata': metadata
         }
     
-    def parse_chapter_list(self, soup: BeautifulSoup, novel_id: str, base_url: str) -> List[Dict]:
+    def parse_chapter_list(self, soup: BeautifulSoup, novel_id: str, base_url: str) -> List[Chapter]:
         chapters = []
         chapter_elems = soup.select('.novel_sublist2')
-        chapter_titles = []
         
         for index, chapter in enumerate(chapter_elems, 1):
             link = chapter.select_one('a')
             if link:
                 title = link.text.strip()
-                chapter_titles.append(title)
                 href = link.get('href')
                 # Extract chapter number from href if possible
                 chapter_num = href.split('/')[-1] if href else str(index)
                 
-                chapters.append({
-                    'index': index,
-                    'title': title,  # Will be replaced with translated title
-                    'chapter_num': chapter_num,
-                    'url': f"{base_url}{href}" if href and href.startswith('/') else None
-                })
-        
-        # Translate all chapter titles at once if enabled
-        if self.translation_config.get("enabled", False) and chapter_titles:
-            translated_titles = self.batch_translate(chapter_titles)
-            for i, translated_title in enumerate(translated_titles):
-                if i < len(chapters):
-                    chapters[i]['title'] = translated_title
+                chapters.append(Chapter(
+                    index=index,
+                    title=title,  # Translated on demand by translate_chapter_titles
+                    chapter_num=chapter_num,
+                    url=f"{base_url}{href}" if href and href.startswith('/') else None
+                ))
         
         return chapters
     
-    def parse_chapter_content(self, soup: BeautifulSoup, url: str) -> Dict:
+    def extract_chapter_content(self, soup: BeautifulSoup, url: str, chapter_title: str = None) -> Chapter:
         # Extract chapter title
         title_elem = soup.select_one('.novel_subtitle')
-        title = title_elem.text.strip() if title_elem else "Unknown Chapter"
+        title = title_elem.text.strip() if title_elem else (chapter_title or "Unknown Chapter")
         
         # Extract chapter content
         content_elem = soup.select_one('#novel_honbun')
-        content = ""
-        chunks = []
-        
-        if content_elem:
-            paragraphs = [p.text.strip() for p in content_elem.find_all('p') if p.text.strip()]
-            if not paragraphs:  # If no <p> tags, get the text directly
-                paragraphs = [line.strip() for line in content_elem.text.split('\n') if line.strip()]
-            
-            # Create chunks of approximately 1000 characters
-            current_chunk = []
-            current_length = 0
-            chunk_limit = 1000
-            
-            for paragraph in paragraphs:
-                # If adding this paragraph would exceed the limit, save the current chunk
-                if current_length + len(paragraph) + 2 > chunk_limit and current_chunk:  # +2 for '\n\n'
-                    chunks.append('\n\n'.join(current_chunk))
-                    current_chunk = []
-                    current_length = 0
-                
-                # Add paragraph to current chunk
-                current_chunk.append(paragraph)
-                current_length += len(paragraph) + 2  # +2 for '\n\n'
-            
-            # Add the last chunk if it's not empty
-            if current_chunk:
-                chunks.append('\n\n'.join(current_chunk))
-            
-            # Join all paragraphs for the full content
-            content = '\n\n'.join(paragraphs)
-        
-        # Apply translation if enabled
-        if self.translation_config.get("enabled", False):
-            # Always try to translate the title
-            try:
-                title = self.translate_text(title)
-            except Exception as e:
-                print(f"Title translation error: {e}")
-                # Keep original title if translation fails
-            
-            # Try to translate content chunks if available
-            if chunks and self.translation_config.get("translate_content", True):
-                try:
-                    # Translate each chunk separately
-                    translated_chunks = []
-                    for chunk in chunks:
-                        try:
-                            chunk_translated = self.translate_text(chunk)
-                            translated_chunks.append(chunk_translated)
-                        except Exception as e:
-                            print(f"Chunk translation error: {e}")
-                            translated_chunks.append(chunk)  # Keep original chunk if translation fails
-                    
-                    chunks = translated_chunks
-                    # Combine translated chunks for full content
-                    content = '\n\n'.join(chunks)
-                except Exception as e:
-                    print(f"Content translation error: {e}")
-                    # Keep original content if translation fails
-        
-        return {
-            'title': title,
-            'url': url,
-            'content': content or "No content available",
-            'chunks': chunks or ["No content available"]
-        }
+        return self.source_chapter(title, content_elem, url)
 
 
 class Novel18Parser(BaseSiteParser):
@@ -356,108 +622,34 @@ class Novel18Parser(BaseSiteParser):
             'metadata': metadata
         }
     
-    def parse_chapter_list(self, soup: BeautifulSoup, novel_id: str, base_url: str) -> List[Dict]:
+    def parse_chapter_list(self, soup: BeautifulSoup, novel_id: str, base_url: str) -> List[Chapter]:
         chapters = []
         chapter_elems = soup.select('.novel_sublist2')
-        chapter_titles = []
         
         for index, chapter in enumerate(chapter_elems, 1):
             link = chapter.select_one('a')
             if link:
                 title = link.text.strip()
-                chapter_titles.append(title)
                 href = link.get('href')
                 # Extract chapter number from href if possible
                 chapter_num = href.split('/')[-1] if href else str(index)
                 
-                chapters.append({
-                    'index': index,
-                    'title': title,  # Will be replaced with translated title
-                    'chapter_num': chapter_num,
-                    'url': f"{base_url}{href}" if href and href.startswith('/') else None
-                })
-        
-        # Translate all chapter titles at once if enabled
-        if self.translation_config.get("enabled", False) and chapter_titles:
-            translated_titles = self.batch_translate(chapter_titles)
-            for i, translated_title in enumerate(translated_titles):
-                if i < len(chapters):
-                    chapters[i]['title'] = translated_title
+                chapters.append(Chapter(
+                    index=index,
+                    title=title,  # Translated on demand by translate_chapter_titles
+                    chapter_num=chapter_num,
+                    url=f"{base_url}{href}" if href and href.startswith('/') else None
+                ))
         
         return chapters
     
-    def parse_chapter_content(self, soup: BeautifulSoup, url: str) -> Dict:
+    def extract_chapter_content(self, soup: BeautifulSoup, url: str, chapter_title: str = None) -> Chapter:
         # Similar to NcodeParser but might have different elements
         title_elem = soup.select_one('.novel_subtitle')
-        title = title_elem.text.strip() if title_elem else "Unknown Chapter"
+        title = title_elem.text.strip() if title_elem else (chapter_title or "Unknown Chapter")
         
         content_elem = soup.select_one('#novel_honbun')
-        content = ""
-        chunks = []
-        
-        if content_elem:
-            paragraphs = [p.text.strip() for p in content_elem.find_all('p') if p.text.strip()]
-            if not paragraphs:
-                paragraphs = [line.strip() for line in content_elem.text.split('\n') if line.strip()]
-            
-            # Create chunks of approximately 1000 characters
-            current_chunk = []
-            current_length = 0
-            chunk_limit = 1000
-            
-            for paragraph in paragraphs:
-                # If adding this paragraph would exceed the limit, save the current chunk
-                if current_length + len(paragraph) + 2 > chunk_limit and current_chunk:  # +2 for '\n\n'
-                    chunks.append('\n\n'.join(current_chunk))
-                    current_chunk = []
-                    current_length = 0
-                
-                # Add paragraph to current chunk
-                current_chunk.append(paragraph)
-                current_length += len(paragraph) + 2  # +2 for '\n\n'
-            
-            # Add the last chunk if it's not empty
-            if current_chunk:
-                chunks.append('\n\n'.join(current_chunk))
-            
-            # Join all paragraphs for the full content
-            content = '\n\n'.join(paragraphs)
-        
-        # Apply translation if enabled
-        if self.translation_config.get("enabled", False):
-            # Always try to translate the title
-            try:
-                title = self.translate_text(title)
-            except Exception as e:
-                print(f"Title translation error: {e}")
-                # Keep original title if translation fails
-            
-            # Try to translate content chunks if available
-            if chunks and self.translation_config.get("translate_content", True):
-                try:
-                    # Translate each chunk separately
-                    translated_chunks = []
-                    for chunk in chunks:
-                        try:
-                            chunk_translated = self.translate_text(chunk)
-                            translated_chunks.append(chunk_translated)
-                        except Exception as e:
-                            print(f"Chunk translation error: {e}")
-                            translated_chunks.append(chunk)  # Keep original chunk if translation fails
-                    
-                    chunks = translated_chunks
-                    # Combine translated chunks for full content
-                    content = '\n\n'.join(chunks)
-                except Exception as e:
-                    print(f"Content translation error: {e}")
-                    # Keep original content if translation fails
-        
-        return {
-            'title': title,
-            'url': url,
-            'content': content or "No content available",
-            'chunks': chunks or ["No content available"]
-        }
+        return self.source_chapter(title, content_elem, url)
 
 
 class MobileParser(BaseSiteParser):
@@ -492,111 +684,40 @@ class MobileParser(BaseSiteParser):
             'metadata': metadata
         }
     
-    def parse_chapter_list(self, soup: BeautifulSoup, novel_id: str, base_url: str) -> List[Dict]:
+    def parse_chapter_list(self, soup: BeautifulSoup, novel_id: str, base_url: str) -> List[Chapter]:
         chapters = []
         chapter_elems = soup.select('.chapter_title')
-        chapter_titles = []
         
         for index, chapter in enumerate(chapter_elems, 1):
             link = chapter.select_one('a') or chapter
             if hasattr(link, 'get') and link.get('href'):
                 title = link.text.strip()
-                chapter_titles.append(title)
                 href = link.get('href')
                 # Extract chapter number from href if possible
                 chapter_num = href.split('/')[-1] if href else str(index)
                 
-                chapters.append({
-                    'index': index,
-                    'title': title,  # Will be replaced with translated title
-                    'chapter_num': chapter_num,
-                    'url': f"{base_url}{href}" if href and href.startswith('/') else None
-                })
-        
-        # Translate all chapter titles at once if enabled
-        if self.translation_config.get("enabled", False) and chapter_titles:
-            translated_titles = self.batch_translate(chapter_titles)
-            for i, translated_title in enumerate(translated_titles):
-                if i < len(chapters):
-                    chapters[i]['title'] = translated_title
+                chapters.append(Chapter(
+                    index=index,
+                    title=title,  # Translated on demand by translate_chapter_titles
+                    chapter_num=chapter_num,
+                    url=f"{base_url}{href}" if href and href.startswith('/') else None
+                ))
         
         return chapters
     
-    def parse_chapter_content(self, soup: BeautifulSoup, url: str) -> Dict:
+    def extract_chapter_content(self, soup: BeautifulSoup, url: str, chapter_title: str = None) -> Chapter:
         title_elem = soup.select_one('h1')
-        title = title_elem.text.strip() if title_elem else "Unknown Chapter"
+        title = title_elem.text.strip() if title_elem else (chapter_title or "Unknown Chapter")
         
         content_elem = soup.select_one('.novel_content')
-        content = ""
-        chunks = []
-        
-        if content_elem:
-            paragraphs = [p.text.strip() for p in content_elem.find_all('p') if p.text.strip()]
-            if not paragraphs:
-                paragraphs = [line.strip() for line in content_elem.text.split('\n') if line.strip()]
-            
-            # Create chunks of approximately 1000 characters
-            current_chunk = []
-            current_length = 0
-            chunk_limit = 1000
-            
-            for paragraph in paragraphs:
-                # If adding this paragraph would exceed the limit, save the current chunk
-                if current_length + len(paragraph) + 2 > chunk_limit and current_chunk:  # +2 for '\n\n'
-                    chunks.append('\n\n'.join(current_chunk))
-                    current_chunk = []
-                    current_length = 0
-                
-                # Add paragraph to current chunk
-                current_chunk.append(paragraph)
-                current_length += len(paragraph) + 2  # +2 for '\n\n'
-            
-            # Add the last chunk if it's not empty
-            if current_chunk:
-                chunks.append('\n\n'.join(current_chunk))
-            
-            # Join all paragraphs for the full content
-            content = '\n\n'.join(paragraphs)
-        
-        # Apply translation if enabled
-        if self.translation_config.get("enabled", False):
-            # Always try to translate the title
-            try:
-                title = self.translate_text(title)
-            except Exception as e:
-                print(f"Title translation error: {e}")
-                # Keep original title if translation fails
-            
-            # Try to translate content chunks if available
-            if chunks and self.translation_config.get("translate_content", True):
-                try:
-                    # Translate each chunk separately
-                    translated_chunks = []
-                    for chunk in chunks:
-                        try:
-                            chunk_translated = self.translate_text(chunk)
-                            translated_chunks.append(chunk_translated)
-                        except Exception as e:
-                            print(f"Chunk translation error: {e}")
-                            translated_chunks.append(chunk)  # Keep original chunk if translation fails
-                    
-                    chunks = translated_chunks
-                    # Combine translated chunks for full content
-                    content = '\n\n'.join(chunks)
-                except Exception as e:
-                    print(f"Content translation error: {e}")
-                    # Keep original content if translation fails
-        
-        return {
-            'title': title,
-            'url': url,
-            'content': content or "No content available",
-            'chunks': chunks or ["No content available"]
-        }
+        return self.source_chapter(title, content_elem, url)
 
 
 class HamelnParser(BaseSiteParser):
     """Parser for syosetu.org (Hameln)."""
+    
+    chunk_delay = 5  # Wait 5 seconds between chunks
+    
     def parse_novel_info(self, soup: BeautifulSoup, url: str) -> Dict:
         # Extract novel title
         title_elem = soup.select_one('span[itemprop="name"]')        
@@ -644,11 +765,9 @@ class HamelnParser(BaseSiteParser):
             'metadata': metadata
         }
     
-    def parse_chapter_list(self, soup: BeautifulSoup, novel_id: str, base_url: str) -> List[Dict]:
+    def parse_chapter_list(self, soup: BeautifulSoup, novel_id: str, base_url: str) -> List[Chapter]:
         chapters = []
         current_arc = ""
-        chapter_titles = []
-        arc_titles = []
         
         # Find all story sections within .ss tables
         story_tables = soup.select('div.ss table')
@@ -658,7 +777,6 @@ class HamelnParser(BaseSiteParser):
             arc_row = table.select_one('tr td strong')
             if arc_row:
                 current_arc = arc_row.text.strip()
-                arc_titles.append(current_arc)
                 continue
                 
             # Get chapter rows
@@ -668,7 +786,6 @@ class HamelnParser(BaseSiteParser):
                 link = row.select_one('a')
                 if link:
                     title = link.text.strip()
-                    chapter_titles.append(title)
                     href = link.get('href')
                     # Extract chapter number from href if possible
                     match = re.search(r'(\d+)\.html$', href) if href else None
@@ -678,37 +795,18 @@ class HamelnParser(BaseSiteParser):
                     date_elem = row.select_one('time')
                     publish_date = date_elem.get('datetime') if date_elem else None
                     
-                    chapters.append({
-                        'index': index,
-                        'title': title,  # Will be replaced with translated title
-                        'chapter_num': chapter_num,
-                        'url': None,  # Will be formatted by the main class
-                        'arc': current_arc,  # Will be replaced with translated arc
-                        'publish_date': publish_date
-                    })
-        
-        # Translate all titles at once if enabled
-        if self.translation_config.get("enabled", False):
-            # Translate arc titles
-            if arc_titles:
-                translated_arcs = self.batch_translate(arc_titles)
-                arc_map = dict(zip(arc_titles, translated_arcs))
-                
-                # Update arc titles in chapters
-                for chapter in chapters:
-                    if chapter['arc'] in arc_map:
-                        chapter['arc'] = arc_map[chapter['arc']]
-            
-            # Translate chapter titles
-            if chapter_titles:
-                translated_titles = self.batch_translate(chapter_titles)
-                for i, translated_title in enumerate(translated_titles):
-                    if i < len(chapters):
-                        chapters[i]['title'] = translated_title
+                    chapters.append(Chapter(
+                        index=index,
+                        title=title,  # Translated on demand by translate_chapter_titles
+                        chapter_num=chapter_num,
+                        url=None,  # Will be formatted by the main class
+                        arc=current_arc,  # Translated on demand by translate_chapter_titles
+                        publish_date=publish_date
+                    ))
         
-        return chapters    
+        return chapters
     
-    def parse_chapter_content(self, soup: BeautifulSoup, url: str, chapter_title: str = None) -> Dict:
+    def extract_chapter_content(self, soup: BeautifulSoup, url: str, chapter_title: str = None) -> Chapter:
         # Use provided chapter title if available, otherwise extract from page
         if chapter_title:
             title = chapter_title
@@ -717,81 +815,13 @@ class HamelnParser(BaseSiteParser):
             title_elem = soup.select_one('p span[style="font-size:120%"] a')
             if not title_elem:
                 title_elem = soup.select_one('span[style="font-size:120%"]')
-            title = title_elem.text.strip() if title_elem else "Unknown Chapter"
+            title = title_elem.text.strip() if title_elem else (chapter_title or "Unknown Chapter")
         
         # Extract chapter content
         content_elem = soup.select_one('#novel_content')
         if not content_elem:
             content_elem = soup.select_one('#honbun')
-        content = ""
-        chunks = []
-        
-        if content_elem:
-            paragraphs = [p.text.strip() for p in content_elem.find_all('p') if p.text.strip()]
-            if not paragraphs:  # If no <p> tags, get the text directly
-                paragraphs = [line.strip() for line in content_elem.text.split('\n') if line.strip()]
-            
-            # Create chunks of approximately 1000 characters
-            current_chunk = []
-            current_length = 0
-            chunk_limit = 1000
-            
-            for paragraph in paragraphs:
-                # If adding this paragraph would exceed the limit, save the current chunk
-                if current_length + len(paragraph) + 2 > chunk_limit and current_chunk:  # +2 for '\n\n'
-                    chunks.append('\n\n'.join(current_chunk))
-                    current_chunk = []
-                    current_length = 0
-                
-                # Add paragraph to current chunk
-                current_chunk.append(paragraph)
-                current_length += len(paragraph) + 2  # +2 for '\n\n'
-            
-            # Add the last chunk if it's not empty
-            if current_chunk:
-                chunks.append('\n\n'.join(current_chunk))
-            
-            # Join all paragraphs for the full content
-            content = '\n\n'.join(paragraphs)
-        
-        # Apply translation if enabled
-        if self.translation_config.get("enabled", False):
-            # Always try to translate the title
-            try:
-                title = self.translate_text(title)
-            except Exception as e:
-                print(f"Title translation error: {e}")
-                # Keep original title if translation fails
-            
-            # Try to translate content chunks if available
-            if chunks and self.translation_config.get("translate_content", True):
-                try:
-                    # Translate each chunk separately
-                    translated_chunks = []
-                    for chunk in chunks:
-                        try:
-                            chunk_translated = self.translate_text(chunk)
-                            translated_chunks.append(chunk_translated)
-                            time.sleep(5) # Wait 5 seconds between chunks
-                            # print('chunk translated : ', chunk_translated)
-
-                        except Exception as e:
-                            print(f"Chunk translation error: {e}")
-                            translated_chunks.append(chunk)  # Keep original chunk if translation fails
-                    
-                    chunks = translated_chunks
-                    # Combine translated chunks for full content
-                    content = '\n\n'.join(chunks)
-                except Exception as e:
-                    print(f"Content translation error: {e}")
-                    # Keep original content if translation fails
-        
-        return {
-            'title': title,
-            'url': url,
-            'content': content or "No content available",
-            'chunks': chunks or ["No content available"]
-        }
+        return self.source_chapter(title, content_elem, url)
 
 
 # Factory function to get the appropriate parser
@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""ImageFetcher against illustrations served by the mock server."""
+
+import io
+import os
+
+import pytest
+import requests
+
+from images import ImageFetcher, sniff_image_format
+from mock_server import MockServer
+
+
+def make_image(image_format: str, size=(64, 48), mode: str = 'RGB') -> bytes:
+    """Encode a noisy test picture, so JPEG recompression has something to do."""
+    Image = pytest.importorskip("PIL.Image")
+    image = Image.effect_noise(size, 64).convert(mode)
+    output = io.BytesIO()
+    image.save(output, image_format, **({'quality': 100} if image_format == 'JPEG' else {}))
+    return output.getvalue()
+
+
+@pytest.fixture
+def server():
+    with MockServer(chapters=1) as server:
+        yield server
+
+
+@pytest.fixture
+def fetcher_factory(tmp_path):
+    fetchers = []
+
+    def create(**kwargs):
+        fetcher = ImageFetcher(requests.Session(), workers=2, directory=str(tmp_path / "image_cache"), **kwargs)
+        fetchers.append(fetcher)
+        return fetcher
+
+    yield create
+    for fetcher in fetchers:
+        fetcher.close()
+
+
+def test_image_is_downloaded_once_per_run(server, fetcher_factory):
+    url = server.add_image("cover.png", make_image('PNG'), "image/png")
+    fetcher = fetcher_factory()
+
+    first = fetcher.fetch_all([url, url])[url]
+    second = fetcher.fetch_all([url])[url]
+
+    assert first['media_type'] == "image/png"
+    assert os.path.isfile(first['path'])
+    assert second == first
+    assert server.stats["images"] == 1
+    assert fetcher.stats["downloaded"] == 1
+    assert fetcher.stats["cached"] == 1
+
+
+def test_cache_is_reused_across_runs(server, fetcher_factory):
+    url = server.add_image("cover.png", make_image('PNG'), "image/png")
+    first = fetcher_factory().fetch_all([url])[url]
+
+    fetcher = fetcher_factory()
+    second = fetcher.fetch_all([url])[url]
+
+    assert second == first
+    assert server.stats["images"] == 1
+    assert fetcher.stats["cached"] == 1
+
+
+def test_same_picture_under_two_urls_is_stored_once(server, fetcher_factory, tmp_path):
+    data = make_image('PNG')
+    urls = [server.add_image("a.png", data, "image/png"), server.add_image("b.png", data, "image/png")]
+
+    records = fetcher_factory().fetch_all(urls)
+
+    assert records[urls[0]]['file_name'] == records[urls[1]]['file_name']
+    assert [name for name in os.listdir(tmp_path / "image_cache") if name != "index.json"] == \
+        [records[urls[0]]['file_name']]
+
+
+def test_failed_download_is_not_retried(server, fetcher_factory):
+    url = f"{server.url}/images/missing.jpg"
+    fetcher = fetcher_factory()
+
+    assert fetcher.fetch_all([url]) == {url: None}
+    assert fetcher.fetch_all([url]) == {url: None}
+    assert server.stats["not_found"] == 1
+    assert fetcher.stats["failed"] == 1
+    assert url not in fetcher.index
+
+
+def test_response_that_is_not_an_image_fails(server, fetcher_factory):
+    url = server.add_image("error.jpg", b"<html>Forbidden</html>", "text/html")
+    fetcher = fetcher_factory()
+
+    assert fetcher.fetch_all([url]) == {url: None}
+    assert fetcher.stats["failed"] == 1
+
+
+def test_resolve_keeps_illustrations_that_failed(server, fetcher_factory):
+    url = server.add_image("cover.png", make_image('PNG'), "image/png")
+    images = [{'url': url, 'alt': "cover"}, {'url': f"{server.url}/images/missing.png", 'alt': "gone"}]
+
+    resolved = fetcher_factory().resolve(images)
+
+    assert resolved[0]['media_type'] == "image/png"
+    assert resolved[1] == images[1]
+
+
+def test_large_jpeg_is_downscaled_and_recompressed(server, fetcher_factory):
+    Image = pytest.importorskip("PIL.Image")
+    data = make_image('JPEG', size=(1200, 800))
+    url = server.add_image("large.jpg", data)
+
+    record = fetcher_factory(max_dimension=600, jpeg_quality=70).fetch_all([url])[url]
+
+    with open(record['path'], 'rb') as f:
+        stored = f.read()
+    assert sniff_image_format(stored) == 'JPEG'
+    assert len(stored) < len(data)
+    with Image.open(io.BytesIO(stored)) as image:
+        assert image.size == (600, 400)
+
+
+def test_large_transparent_png_stays_png(server, fetcher_factory):
+    Image = pytest.importorskip("PIL.Image")
+    url = server.add_image("large.png", make_image('PNG', size=(800, 400), mode='RGBA'), "image/png")
+
+    record = fetcher_factory(max_dimension=200).fetch_all([url])[url]
+
+    assert record['media_type'] == "image/png"
+    with Image.open(record['path']) as image:
+        assert image.size == (200, 100)
+        assert image.mode == 'RGBA'
+
+
+def test_small_image_is_stored_unchanged(server, fetcher_factory):
+    data = make_image('JPEG')
+    url = server.add_image("small.jpg", data)
+
+    record = fetcher_factory(max_dimension=600).fetch_all([url])[url]
+
+    with open(record['path'], 'rb') as f:
+        assert f.read() == data
+
+
+def test_webp_is_converted_for_epub_readers(server, fetcher_factory):
+    data = make_image('WEBP')
+    url = server.add_image("small.webp", data, "image/webp")
+
+    record = fetcher_factory().fetch_all([url])[url]
+
+    assert record['media_type'] in ("image/jpeg", "image/png")
@@ -3,11 +3,17 @@
 
 import time
 import sys
+import copy
+import logging
+import threading
 import subprocess
+import collections
 import concurrent.futures
 from typing import Dict, List, Optional, Union, Any
 from abc import ABC, abstractmethod
 
+from metrics import TRANSLATE_SECONDS, TRANSLATED_CHARS, TRANSLATION_ERRORS, RETRIES
+
 # Try to import deep-translator, install if not available
 try:
     from deep_translator import GoogleTranslator
@@ -44,6 +50,37 @@ if DEEP_TRANSLATOR_AVAILABLE:
         # Some translators might not be available in older versions
         pass
 
+logger = logging.getLogger('syosetu_scraper')
+
+# deep-translator client class of each service
+SERVICE_CLIENTS = {
+    "google": "GoogleTranslator",
+    "deepl": "DeepL",
+    "mymemory": "MyMemoryTranslator",
+    "linguee": "LingueeTranslator",
+    "pons": "PonsTranslator",
+    "libre": "LibreTranslator",
+    "microsoft": "MicrosoftTranslator",
+    "qcri": "QcriTranslator",
+    "papago": "PapagoTranslator",
+    "yandex": "YandexTranslator",
+    "chatgpt": "ChatGptTranslator"
+}
+
+# Services that can't be used without an API key
+API_KEY_SERVICES = ("deepl", "microsoft", "qcri", "papago", "yandex", "chatgpt")
+
+
+def _unavailable_reason(service: str, api_key: Optional[str]) -> str:
+    """Why a translation service can't be set up."""
+    if service not in SERVICE_CLIENTS:
+        return "unknown service"
+    if SERVICE_CLIENTS[service] not in globals():
+        return "not available in the installed deep-translator"
+    if service in API_KEY_SERVICES and not api_key:
+        return "no API key"
+    return "not available"
+
 
 class BaseTranslator(ABC):
     """Base class for translation services."""
@@ -57,14 +94,31 @@ class BaseTranslator(ABC):
     def batch_translate(self, texts: List[str], target_language: str = "en") -> List[str]:
         """Translate multiple texts at once."""
         pass
+    
+    def close(self):
+        """Release threads or connections held by the translator."""
+        pass
+    
+    def __enter__(self) -> 'BaseTranslator':
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
 
 
 class DeepTranslator(BaseTranslator):
     """Unified translator using deep-translator library."""
     
     def __init__(self, service: str = "google", api_key: Optional[str] = None, target_language: str = "en", 
-                 concurrent_requests: int = 3, request_delay: float = 0.1, max_retries: int = 3):
-        """Initialize translator with specified service."""
+                 concurrent_requests: int = 3, request_delay: float = 0.1, max_retries: int = 3,
+                 service_url: Optional[str] = None, fallback_to_google: bool = True):
+        """Initialize translator with specified service.
+        
+        ``service_url`` replaces the service's default endpoint, e.g. with a
+        proxy or a local stub speaking the same protocol. A service that is
+        unknown or lacks its API key is replaced by Google Translate, or with
+        ``fallback_to_google`` off, left unavailable (``translator`` is None).
+        """
         self.service = service.lower()
         self.api_key = api_key
         self.translator = None
@@ -72,6 +126,8 @@ class DeepTranslator(BaseTranslator):
         self.concurrent_requests = concurrent_requests
         self.request_delay = request_delay
         self.max_retries = max_retries
+        # Per-thread copies of the client, see _client
+        self.local = threading.local()
         
         if not DEEP_TRANSLATOR_AVAILABLE:
             print("Warning: deep-translator library not available. Translation will not work.")
@@ -101,16 +157,79 @@ class DeepTranslator(BaseTranslator):
             elif self.service == "chatgpt" and api_key and 'ChatGptTranslator' in globals():
                 self.translator = ChatGptTranslator(api_key=api_key, target=target_language)
             else:
+                reason = _unavailable_reason(self.service, api_key)
+                if not fallback_to_google:
+                    print(f"Warning: skipping translation service '{service}' ({reason})")
+                    return
                 # Default to Google if service not recognized or not available
-                print(f"Using Google Translate as fallback")
+                print(f"Using Google Translate as fallback for '{service}' ({reason})")
                 self.translator = GoogleTranslator(source="auto", target=target_language)
+                self.service = "google"
+                # The endpoint was meant for the other service
+                service_url = None
         except Exception as e:
             print(f"Error initializing translator: {e}")
+            if not fallback_to_google:
+                self.translator = None
+                return
             # Fallback to Google
             try:
                 self.translator = GoogleTranslator(source="auto", target=target_language)
+                self.service = "google"
+                service_url = None
             except:
                 self.translator = None
+        
+        if service_url and self.translator is not None:
+            if hasattr(self.translator, "_base_url"):
+                self.translator._base_url = service_url
+            else:
+                print(f"Warning: the {self.service} client has no endpoint to replace; ignoring {service_url}")
+    
+    def translate_once(self, text: str, target_language: str = "en") -> str:
+        """Translate text with a single attempt, raising on failure."""
+        if not self.translator:
+            raise RuntimeError(f"Translator '{self.service}' is not available")
+        
+        client = self._client()
+        
+        # Set target language
+        if hasattr(client, "target"):
+            client.target = target_language
+        
+        # Handle text length limitations
+        if len(text) > 5000:  # Most services have limits around 5000 chars
+            parts = []
+            for i in range(0, len(text), 4000):  # Split with some overlap
+                part = text[i:i+4000]
+                parts.append(self._request(client, part))
+            return "".join(parts)
+        return self._request(client, text)
+    
+    def _client(self):
+        """This thread's copy of the deep-translator client.
+        
+        The clients keep the text being translated in their query parameters,
+        so concurrent requests through one client can return each other's
+        translations.
+        """
+        client = getattr(self.local, "client", None)
+        if client is None:
+            client = copy.copy(self.translator)
+            if isinstance(getattr(client, "_url_params", None), dict):
+                client._url_params = dict(client._url_params)
+            self.local.client = client
+        return client
+    
+    def _request(self, client, text: str) -> str:
+        """Send one request to the service, recording its latency and outcome."""
+        TRANSLATED_CHARS.inc(len(text), service=self.service)
+        try:
+            with TRANSLATE_SECONDS.time(service=self.service):
+                return client.translate(text)
+        except Exception:
+            TRANSLATION_ERRORS.inc(service=self.service)
+            raise
     
     def translate_text(self, text: str, target_language: str = "en") -> str:
         """Translate text using selected service."""
@@ -120,22 +239,11 @@ class DeepTranslator(BaseTranslator):
         retries = 0
         while retries <= self.max_retries:
             try:
-                # Set target language
-                if hasattr(self.translator, "target"):
-                    self.translator.target = target_language
-                
-                # Handle text length limitations
-                if len(text) > 5000:  # Most services have limits around 5000 chars
-                    parts = []
-                    for i in range(0, len(text), 4000):  # Split with some overlap
-                        part = text[i:i+4000]
-                        parts.append(self.translator.translate(part))
-                    return "".join(parts)
-                else:
-                    return self.translator.translate(text)
+                return self.translate_once(text, target_language)
             except Exception as e:
                 retries += 1
                 if retries <= self.max_retries:
+                    RETRIES.inc(operation="translate")
                     print(f"Translation error: {e}. Retrying in 5 seconds... (Attempt {retries}/{self.max_retries})")
                     time.sleep(5)  # Wait 5 seconds before retrying
                 else:
@@ -146,41 +254,223 @@ class DeepTranslator(BaseTranslator):
         """Translate multiple texts concurrently."""
         if not texts or not self.translator:
             return texts
+        return _batch_translate(self.translate_text, texts, target_language,
+                                self.concurrent_requests, self.request_delay)
+
+
+class BackendHealth:
+    """Rolling latency and error statistics for a single translation backend."""
+    
+    def __init__(self, window: int = 50, failure_threshold: int = 3, cooldown: float = 60.0):
+        self.latencies = collections.deque(maxlen=window)
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.consecutive_failures = 0
+        self.demoted_until = 0.0
+        self.successes = 0
+        self.failures = 0
+        self.hedges = 0
+        self.lock = threading.Lock()
+    
+    def record_success(self, latency: float):
+        """Record a successful call and its latency."""
+        with self.lock:
+            self.latencies.append(latency)
+            self.successes += 1
+            self.consecutive_failures = 0
+            self.demoted_until = 0.0
+    
+    def record_failure(self):
+        """Record a failed call, demoting the backend after repeated failures."""
+        with self.lock:
+            self.failures += 1
+            self.consecutive_failures += 1
+            if self.consecutive_failures >= self.failure_threshold:
+                self.demoted_until = time.monotonic() + self.cooldown
+    
+    def is_healthy(self) -> bool:
+        """Whether the backend is currently eligible as a primary."""
+        return time.monotonic() >= self.demoted_until
+    
+    def latency_percentile(self, percentile: float) -> Optional[float]:
+        """Return the given latency percentile (0-1), or None without enough samples."""
+        with self.lock:
+            samples = sorted(self.latencies)
+        if not samples:
+            return None
+        index = min(len(samples) - 1, int(round(percentile * (len(samples) - 1))))
+        return samples[index]
+
+
+class FailoverTranslator(BaseTranslator):
+    """Ordered chain of translation backends with health tracking and hedged requests.
+    
+    Backends are tried in configured order, skipping demoted ones. When the
+    primary backend takes longer than its observed latency percentile, the same
+    request is hedged to the next healthy backend and whichever answers first wins.
+    """
+    
+    def __init__(self, backends: List[DeepTranslator], concurrent_requests: int = 3,
+                 request_delay: float = 0.1, max_retries: int = 3, hedge_percentile: float = 0.95,
+                 hedge_min_samples: int = 10, failure_threshold: int = 3, failure_cooldown: float = 60.0):
+        """Initialize the chain from already constructed backends."""
+        self.backends = [b for b in backends if b.translator]
+        self.health = {
+            id(b): BackendHealth(failure_threshold=failure_threshold, cooldown=failure_cooldown)
+            for b in self.backends
+        }
+        self.concurrent_requests = concurrent_requests
+        self.request_delay = request_delay
+        self.max_retries = max_retries
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+    
+    def _ordered_backends(self) -> List[DeepTranslator]:
+        """Healthy backends in configured order, followed by demoted ones as a last resort."""
+        healthy = [b for b in self.backends if self.health[id(b)].is_healthy()]
+        demoted = [b for b in self.backends if not self.health[id(b)].is_healthy()]
+        return healthy + demoted
+    
+    def _call(self, backend: DeepTranslator, text: str, target_language: str) -> str:
+        """Run a single attempt against a backend and record its health."""
+        health = self.health[id(backend)]
+        start = time.monotonic()
+        try:
+            result = backend.translate_once(text, target_language)
+        except Exception:
+            health.record_failure()
+            raise
+        health.record_success(time.monotonic() - start)
+        return result
+    
+    def _hedge_delay(self, backend: DeepTranslator) -> Optional[float]:
+        """How long to wait on a backend before hedging, or None to wait indefinitely."""
+        health = self.health[id(backend)]
+        if len(health.latencies) < self.hedge_min_samples:
+            return None
+        return health.latency_percentile(self.hedge_percentile)
+    
+    def _translate_round(self, text: str, target_language: str) -> str:
+        """Try every backend once, hedging slow calls; raise if all of them fail."""
+        queue = self._ordered_backends()
+        pending = {}
+        last_error = None
+        # Each request gets its own pool, so calls abandoned by earlier requests never hold up this one
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=max(1, len(queue)),
+                                                         thread_name_prefix="translate-hedge")
         
-        # Use sequential translation if concurrent_requests is 1 or less
-        if self.concurrent_requests <= 1:
-            results = []
-            for text in texts:
-                results.append(self.translate_text(text, target_language))
-                time.sleep(self.request_delay)
-            return results
+        try:
+            while queue or pending:
+                if queue and not pending:
+                    backend = queue.pop(0)
+                    pending[executor.submit(self._call, backend, text, target_language)] = backend
+                
+                # Wait on the most recent call for its hedge delay, then hedge to the next backend
+                newest = list(pending.values())[-1]
+                timeout = self._hedge_delay(newest) if queue else None
+                done, _ = concurrent.futures.wait(
+                    pending, timeout=timeout, return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                
+                if not done:
+                    backend = queue.pop(0)
+                    self.health[id(newest)].hedges += 1
+                    logger.debug(f"Hedging translation from {newest.service} to {backend.service}")
+                    pending[executor.submit(self._call, backend, text, target_language)] = backend
+                    continue
+                
+                for future in done:
+                    backend = pending.pop(future)
+                    try:
+                        return future.result()
+                    except Exception as e:
+                        last_error = e
+                        logger.debug(f"Translation backend {backend.service} failed: {e}")
+        finally:
+            # Losing calls finish in the background, then their threads exit
+            executor.shutdown(wait=False)
         
-        # Helper function for concurrent translation
-        def translate_with_delay(text):
-            result = self.translate_text(text, target_language)
-            time.sleep(self.request_delay)  # Add delay to avoid rate limiting
-            return result
+        raise last_error or RuntimeError("No translation backends available")
+    
+    def translate_text(self, text: str, target_language: str = "en") -> str:
+        """Translate text through the backend chain."""
+        if not text or text.isspace() or not self.backends:
+            return text
         
-        # Use ThreadPoolExecutor for concurrent translation
-        results = [None] * len(texts)
-        with concurrent.futures.ThreadPoolExecutor(max_workers=self.concurrent_requests) as executor:
-            # Submit all translation tasks
-            future_to_index = {
-                executor.submit(translate_with_delay, text): i 
-                for i, text in enumerate(texts)
+        retries = 0
+        while retries <= self.max_retries:
+            try:
+                return self._translate_round(text, target_language)
+            except Exception as e:
+                retries += 1
+                if retries <= self.max_retries:
+                    RETRIES.inc(operation="translate")
+                    print(f"All translation services failed: {e}. Retrying in 5 seconds... (Attempt {retries}/{self.max_retries})")
+                    time.sleep(5)
+                else:
+                    print(f"Translation failed after {self.max_retries} attempts: {e}")
+                    return text
+    
+    def batch_translate(self, texts: List[str], target_language: str = "en") -> List[str]:
+        """Translate multiple texts concurrently through the backend chain."""
+        if not texts or not self.backends:
+            return texts
+        return _batch_translate(self.translate_text, texts, target_language,
+                                self.concurrent_requests, self.request_delay)
+    
+    def health_report(self) -> Dict[str, Dict[str, Any]]:
+        """Summarize per-backend health for logging."""
+        report = {}
+        for backend in self.backends:
+            health = self.health[id(backend)]
+            report[backend.service] = {
+                "healthy": health.is_healthy(),
+                "successes": health.successes,
+                "failures": health.failures,
+                "hedges": health.hedges,
+                "p50": health.latency_percentile(0.5),
+                "p95": health.latency_percentile(0.95)
             }
-            
-            # Collect results as they complete
-            for future in concurrent.futures.as_completed(future_to_index):
-                index = future_to_index[future]
-                try:
-                    results[index] = future.result()
-                except Exception as e:
-                    print(f"Translation error for text at index {index}: {e}")
-                    # The translate_text method now handles retries internally
-                    results[index] = texts[index]  # Use original text if all retries fail
-        
+        return report
+
+
+def _batch_translate(translate_fn, texts: List[str], target_language: str,
+                     concurrent_requests: int, request_delay: float) -> List[str]:
+    """Translate texts with translate_fn, concurrently if configured."""
+    # Use sequential translation if concurrent_requests is 1 or less
+    if concurrent_requests <= 1:
+        results = []
+        for text in texts:
+            results.append(translate_fn(text, target_language))
+            time.sleep(request_delay)
         return results
+    
+    # Helper function for concurrent translation
+    def translate_with_delay(text):
+        result = translate_fn(text, target_language)
+        time.sleep(request_delay)  # Add delay to avoid rate limiting
+        return result
+    
+    # Use ThreadPoolExecutor for concurrent translation
+    results = [None] * len(texts)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrent_requests) as executor:
+        # Submit all translation tasks
+        future_to_index = {
+            executor.submit(translate_with_delay, text): i 
+            for i, text in enumerate(texts)
+        }
+        
+        # Collect results as they complete
+        for future in concurrent.futures.as_completed(future_to_index):
+            index = future_to_index[future]
+            try:
+                results[index] = future.result()
+            except Exception as e:
+                print(f"Translation error for text at index {index}: {e}")
+                # The translate_text method handles retries internally
+                results[index] = texts[index]  # Use original text if all retries fail
+    
+    return results
 
 
 class DummyTranslator(BaseTranslator):
@@ -197,7 +487,13 @@ class DummyTranslator(BaseTranslator):
 
 def get_translator(service: str, api_key: Optional[str] = None, target_language: str = "en", 
                concurrent_requests: int = 3, request_delay: float = 0.1, max_retries: int = 3, **kwargs) -> BaseTranslator:
-    """Get the appropriate translator based on service name."""
+    """Get the appropriate translator based on service name.
+    
+    If ``fallback_services`` is given, a FailoverTranslator chaining the primary
+    service with the fallbacks (in order) is returned. Fallbacks that are
+    unknown, lack an API key or duplicate an earlier service are skipped
+    with a warning. Call close() on the translator when done with it.
+    """
     if not DEEP_TRANSLATOR_AVAILABLE:
         print("Warning: deep-translator not available. Translation will not work.")
         return DummyTranslator()
@@ -205,4 +501,37 @@ def get_translator(service: str, api_key: Optional[str] = None, target_language:
     if service.lower() == "none":
         return DummyTranslator()
     
-    return DeepTranslator(service, api_key, target_language, concurrent_requests, request_delay, max_retries)
\ No newline at end of file
+    fallback_services = [s for s in kwargs.get("fallback_services") or [] if s and s.lower() != "none"]
+    if not fallback_services:
+        return DeepTranslator(service, api_key, target_language, concurrent_requests, request_delay, max_retries,
+                              kwargs.get("service_url"))
+    
+    chain = []
+    for position, name in enumerate(dict.fromkeys(name.lower() for name in [service] + fallback_services)):
+        primary = position == 0
+        # Only the primary service uses the configured API key and URL, and falls back to Google
+        key = api_key if primary else kwargs.get("fallback_api_keys", {}).get(name)
+        url = kwargs.get("service_url") if primary else None
+        backend = DeepTranslator(name, key, target_language, concurrent_requests, request_delay, max_retries, url,
+                                 fallback_to_google=primary)
+        if backend.translator is None:
+            continue
+        if backend.service in [b.service for b in chain]:
+            print(f"Warning: skipping translation service '{name}' (already in the chain as {backend.service})")
+            continue
+        chain.append(backend)
+    
+    if len(chain) <= 1:
+        # Nothing to fail over to
+        return chain[0] if chain else DummyTranslator()
+    
+    return FailoverTranslator(
+        chain,
+        concurrent_requests=concurrent_requests,
+        request_delay=request_delay,
+        max_retries=max_retries,
+        hedge_percentile=kwargs.get("hedge_percentile", 0.95),
+        hedge_min_samples=kwargs.get("hedge_min_samples", 10),
+        failure_threshold=kwargs.get("failure_threshold", 3),
+        failure_cooldown=kwargs.get("failure_cooldown", 60.0)
+    )